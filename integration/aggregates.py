@@ -0,0 +1,120 @@
+"""
+Tabelle di riepilogo per le query analitiche più comuni, costruite da engine.run insieme
+alle tabelle del .ktr (che ha solo qualche Group by ad hoc):
+
+    rider_season        pilota × stagione × categoria: gare, vittorie, podi, punti, posizione media, rank
+    rider_circuit       pilota × circuito × categoria: vittorie, podi, griglia media, posizioni guadagnate
+    constructor_season  moto × stagione × categoria: gare, piloti, vittorie, podi, punti, rank
+    circuit_weather     circuito × condizione meteo: gare, temperature e pioggia medie, vincitori
+                        (partenza media, vittorie dalla pole, velocità)
+
+Ogni tabella ha una chiave in pg_loader.TABLE_KEYS, quindi incremental.py scrive in
+PostgreSQL solo le righe dei gruppi cambiati; le viste materializzate di
+pg_loader.MATERIALIZED_VIEWS (classifiche e profili dei circuiti, indicizzate) vengono
+aggiornate subito dopo.
+
+La posizione in griglia arriva da motogp_griglia.csv (solo MotoGP) tramite quali_id,
+assegnato a ogni risultato da engine.motogp_with_quali.
+"""
+import pandas as pd
+
+from window_rank import window_rank
+
+AGGREGATE_TABLES = ["rider_season", "rider_circuit", "constructor_season", "circuit_weather"]
+
+
+def finish_stats(df, keys):
+    """Statistiche di arrivo comuni per gruppo (position/points per risultato)."""
+    position = pd.to_numeric(df["position"], errors="coerce").astype(float)
+    stats = df.assign(
+        _win=(position == 1).astype(int),
+        _podium=position.between(1, 3).astype(int),
+        _position=position,
+    ).groupby(keys, sort=True, dropna=True).agg(
+        starts=("race_id", "count"),
+        wins=("_win", "sum"),
+        podiums=("_podium", "sum"),
+        points=("points", "sum"),
+        best_position=("_position", "min"),
+        avg_position=("_position", "mean"),
+    )
+    stats["avg_position"] = stats["avg_position"].round(2)
+    stats["best_position"] = stats["best_position"].astype("Int64")
+    return stats.reset_index()
+
+def rider_names(riders):
+    names = riders["first_name"].fillna("") + " " + riders["last_name"].fillna("")
+    return pd.DataFrame({"rider_id": riders["id"], "rider_name": names.str.strip()}).drop_duplicates("rider_id")
+
+def grid_positions(motogp, quali):
+    """Posizione in griglia (Int64) per race_id dei risultati MotoGP con una riga in motogp_griglia.csv."""
+    grid = quali.reset_index(drop=True)["Position"]
+    df = motogp[["race_id", "quali_id"]].dropna().drop_duplicates("race_id")
+    df["grid"] = grid.reindex(df["quali_id"].astype(int).to_numpy() - 1).to_numpy()
+    return df[["race_id", "grid"]].astype({"grid": "Int64"})
+
+def build_rider_season(named, riders):
+    df = finish_stats(named.dropna(subset=["rider_id"]), ["year", "category", "rider_id"])
+    df = df.rename(columns={"starts": "races"}).merge(rider_names(riders), on="rider_id", how="left")
+    df["season_rank"] = window_rank(df, ["year", "category"], ["points"], ascending=False, method="min")
+    return df[["year", "category", "rider_id", "rider_name", "races", "wins", "podiums", "points",
+               "best_position", "avg_position", "season_rank"]]
+
+def build_rider_circuit(named, grid, riders):
+    df = named.dropna(subset=["rider_id", "circuit_name"]).merge(grid, on="race_id", how="left")
+    keys = ["category", "circuit_name", "rider_id"]
+    stats = finish_stats(df, keys)
+    df["_gained"] = df["grid"].astype(float) - pd.to_numeric(df["position"], errors="coerce").astype(float)
+    grid_stats = df.groupby(keys, sort=True).agg(
+        grid_starts=("grid", "count"),
+        avg_grid=("grid", "mean"),
+        positions_gained=("_gained", "mean"),
+    ).reset_index()
+    stats = stats.merge(grid_stats, on=keys, how="left").merge(rider_names(riders), on="rider_id", how="left")
+    stats["win_rate"] = (stats["wins"] / stats["starts"]).round(3)
+    stats["avg_grid"] = stats["avg_grid"].astype(float).round(2)
+    stats["positions_gained"] = stats["positions_gained"].round(2)
+    return stats[["category", "circuit_name", "rider_id", "rider_name", "starts", "wins", "podiums", "points",
+                  "best_position", "avg_position", "win_rate", "grid_starts", "avg_grid", "positions_gained"]]
+
+def build_constructor_season(results):
+    df = results[(results["year"] >= 2005) & results["category"].notna() & results["bike_name"].notna()]
+    keys = ["year", "category", "bike_name"]
+    stats = finish_stats(df, keys).rename(columns={"starts": "entries"})
+    counts = df.groupby(keys, sort=True).agg(races=("race_name", "nunique"), riders=("rider_id", "nunique"))
+    stats = stats.merge(counts.reset_index(), on=keys, how="left")
+    stats["season_rank"] = window_rank(stats, ["year", "category"], ["points"], ascending=False, method="min")
+    return stats[["year", "category", "bike_name", "races", "entries", "riders", "wins", "podiums", "points",
+                  "best_position", "avg_position", "season_rank"]]
+
+def build_circuit_weather(race, info_race, partecipation, grid):
+    weather = info_race[["id_race", "temp_max", "temp_min", "rain", "condition"]]
+    df = race[["id_race", "circuit_id", "circuit_name", "year"]].merge(weather, on="id_race", how="inner")
+    df = df.dropna(subset=["circuit_id", "condition"])
+
+    pos = pd.to_numeric(partecipation["position"], errors="coerce").astype(float)
+    winners = partecipation[(pos == 1) & partecipation["id_race"].notna()]
+    winners = winners[["id_race", "race_id", "speed"]].merge(grid, on="race_id", how="left")
+    winners = winners.drop_duplicates("id_race").drop(columns=["race_id"])
+    df = df.merge(winners, on="id_race", how="left")
+    df["_pole_win"] = (df["grid"].astype(float) == 1).astype(int)
+
+    keys = ["circuit_id", "condition"]
+    stats = df.groupby(keys, sort=True).agg(
+        circuit_name=("circuit_name", "first"),
+        races=("id_race", "nunique"),
+        first_year=("year", "min"),
+        last_year=("year", "max"),
+        avg_temp_max=("temp_max", "mean"),
+        avg_temp_min=("temp_min", "mean"),
+        avg_rain=("rain", "mean"),
+        max_rain=("rain", "max"),
+        winners_known=("speed", "count"),
+        avg_winner_grid=("grid", "mean"),
+        pole_wins=("_pole_win", "sum"),
+        avg_winner_speed=("speed", "mean"),
+    ).reset_index()
+    for col in ["avg_temp_max", "avg_temp_min", "avg_rain", "avg_winner_grid", "avg_winner_speed"]:
+        stats[col] = stats[col].astype(float).round(2)
+    stats["circuit_id"] = stats["circuit_id"].astype("Int64")
+    return stats
@@ -0,0 +1,208 @@
+"""
+Risoluzione dei nomi dei circuiti (sostituisce il confronto tutti-contro-tutti dei passi
+Fuzzy match di motogp.ktr).
+
+Ogni nome viene normalizzato (minuscolo, senza accenti né punteggiatura, senza parole
+generiche come "circuit", "international", "de") e cercato in quest'ordine:
+
+1. nome normalizzato identico;
+2. tabella degli alias (JSON nome normalizzato → nome canonico), persistita tra le esecuzioni;
+3. chiave senza parole generiche identica;
+4. blocco di candidati: stesso paese se indicato, poi indice dei trigrammi (solo i candidati
+   con più trigrammi in comune), punteggio Jaro-Winkler sul blocco (rapidfuzz.process.cdist
+   se installato, stessa metrica in Python altrimenti).
+
+Sotto MIN_SCORE il nome resta senza corrispondenza invece di prendere il "più vicino".
+A parità di punteggio vince il candidato che compare prima nel lookup, quindi il risultato
+è deterministico.
+"""
+import json
+import os
+import re
+import unicodedata
+
+try:
+    from rapidfuzz import process as rf_process
+    from rapidfuzz.distance import JaroWinkler as rf_jaro_winkler
+except ImportError:
+    rf_process = None
+
+MIN_SCORE = 0.85
+MAX_CANDIDATES = 10
+
+STOPWORDS = {
+    "circuit", "circuito", "autodromo", "autodrome", "international", "internazionale",
+    "racing", "race", "track", "ring", "motor", "speedway", "de", "del", "della", "delle", "di",
+    "la", "le", "el", "of", "the",
+}
+
+
+def normalize(name):
+    """Minuscolo, accenti rimossi, solo lettere/cifre separate da uno spazio."""
+    if name is None:
+        return ""
+    name = unicodedata.normalize("NFKD", str(name))
+    name = "".join(c for c in name if not unicodedata.combining(c)).lower()
+    return " ".join(re.findall(r"[a-z0-9]+", name))
+
+def name_key(name):
+    """Chiave di confronto: nome normalizzato senza parole generiche (se ne resta qualcuna)."""
+    tokens = normalize(name).split()
+    significant = [t for t in tokens if t not in STOPWORDS]
+    return " ".join(significant or tokens)
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def jaro_winkler(s1, s2, prefix_scale=0.1):
+    """Stessa definizione di rapidfuzz (bonus sul prefisso solo sopra 0.7), così il fallback dà gli stessi punteggi."""
+    if s1 == s2:
+        return 1.0
+    len1, len2 = len(s1), len(s2)
+    if not len1 or not len2:
+        return 0.0
+    window = max(max(len1, len2) // 2 - 1, 0)
+    matched1 = [False] * len1
+    matched2 = [False] * len2
+    matches = 0
+    for i, c in enumerate(s1):
+        for j in range(max(0, i - window), min(i + window + 1, len2)):
+            if not matched2[j] and s2[j] == c:
+                matched1[i] = matched2[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+    transpositions = 0
+    j = 0
+    for i in range(len1):
+        if matched1[i]:
+            while not matched2[j]:
+                j += 1
+            if s1[i] != s2[j]:
+                transpositions += 1
+            j += 1
+    m = float(matches)
+    jaro = (m / len1 + m / len2 + (m - transpositions // 2) / m) / 3
+    if jaro <= 0.7:
+        return jaro
+    prefix = 0
+    for a, b in zip(s1[:4], s2[:4]):
+        if a != b:
+            break
+        prefix += 1
+    return jaro + prefix * prefix_scale * (1 - jaro)
+
+def score_block(query, keys):
+    """Punteggi Jaro-Winkler di una chiave contro un blocco di chiavi candidate."""
+    if rf_process is not None:
+        return [float(s) for s in rf_process.cdist([query], keys, scorer=rf_jaro_winkler.normalized_similarity)[0]]
+    return [jaro_winkler(query, key) for key in keys]
+
+
+class CircuitMatcher:
+    """
+    Indice dei nomi di lookup (es. name_circuit di circuit_data.csv). Le righe con lo stesso
+    nome normalizzato sono rappresentate dalla prima, come nel passo Fuzzy match.
+    """
+
+    def __init__(self, names, countries=None, aliases_path=None, min_score=MIN_SCORE,
+                 max_candidates=MAX_CANDIDATES):
+        self.min_score = min_score
+        self.max_candidates = max_candidates
+        self.aliases_path = aliases_path
+        self.names = list(names)
+        countries = list(countries) if countries is not None else [None] * len(self.names)
+
+        self.by_normalized = {}          # nome normalizzato → indice della prima riga
+        self.by_key = {}                 # chiave senza parole generiche → indice
+        self.keys = []                   # (indice, chiave, paese) dei rappresentanti
+        self.by_trigram = {}             # trigramma → posizioni in self.keys
+        for i, (name, country) in enumerate(zip(self.names, countries)):
+            if name is None or (isinstance(name, float) and name != name):
+                continue
+            normalized = normalize(name)
+            if normalized in self.by_normalized:
+                continue
+            self.by_normalized[normalized] = i
+            key = name_key(name)
+            self.by_key.setdefault(key, i)
+            position = len(self.keys)
+            self.keys.append((i, key, country))
+            for gram in trigrams(key):
+                self.by_trigram.setdefault(gram, []).append(position)
+
+        self.aliases = {}
+        self.learned = 0
+        if aliases_path and os.path.exists(aliases_path):
+            with open(aliases_path, "r", encoding="utf-8") as f:
+                self.aliases = {normalize(k): v for k, v in json.load(f).items()}
+        self.unmatched = {}
+
+    def _alias(self, normalized):
+        canonical = self.aliases.get(normalized)
+        if canonical is None:
+            return None
+        return self.by_normalized.get(normalize(canonical))
+
+    def _block(self, key, country):
+        """Posizioni candidate: più trigrammi in comune (a parità, ordine del lookup)."""
+        shared = {}
+        for gram in trigrams(key):
+            for position in self.by_trigram.get(gram, ()):
+                shared[position] = shared.get(position, 0) + 1
+        if country is not None:
+            same_country = {p: n for p, n in shared.items() if self.keys[p][2] == country}
+            shared = same_country or shared
+        ranked = sorted(shared.items(), key=lambda item: (-item[1], item[0]))
+        return [position for position, _ in ranked[:self.max_candidates]]
+
+    def match(self, name, country=None):
+        """Restituisce (indice della riga di lookup, punteggio); indice None se sotto soglia."""
+        normalized = normalize(name)
+        if not normalized:
+            return None, 0.0
+        if normalized in self.by_normalized:
+            return self.by_normalized[normalized], 1.0
+        alias = self._alias(normalized)
+        if alias is not None:
+            return alias, 1.0
+        key = name_key(name)
+        if key in self.by_key:
+            return self.by_key[key], 1.0
+
+        block = self._block(key, country)
+        best_index, best_score = None, 0.0
+        if block:
+            scores = score_block(key, [self.keys[p][1] for p in block])
+            for position, score in zip(block, scores):
+                index = self.keys[position][0]
+                if score > best_score or (score == best_score and best_index is not None and index < best_index):
+                    best_index, best_score = index, score
+        if best_index is None or best_score < self.min_score:
+            self.unmatched[name] = (self.names[best_index] if best_index is not None else None, best_score)
+            return None, best_score
+
+        self.aliases[normalized] = self.names[best_index]
+        self.learned += 1
+        return best_index, best_score
+
+    def match_many(self, names, countries=None):
+        """Risolve ogni coppia (nome, paese) distinta una sola volta: {(nome, paese): (indice, punteggio)}."""
+        countries = countries if countries is not None else [None] * len(names)
+        results = {}
+        for name, country in zip(names, countries):
+            if (name, country) not in results:
+                results[(name, country)] = self.match(name, country)
+        return results
+
+    def save_aliases(self, path=None):
+        path = path or self.aliases_path
+        if not path or not self.learned:
+            return
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(dict(sorted(self.aliases.items())), f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.learned = 0
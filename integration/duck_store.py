@@ -0,0 +1,298 @@
+"""
+Copia analitica locale del modello integrato: un file DuckDB (colonnare, senza server) e
+una piccola API di query che restituisce tabelle Arrow.
+
+Il file contiene:
+- le tabelle di engine.run, con le righe duplicate sulla chiave di pg_loader.TABLE_KEYS
+  scartate come fa l'upsert in PostgreSQL e ordinate per stagione (i filtri sull'anno
+  saltano interi blocchi grazie alle zone map di DuckDB);
+- le viste di pg_loader.MATERIALIZED_VIEWS, qui viste normali calcolate al volo;
+- la vista results_weather: una riga per pilota e gara con meteo e dati del circuito.
+
+Una scrittura completa crea il file accanto a quello vecchio e lo sostituisce alla fine;
+un aggiornamento (incremental.py) riscrive solo le tabelle cambiate in una transazione.
+
+    python integration/engine.py --duckdb               # integrazione + integration/output/motogp.duckdb
+    python integration/duck_store.py build              # dai CSV già in integration/output/
+    python integration/duck_store.py query --rider Rossi --season 2005 2009 --condition pioggia
+    python integration/duck_store.py query --rider ross --partial
+    python integration/duck_store.py query --sql "SELECT condition, AVG(speed) FROM results_weather GROUP BY 1"
+
+    from duck_store import MotoGPStore
+    with MotoGPStore() as store:
+        store.results(rider="Rossi", season=(2005, 2009), condition="pioggia")     # pyarrow.Table
+        store.query("SELECT * FROM rider_season WHERE year = ?", [2010])
+"""
+import argparse
+import os
+import re
+import time
+
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+from pg_loader import INPUT_DIR, MATERIALIZED_VIEWS, TABLE_KEYS, quote, read_tables
+
+DUCKDB_FILE = os.path.join(INPUT_DIR, "motogp.duckdb")
+SEASON_COLUMN = "year"
+
+# Viste create oltre a quelle di MATERIALIZED_VIEWS (il circuito è deduplicato come tabella)
+VIEWS = {
+    "results_weather": """
+        SELECT p.year, p.category, r.date, p.id_race, p.race_name, r.off_name, r.circuit_id,
+               r.circuit_name, c.country AS circuit_country, c.length AS circuit_length,
+               c.pole_position, p.id_rider_seq, p.rider_name, p.bike_id, p.team_id, p.position,
+               p.points, p.speed, p.time, i.condition, i.temp_max, i.temp_min, i.rain, i.night_race
+        FROM partecipation p
+        LEFT JOIN race r ON r.id_race = p.id_race
+        LEFT JOIN info_race i ON i.id_race = p.id_race
+        LEFT JOIN circuit c ON c.circuit_id = r.circuit_id""",
+    **{name: view["query"] for name, view in MATERIALIZED_VIEWS.items()},
+}
+
+# Query dell'API: vista, colonne filtrabili e ordinamento. "rider" è (colonna del nome,
+# colonna dell'id): un intero filtra per id, un testo per nome o cognome interi ("Rossi"
+# trova Valentino Rossi ma non Capirossi; partial=True cerca una sottostringa). Gli altri
+# filtri di testo non distinguono maiuscole e cercano una sottostringa ("pioggia" trova
+# tutte le gare bagnate).
+QUERIES = {
+    "results": {
+        "view": "results_weather",
+        "filters": {"rider": ("rider_name", "id_rider_seq"), "season": "year", "category": "category",
+                    "circuit": "circuit_name", "condition": "condition"},
+        "order": "date, category, position",
+    },
+    "rider_seasons": {
+        "view": "mv_rider_standings",
+        "filters": {"rider": ("rider_name", "rider_id"), "season": "year", "category": "category"},
+        "order": "year, category, season_rank",
+    },
+    "circuit_specialists": {
+        "view": "mv_circuit_specialists",
+        "filters": {"rider": ("rider_name", "rider_id"), "category": "category", "circuit": "circuit_name"},
+        "order": "circuit_name, category, circuit_rank",
+    },
+    "circuit_weather": {
+        "view": "mv_circuit_weather",
+        "filters": {"circuit": "name_circuit", "condition": "condition"},
+        "order": "name_circuit, condition",
+    },
+}
+
+
+def require_duckdb():
+    if duckdb is None:
+        raise RuntimeError("duckdb non installato: pip install duckdb")
+
+def word_pattern(text):
+    """Regex (RE2) per `text` come parola intera; i confini sono lettere Unicode, non solo ASCII."""
+    return rf"(^|[^\pL\pN]){re.escape(text.strip())}($|[^\pL\pN])"
+
+def arrow_table(result):
+    # to_arrow_table() nelle versioni recenti, fetch_arrow_table() in quelle precedenti
+    return result.to_arrow_table() if hasattr(result, "to_arrow_table") else result.fetch_arrow_table()
+
+
+# === Scrittura ===
+
+def prepare(df, name):
+    key = TABLE_KEYS.get(name)
+    if key:
+        df = df.drop_duplicates(key)
+    return df
+
+def write_table(conn, name, df):
+    df = prepare(df, name)
+    columns = ", ".join(
+        f"CAST({quote(col)} AS DATE) AS {quote(col)}" if pd.api.types.is_datetime64_any_dtype(df[col])
+        else quote(col) for col in df.columns)
+    order = f" ORDER BY {quote(SEASON_COLUMN)}" if SEASON_COLUMN in df.columns else ""
+    conn.register("_frame", df)
+    try:
+        conn.execute(f"CREATE OR REPLACE TABLE {quote(name)} AS SELECT {columns} FROM _frame{order}")
+    finally:
+        conn.unregister("_frame")
+    return len(df)
+
+def create_views(conn):
+    """Crea le viste le cui tabelle esistono; restituisce i nomi delle viste create."""
+    tables = {row[0] for row in conn.execute("SELECT table_name FROM duckdb_tables()").fetchall()}
+    created = []
+    for name, query in VIEWS.items():
+        needed = MATERIALIZED_VIEWS[name]["tables"] if name in MATERIALIZED_VIEWS else [
+            "partecipation", "race", "info_race", "circuit"]
+        if set(needed) <= tables:
+            conn.execute(f"CREATE OR REPLACE VIEW {quote(name)} AS {query}")
+            created.append(name)
+    return created
+
+def write_duckdb(tables, path=DUCKDB_FILE, update=False):
+    """
+    Scrive le tabelle ({nome: DataFrame}) nel file DuckDB. Con update=True il file esistente
+    viene aggiornato solo per queste tabelle, altrimenti viene ricreato da zero.
+    Restituisce {nome: righe scritte}.
+    """
+    require_duckdb()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    update = update and os.path.exists(path)
+    target = path if update else path + ".tmp"
+    if not update and os.path.exists(target):
+        os.remove(target)
+    stats = {}
+    conn = duckdb.connect(target)
+    try:
+        conn.execute("BEGIN TRANSACTION")
+        for name, df in tables.items():
+            stats[name] = write_table(conn, name, df)
+        create_views(conn)
+        conn.execute("COMMIT")
+        conn.execute("CHECKPOINT")
+    finally:
+        conn.close()
+    if not update:
+        os.replace(target, path)
+    return stats
+
+
+# === Query ===
+
+class MotoGPStore:
+    """Connessione in sola lettura al file DuckDB; ogni query restituisce un pyarrow.Table."""
+
+    def __init__(self, path=DUCKDB_FILE):
+        require_duckdb()
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"database DuckDB non trovato: '{path}' (python integration/duck_store.py build)")
+        self.conn = duckdb.connect(path, read_only=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def query(self, sql, params=None):
+        """Query SQL libera con parametri posizionali (?)."""
+        return arrow_table(self.conn.execute(sql, params or []))
+
+    def select(self, name, columns=None, limit=None, partial=False, **filters):
+        """
+        Righe della query `name` di QUERIES filtrate per rider, season (anno o (da, a)),
+        category, circuit e condition; i filtri None sono ignorati. Con partial=True il
+        nome del pilota è cercato come sottostringa invece che come parole intere.
+        """
+        spec = QUERIES[name]
+        clauses, params = [], []
+        for key, value in filters.items():
+            if value is None:
+                continue
+            if key not in spec["filters"]:
+                raise ValueError(f"filtro '{key}' non disponibile per {name}: {', '.join(spec['filters'])}")
+            column = spec["filters"][key]
+            if key == "rider":
+                name_column, id_column = column
+                if isinstance(value, int):
+                    clauses.append(f"{quote(id_column)} = ?")
+                elif partial:
+                    clauses.append(f"{quote(name_column)} ILIKE ?")
+                    value = f"%{value}%"
+                else:
+                    clauses.append(f"regexp_matches({quote(name_column)}, ?, 'i')")
+                    value = word_pattern(value)
+            elif key == "season" and isinstance(value, (tuple, list)):
+                clauses.append(f"{quote(column)} BETWEEN ? AND ?")
+                params.extend(value)
+                continue
+            elif isinstance(value, str):
+                clauses.append(f"{quote(column)} ILIKE ?")
+                value = f"%{value}%"
+            else:
+                clauses.append(f"{quote(column)} = ?")
+            params.append(value)
+
+        sql = f"SELECT {', '.join(quote(c) for c in columns) if columns else '*'} FROM {quote(spec['view'])}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {spec['order']}"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self.query(sql, params)
+
+    def results(self, rider=None, season=None, category=None, circuit=None, condition=None, **options):
+        """Risultati di gara con meteo e circuito (vista results_weather)."""
+        return self.select("results", rider=rider, season=season, category=category, circuit=circuit,
+                           condition=condition, **options)
+
+    def rider_seasons(self, rider=None, season=None, category=None, **options):
+        """Classifiche piloti per stagione, con le vittorie in carriera fino a quella stagione."""
+        return self.select("rider_seasons", rider=rider, season=season, category=category, **options)
+
+    def circuit_specialists(self, rider=None, category=None, circuit=None, **options):
+        """Piloti per circuito, con la posizione nella classifica delle vittorie su quel circuito."""
+        return self.select("circuit_specialists", rider=rider, category=category, circuit=circuit, **options)
+
+    def circuit_weather(self, circuit=None, condition=None, **options):
+        """Statistiche dei circuiti per condizione meteo."""
+        return self.select("circuit_weather", circuit=circuit, condition=condition, **options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database DuckDB locale del modello integrato")
+    parser.add_argument("--db", default=DUCKDB_FILE, help="file DuckDB")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="crea il database dai CSV scritti da engine.py")
+    p.add_argument("--input-dir", default=INPUT_DIR, help="cartella dei CSV scritti da engine.py")
+
+    p = sub.add_parser("query", help="interroga il database")
+    p.add_argument("--view", choices=list(QUERIES), default="results")
+    p.add_argument("--rider", help="nome e/o cognome oppure id del pilota")
+    p.add_argument("--partial", action="store_true", help="cerca il nome del pilota come sottostringa")
+    p.add_argument("--season", type=int, nargs="+", metavar="YEAR", help="anno, oppure primo e ultimo anno")
+    p.add_argument("--category")
+    p.add_argument("--circuit")
+    p.add_argument("--condition", help="condizione meteo (o parte), es. pioggia")
+    p.add_argument("--limit", type=int, default=50)
+    p.add_argument("--sql", help="query SQL libera (ignora gli altri filtri)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "build":
+        tables = read_tables(args.input_dir)
+        if not tables:
+            print(f"[!] Nessuna tabella trovata in '{args.input_dir}'")
+            return
+        stats = write_duckdb(tables, args.db)
+        for name, rows in stats.items():
+            print(f"✅ {name:<20} {rows:7d} righe")
+        print(f"⏱️ Database '{args.db}' creato in {time.perf_counter() - start:.2f}s")
+        return
+
+    with MotoGPStore(args.db) as store:
+        if args.sql:
+            table = store.query(args.sql)
+        else:
+            rider = int(args.rider) if args.rider and args.rider.isdigit() else args.rider
+            season = tuple(args.season[:2]) if args.season and len(args.season) > 1 else (
+                args.season[0] if args.season else None)
+            filters = {"rider": rider, "season": season, "category": args.category,
+                       "circuit": args.circuit, "condition": args.condition}
+            allowed = QUERIES[args.view]["filters"]
+            unsupported = [k for k, v in filters.items() if v is not None and k not in allowed]
+            if unsupported:
+                parser.error(f"filtri non disponibili per {args.view}: {', '.join(unsupported)}")
+            table = store.select(args.view, limit=args.limit, partial=args.partial,
+                                 **{k: v for k, v in filters.items() if k in allowed})
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(table.to_pandas().to_string(index=False))
+    print(f"⏱️ {table.num_rows} righe in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,603 @@
+"""
+Motore di integrazione in Python (pandas) equivalente alla trasformazione Pentaho motogp.ktr.
+
+Legge gli stessi input (MotoGP_Results&Bikes/*.csv, MotoGP_Circuits/circuit_data.csv,
+archive 1/*.csv, scraping/*.json|csv) e produce le stesse tabelle di output dei passi
+Dummy della trasformazione:
+
+    race            ← "Race Table"
+    info_race       ← "Info Race"          (meteo per gara)
+    circuit         ← "Circuit Table"
+    teams           ← "Teams Table"
+    team_standings  ← "Team Standings 2"
+    rider           ← "Rider"
+    partecipation   ← "Partecipation"
+
+e le tabelle di riepilogo di aggregates.py (rider_season, rider_circuit,
+constructor_season, circuit_weather).
+
+Le catene Sort rows + Merge join diventano join hash (DataFrame.merge); i commenti riportano
+il nome dei passi del .ktr corrispondenti. Le condizioni "category TRUE" di Filter rows 3/4
+sono interpretate come "category non nulla". Le tabelle che dipendono da
+MotoGP_Results&Bikes/race_results_view.csv vengono saltate se il file non c'è.
+
+    python integration/engine.py                          # CSV in integration/output/
+    python integration/engine.py --sqlite motogp.sqlite   # anche su SQLite
+    python integration/engine.py --duckdb                 # anche su DuckDB (vedi duck_store.py)
+    python integration/engine.py --validate               # input validati (vedi validation.py)
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import pandas as pd
+
+# profiling.py è condiviso con gli scraper
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scraping"))
+import profiling
+from profiling import profiler
+
+import aggregates
+from circuit_match import CircuitMatcher, MIN_SCORE
+from duck_store import DUCKDB_FILE, write_duckdb
+from geo_index import GeoIndex, TOLERANCE_KM, valid_point
+from pg_loader import load_tables
+from rider_index import RiderIndex
+import staging
+import validation
+from window_rank import window_rank
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUTPUT_DIR = os.path.join(ROOT, "integration", "output")
+# Alias dei nomi di circuito risolti, uno per lookup (circuit_data.csv e Race Table)
+CIRCUIT_ALIASES = os.path.join(ROOT, "integration", "circuit_aliases.json")
+RACE_CIRCUIT_ALIASES = os.path.join(ROOT, "integration", "race_circuit_aliases.json")
+# Nomi di pilota risolti per similarità → riders.id, e file di revisione dei nomi non risolti
+RIDER_IDS = os.path.join(ROOT, "integration", "rider_ids.json")
+RIDER_REVIEW_FILE = "riders_review.csv"
+
+INPUTS = {
+    "circuit": "MotoGP_Circuits/circuit_data.csv",
+    "bikes": "MotoGP_Results&Bikes/bikes.csv",
+    "riders": "MotoGP_Results&Bikes/riders.csv",
+    "teams": "MotoGP_Results&Bikes/teams.csv",
+    "race_results": "MotoGP_Results&Bikes/race_results_view.csv",
+    "constructor_wc": "archive 1/constructure-world-championship.csv",
+    "riders_info": "archive 1/riders-info.csv",
+    "riders_positions": "archive 1/riders-finishing-positions.csv",
+    "quali": "scraping/motogp_griglia.csv",
+    "race_date": "scraping/motogp_gran_premi.json",
+    "race_weather": "scraping/race_weather_data_final.json",
+}
+
+# Tipi dei campi dei passi CsvInput (Integer → Int64, Number/BigNumber → float, il resto stringa)
+CSV_TYPES = {
+    "circuit": {"Lat": float, "Long": float, "Length in meters": int, "Right Corners": int,
+                "Left Corners": int, "Longest Straight": int, "Constructed": int, "Modified": int},
+    "bikes": {"id": int},
+    "riders": {"id": int, "number": float},
+    "teams": {"id": int},
+    "race_results": {"year": int, "sequence": int, "rider": int, "position": int,
+                     "points": float, "number": float, "speed": float},
+    "constructor_wc": {"Season": int},
+    "riders_info": {"Victories": int, "2nd places": float, "3rd places": float,
+                    "Pole positions from '74 to 2022": float, "Race fastest lap to 2022": float,
+                    "World Championships": float},
+    "riders_positions": {"Victories": int, "NumberofSecond": int, "NumberofThird": int,
+                         "Numberof4th": int, "Numberof5th": int, "Numberof6th": int},
+    "quali": {"Year": int, "Position": int},
+}
+
+# Campi dei passi JsonInput (percorso $[*].<campo>); i mancanti diventano null
+JSON_FIELDS = {
+    "race_date": ["Anno", "Data", "Circuito", "Nome_Ufficiale", "Percorso", "Notturna", "Latitudine", "Longitudine"],
+    "race_weather": ["Circuito", "Data", "Temp_Max", "Temp_Min", "Precipitazione", "Condizione_Meteo"],
+}
+
+OUTPUT_TABLES = ["race", "info_race", "circuit", "teams", "team_standings", "rider", "partecipation",
+                 *aggregates.AGGREGATE_TABLES]
+
+# Input da cui dipende ogni tabella di output (usato per ricostruire solo le tabelle toccate)
+RACE_INPUTS = ["circuit", "race_date", "race_weather"]
+RIDER_INPUTS = ["race_results", "bikes", "teams", "quali", "riders", "riders_info", "riders_positions"]
+TABLE_INPUTS = {
+    "race": RACE_INPUTS,
+    "info_race": RACE_INPUTS,
+    "circuit": RACE_INPUTS,
+    "teams": ["teams"],
+    "team_standings": ["race_results", "bikes", "teams", "constructor_wc"],
+    "rider": RIDER_INPUTS,
+    "partecipation": RIDER_INPUTS + RACE_INPUTS,
+    "rider_season": ["race_results", "bikes", "teams", "riders"],
+    "rider_circuit": RIDER_INPUTS,
+    "constructor_season": ["race_results", "bikes", "teams"],
+    "circuit_weather": RIDER_INPUTS + RACE_INPUTS,
+}
+
+
+# === Lettura input ===
+
+def read_csv(path, types):
+    df = pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[""], encoding="utf-8")
+    for col, typ in types.items():
+        if col not in df.columns:
+            continue
+        values = pd.to_numeric(df[col], errors="coerce")
+        df[col] = values.astype("Int64") if typ is int else values.astype(float)
+    return df
+
+def read_json(path, fields):
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    df = pd.DataFrame(records)
+    # motogp_gran_premi.json storico usa "Nome_Ufficiale", race_date_script.py scrive "Nome ufficiale"
+    if "Nome ufficiale" in df.columns:
+        df["Nome_Ufficiale"] = df.get("Nome_Ufficiale", pd.Series(index=df.index, dtype=object)).fillna(df["Nome ufficiale"])
+    for field in fields:
+        if field not in df.columns:
+            df[field] = None
+    return df[fields]
+
+def load_inputs(root=ROOT, names=None, staging_dir=None, raw=False):
+    """
+    Legge gli input (tutti o solo `names`) dai file originali o, se indicato, dallo staging
+    Parquet. Con raw=True i CSV restano testo (i tipi li applica validation.py).
+    """
+    data = {}
+    for name, rel_path in INPUTS.items():
+        if names is not None and name not in names:
+            data[name] = None
+            continue
+        path = os.path.join(root, rel_path)
+        if staging_dir and staging.is_staged(name, staging_dir):
+            data[name] = staging.read_staged(name, columns=JSON_FIELDS.get(name), staging_dir=staging_dir,
+                                             categories=False)
+        elif not os.path.exists(path):
+            print(f"[!] Input mancante: {rel_path}")
+            data[name] = None
+        elif name in JSON_FIELDS:
+            data[name] = read_json(path, JSON_FIELDS[name])
+        else:
+            data[name] = read_csv(path, {} if raw else CSV_TYPES.get(name, {}))
+    if data["race_date"] is not None and not raw:
+        data["race_date"]["Anno"] = pd.to_numeric(data["race_date"]["Anno"], errors="coerce").astype("Int64")
+    return data
+
+
+# === Funzioni di supporto per i passi Kettle ===
+
+def add_sequence(df, name):
+    """Passo Sequence: contatore 1..n nell'ordine delle righe."""
+    df = df.reset_index(drop=True)
+    df[name] = pd.array(range(1, len(df) + 1), dtype="Int64")
+    return df
+
+def trim(series, case=None):
+    """Passo String operations: trim su entrambi i lati, eventuale maiuscolo/minuscolo."""
+    series = series.astype("string").str.strip()
+    if case == "upper":
+        series = series.str.upper()
+    elif case == "lower":
+        series = series.str.lower()
+    return series
+
+def split_field(series, delimiter, names):
+    """Passo Split fields: i token in più vengono scartati, quelli mancanti sono null."""
+    parts = series.astype("string").str.split(delimiter, regex=False)
+    return {name: parts.str.get(i) for i, name in enumerate(names)}
+
+def concat_fields(left, right, separator):
+    """Passo Concat fields: i null sono scritti come stringa vuota, il separatore c'è sempre."""
+    return left.fillna("").astype(str) + separator + right.fillna("").astype(str)
+
+def sort_rows(df, by, ascending=True):
+    return df.sort_values(by, ascending=ascending, kind="mergesort", na_position="first").reset_index(drop=True)
+
+def fuzzy_match(stream, main_field, lookup, lookup_field, values, match_field="corrispondenza",
+                measure_field="valore di misura", aliases_path=None, min_score=MIN_SCORE,
+                coords=None, tolerance_km=TOLERANCE_KM):
+    """
+    Passo Fuzzy match: ogni valore distinto del flusso viene risolto con CircuitMatcher
+    (alias persistiti, blocchi per trigrammi, Jaro-Winkler) e riceve i campi `values`
+    della riga di lookup trovata; sotto soglia i campi restano null.
+
+    Con coords=(lat del flusso, lon del flusso, lat del lookup, lon del lookup) le righe
+    vengono risolte prima per posizione con GeoIndex (riga di lookup più vicina entro
+    tolerance_km, valore di misura 1.0); il nome resta il ripiego per le righe senza
+    coordinate o senza un circuito abbastanza vicino.
+    """
+    stream = stream.reset_index(drop=True)
+    index = pd.Series([None] * len(stream), dtype=object)
+    measure = pd.Series(float("nan"), index=stream.index)
+    if coords and tolerance_km:
+        lat, lon, lookup_lat, lookup_lon = coords
+        geo = GeoIndex(lookup[lookup_lat], lookup[lookup_lon], tolerance_km)
+        nearest = geo.nearest_many(stream[lat], stream[lon])
+        index = pd.Series([nearest.get(valid_point(a, b), (None, None))[0]
+                           for a, b in zip(stream[lat], stream[lon])], dtype=object)
+        measure[index.notna()] = 1.0
+
+    by_name = index.isna()
+    matcher = CircuitMatcher(lookup[lookup_field], aliases_path=aliases_path, min_score=min_score)
+    best = {value: matcher.match(value) for value in stream.loc[by_name, main_field].dropna().unique()}
+    matcher.save_aliases()
+    for name, (closest, score) in matcher.unmatched.items():
+        print(f"[!] Nessuna corrispondenza per '{name}' (più vicino: {closest}, {score:.3f})")
+
+    index[by_name] = stream.loc[by_name, main_field].map(lambda v: best.get(v, (None, None))[0])
+    measure[by_name] = stream.loc[by_name, main_field].map(lambda v: best.get(v, (None, None))[1])
+    matched = lookup.reset_index(drop=True)
+    out = stream.copy()
+    out[match_field] = index.map(lambda i: None if pd.isna(i) else matched[lookup_field].iloc[int(i)])
+    out[measure_field] = measure.values
+    for value in values:
+        column = matched[value]
+        target = value if value not in out.columns else f"{value}_1"
+        out[target] = index.map(lambda i: None if pd.isna(i) else column.iloc[int(i)]).values
+    return out
+
+
+# === Circuiti, gare e meteo ===
+
+def circuit_lookup(circuit):
+    """Circuit → Edit Name → Trim → ADD id → Select values 7"""
+    df = circuit.rename(columns={
+        "Name": "circuit_name", "Lat": "lat", "Long": "long", "Country": "country",
+        "Pole Position": "pole_position", "Length in meters": "length", "Width in meters": "width",
+        "Right Corners": "right_corners", "Left Corners": "left_corners",
+        "Longest Straight": "longest_straight", "Constructed": "constructed", "Modified": "modifies",
+    })
+    df["circuit_name"] = trim(df["circuit_name"], "lower")
+    for col in ["country", "pole_position", "width"]:
+        df[col] = trim(df[col])
+    df = add_sequence(df, "circuit_id")
+    return df.rename(columns={"circuit_name": "name_circuit"})
+
+def race_stream(race_weather, race_date):
+    """Race Wheater/Race & Date → Select values 3/4 → Merge join 8 → Select values 5 → String operations 2"""
+    weather = race_weather.rename(columns={
+        "Circuito": "circuit_name", "Data": "date", "Temp_Max": "temp_max", "Temp_Min": "temp_min",
+        "Precipitazione": "rain", "Condizione_Meteo": "condition",
+    })
+    weather["date"] = pd.to_datetime(weather["date"], format="%Y-%m-%d", errors="coerce")
+    races = race_date.rename(columns={
+        "Anno": "year", "Data": "date", "Circuito": "circuit_name3", "Nome_Ufficiale": "off_name",
+        "Percorso": "info", "Notturna": "night_race", "Latitudine": "lat", "Longitudine": "long",
+    })
+    races["date"] = pd.to_datetime(races["date"], format="%Y-%m-%d", errors="coerce")
+    races["date_1"] = races["date"]
+    df = weather.merge(races, on="date", how="inner", sort=True)
+    df["circuit_name3"] = trim(df["circuit_name3"], "lower")
+    return df
+
+def build_race_tables(data, min_score=MIN_SCORE, tolerance_km=TOLERANCE_KM):
+    """
+    Fuzzy match → ADD id 2 → Race Table / Info Race; Fuzzy match → Select values 7 2 → Circuit Table.
+    Il circuito di ogni gara è risolto prima dalle coordinate della pagina del GP
+    (Latitudine/Longitudine) rispetto a Lat/Long di circuit_data.csv, poi dal nome.
+    """
+    lookup = circuit_lookup(data["circuit"])
+    stream = race_stream(data["race_weather"], data["race_date"])
+    matched = fuzzy_match(stream, "circuit_name3", lookup, "name_circuit", [
+        "name_circuit", "lat", "long", "country", "pole_position", "length", "width",
+        "right_corners", "left_corners", "longest_straight", "constructed", "modifies", "circuit_id",
+    ], aliases_path=CIRCUIT_ALIASES, min_score=min_score,
+        coords=("lat", "long", "lat", "long"), tolerance_km=tolerance_km)
+    matched = add_sequence(matched, "id_race")
+
+    race = matched[["circuit_name", "date", "year", "circuit_name3", "off_name", "country",
+                    "circuit_id", "id_race"]].copy()
+
+    info_race = matched[["temp_max", "temp_min", "rain", "condition", "date", "circuit_name3", "off_name",
+                         "info", "night_race", "lat", "long", "id_race"]].copy()
+    info_race["circuit_name3"] = trim(info_race["circuit_name3"], "lower")
+
+    circuit = matched[["circuit_name", "lat", "long", "country", "pole_position", "length", "width",
+                       "constructed", "modifies", "circuit_id"]].rename(columns={"circuit_name": "name_circuit"})
+    circuit = sort_rows(circuit, ["country"])
+    return race, info_race, circuit
+
+
+# === Team, moto e risultati ===
+
+def teams_stream(teams):
+    """Teams → Edit Name 8 → Add sequence → Sort rows 7 (= Teams Table)"""
+    df = teams.rename(columns={"id": "team_id", "name": "team_name"})
+    return sort_rows(df[["team_id", "team_name", "country"]], ["team_name"])
+
+def results_stream(race_results, bikes, teams):
+    """
+    Race Results → Edit Name 6 → Add sequence 3 → Merge join (bikes, bike_id <> 234)
+    → Merge join 2 (teams) → Select values 11
+    """
+    df = race_results.rename(columns={"shortname": "race_name", "rider": "rider_id"})
+    df = add_sequence(df, "race_id")
+
+    bikes = bikes.rename(columns={"id": "bike_id", "name": "bike_name", "country": "country_bike"})
+    bikes = bikes[bikes["bike_id"] != 234]
+    df = df.merge(bikes, on="bike_name", how="inner")
+    df = df.merge(teams[["team_id", "team_name"]], on="team_name", how="inner")
+
+    return df[["year", "category", "sequence", "race_name", "circuit_name", "rider_id", "rider_name",
+               "team_name", "bike_name", "position", "points", "number", "country", "speed", "time",
+               "race_id", "bike_id", "team_id"]]
+
+def since_2005(df):
+    """Filter rows 4 / Filter rows 4 2: year >= 2005 e category valorizzata"""
+    return df[(df["year"] >= 2005) & df["category"].notna()]
+
+def results_named(results):
+    """Sort rows 9 → Split fields (",") → Concat fields 2 ("") → Select values 12"""
+    df = since_2005(results).copy()
+    parts = split_field(df["rider_name"], ",", ["name", "surname"])
+    df["rider_name"] = concat_fields(parts["name"], parts["surname"], "")
+    df["country"] = df["country"].astype("string")
+    return df[["year", "category", "race_name", "circuit_name", "rider_id", "position", "points", "number",
+               "country", "speed", "time", "race_id", "bike_id", "team_id", "rider_name"]]
+
+def motogp_with_quali(named, quali, index):
+    """
+    Filter rows (MotoGP) → Split fields 2 (" ") → Concat fields 2 2 (" ")
+    → Merge join 10 LEFT OUTER con Quali (+ Add sequence 2) → Select values 12 2 (= Dummy 7).
+    Il pilota della griglia è identificato con RiderIndex e il join usa rider_id invece del nome.
+    """
+    df = named[named["category"] == "MotoGP"].copy()
+    parts = split_field(df["rider_name"], " ", ["surname", "name"])
+    df["rider_name"] = concat_fields(parts["name"], parts["surname"], " ")
+
+    quali = add_sequence(quali, "quali_id")
+    quali["quali_rider_id"] = index.resolve_series(quali["RiderName"], "motogp_griglia")
+    quali = quali[["Year", "OfficialName", "quali_rider_id", "quali_id"]]
+    df = df.merge(quali, how="left", left_on=["year", "circuit_name", "rider_id"],
+                  right_on=["Year", "OfficialName", "quali_rider_id"])
+    return df.drop(columns=["Year", "OfficialName", "quali_rider_id"])
+
+
+# === Piloti ===
+
+def rider_stats(positions, info, index):
+    """
+    Riders Positions → Trim 5 → Select values; Riders Info → Trim 5 2 → Split fields 3 → Concat fields 2 3
+    → Select values 2; Append streams + Unique rows + Merge join 13 → una riga per pilota,
+    identificato con RiderIndex (a parità vince riders-finishing-positions.csv).
+    """
+    pos = pd.DataFrame({
+        "rider_name": trim(positions["Rider"], "upper"),
+        "victories": positions["Victories"],
+        "2nd": positions["NumberofSecond"].astype(float),
+        "3rd": positions["NumberofThird"].astype(float),
+        "rider_id": index.resolve_series(positions["Rider"], "riders-finishing-positions"),
+    })
+    parts = split_field(trim(info["Riders All Time in All Classes"], "upper"), " ", ["surname", "name"])
+    inf = pd.DataFrame({
+        "rider_name": concat_fields(parts["name"], parts["surname"], " "),
+        "victories": info["Victories"],
+        "2nd": info["2nd places"],
+        "3rd": info["3rd places"],
+        "rider_id": index.resolve_series(info["Riders All Time in All Classes"], "riders-info"),
+    })
+    stats = pd.concat([pos, inf], ignore_index=True)
+    return stats.dropna(subset=["rider_id"]).drop_duplicates("rider_id", keep="first")
+
+def riders_stream(riders, stats):
+    """
+    Riders → Edit Name 7 → Concat fields → Select values 9 → String operations → Sort rows 3
+    → Merge join 4 RIGHT OUTER (statistiche, su rider_id) → Select values 10 → add id 3 (id_rider_seq)
+    """
+    df = riders.rename(columns={"id": "rider_id"})
+    df["rider_name1"] = trim(concat_fields(df["first_name"], df["last_name"], " "), "upper")
+    df = sort_rows(df, ["rider_name1"])
+    df = df.merge(stats.drop(columns=["rider_name"]), how="left", on="rider_id")
+    df = df.rename(columns={"rider_name1": "rider"})
+    df = add_sequence(df, "id_rider_seq")
+    return df[["rider", "victories", "2nd", "3rd", "rider_id", "country", "number", "id_rider_seq"]]
+
+def position_counts(riders, named):
+    """
+    Merge join 5 → Select values 13 → Filter rows 3 / 3 3 / 3 3 2 → Group by / 2 / 2 2 / 2 2 2
+    → Multiway merge join (INNER, come nel .ktr) → Select values 14
+    """
+    joined = riders[["rider_id"]].merge(named[["rider_id", "position"]], on="rider_id", how="inner")
+    bucket = joined["position"].map({1: "1st_pos", 2: "2nd_pos", 3: "3rd_pos"}).fillna("other_pos")
+    counts = pd.crosstab(joined["rider_id"], bucket)
+    for col in ["1st_pos", "2nd_pos", "3rd_pos", "other_pos"]:
+        if col not in counts.columns:
+            counts[col] = 0
+    counts = counts[(counts[["1st_pos", "2nd_pos", "3rd_pos", "other_pos"]] > 0).all(axis=1)]
+    counts = counts.reset_index()
+    df = riders.merge(counts, on="rider_id", how="inner")
+    return df[["rider", "rider_id", "country", "number", "1st_pos", "3rd_pos", "2nd_pos", "other_pos",
+               "id_rider_seq"]]
+
+def build_rider_table(counts, motogp):
+    """Merge join 11 (INNER su rider_id) → Group by 3 (= Rider)"""
+    df = counts.merge(motogp[["rider_id", "rider_name"]], on="rider_id", how="inner")
+    keys = ["rider_name", "1st_pos", "2nd_pos", "3rd_pos", "country", "number", "other_pos", "id_rider_seq"]
+    return sort_rows(df[keys].drop_duplicates(), ["rider_name"])
+
+def build_partecipation(motogp, rider, race, min_score=MIN_SCORE):
+    """Merge join 12 LEFT OUTER (Rider) → Select values 16 → String operations 3 → Fuzzy match 2 → Sort rows 19"""
+    df = sort_rows(motogp, ["rider_id"])
+    df = df.merge(rider[["rider_name", "id_rider_seq", "number", "country"]], on="rider_name",
+                  how="left", suffixes=("_0", ""))
+    df["circuit_name"] = trim(df["circuit_name"], "lower")
+    df = fuzzy_match(df, "circuit_name", race, "circuit_name", ["id_race"],
+                     aliases_path=RACE_CIRCUIT_ALIASES, min_score=min_score)
+    df = df[["year", "category", "race_name", "circuit_name", "id_rider_seq", "position", "points", "number",
+             "country", "speed", "time", "race_id", "bike_id", "team_id", "rider_name", "corrispondenza", "id_race"]]
+    return sort_rows(df, ["year"])
+
+
+# === Classifica costruttori/team ===
+
+def build_team_standings(results, constructor_wc, teams):
+    """
+    Constructor WC → Edit Name 3 → Replace in string (™) → Merge join 7 con Filter rows 4 2
+    → Group by 3 2 (SUM points) → rank per (year, category) con window_rank, al posto di
+    Sort rows 14 2 + Modified JavaScript value 2 → Merge join 9 (Teams) → Sort rows 14 2 2 2 2
+    """
+    wc = constructor_wc.rename(columns={"Season": "year", "Constructor": "constructor_name", "Class": "category"})
+    wc["category"] = wc["category"].str.replace("â„¢", "", regex=False).str.replace("™", "", regex=False)
+
+    df = since_2005(results)[["year", "category", "team_name", "points"]]
+    df = df.merge(wc[["year", "category"]], on=["year", "category"], how="inner")
+    df = df.groupby(["year", "category", "team_name"], as_index=False, sort=True).agg(total_points=("points", "sum"))
+    df["final_position"] = window_rank(df, ["year", "category"], ["total_points"], ascending=False)
+
+    df = df.merge(teams[["team_name", "team_id"]], on="team_name", how="inner")
+    return sort_rows(df, ["year", "category", "team_name"])
+
+
+# === Esecuzione ===
+
+def run(root=ROOT, min_score=MIN_SCORE, review_path=None, only=None, staging_dir=None,
+        tolerance_km=TOLERANCE_KM, quarantine_path=None):
+    """
+    Costruisce le tabelle di output (tutte, o solo quelle in `only`); restituisce (tabelle, tempi).
+    Con quarantine_path gli input passano prima per validation.py: le righe scartate e il
+    riepilogo vengono scritti lì.
+    """
+    timings = {}
+    wanted = set(only or OUTPUT_TABLES)
+    needs_rider = bool(wanted & {"rider", "partecipation", "rider_circuit", "circuit_weather"})
+    needs_race = bool(wanted & {"race", "info_race", "circuit", "partecipation", "circuit_weather"})
+    needs_results = needs_rider or bool(wanted & {"team_standings", "rider_season", "constructor_season"})
+
+    def stage(name, fn, *args, **kwargs):
+        rows_in = sum(len(a) for a in args if isinstance(a, pd.DataFrame))
+        with profiler.stage(name, rows_in=rows_in) as s:
+            start = time.perf_counter()
+            result = fn(*args, **kwargs)
+            timings[name] = time.perf_counter() - start
+            if isinstance(result, dict):
+                s["rows_out"] = sum(len(df) for df in result.values() if df is not None)
+            elif isinstance(result, tuple):
+                s["rows_out"] = sum(len(df) for df in result)
+            elif isinstance(result, pd.DataFrame):
+                s["rows_out"] = len(result)
+        return result
+
+    if quarantine_path and staging_dir:
+        print("[!] La validazione legge i file originali: staging ignorato")
+        staging_dir = None
+    data = stage("load", load_inputs, root, {name for table in wanted for name in TABLE_INPUTS[table]},
+                 staging_dir, raw=bool(quarantine_path))
+    if quarantine_path:
+        data, quarantine, summary = stage("validate", validation.validate_inputs, data, CSV_TYPES)
+        if data["race_date"] is not None:
+            data["race_date"]["Anno"] = pd.to_numeric(data["race_date"]["Anno"], errors="coerce").astype("Int64")
+        validation.write_report(quarantine, summary, quarantine_path)
+    tables = {}
+    if needs_race:
+        tables["race"], tables["info_race"], tables["circuit"] = stage("race_tables", build_race_tables, data,
+                                                                          min_score=min_score,
+                                                                          tolerance_km=tolerance_km)
+    if needs_results or "teams" in wanted:
+        teams = stage("teams", teams_stream, data["teams"])
+        tables["teams"] = teams
+
+    if needs_results and data["race_results"] is None:
+        print("[!] race_results_view.csv assente: salto le tabelle che dipendono dai risultati")
+    elif needs_results:
+        results = stage("results", results_stream, data["race_results"], data["bikes"], teams)
+        if "team_standings" in wanted:
+            tables["team_standings"] = stage("team_standings", build_team_standings, results,
+                                             data["constructor_wc"], teams)
+        if "constructor_season" in wanted:
+            tables["constructor_season"] = stage("constructor_season", aggregates.build_constructor_season,
+                                                 results)
+        if needs_rider or "rider_season" in wanted:
+            named = stage("results_named", results_named, results)
+        if "rider_season" in wanted:
+            tables["rider_season"] = stage("rider_season", aggregates.build_rider_season, named, data["riders"])
+    if needs_results and data["race_results"] is not None and needs_rider:
+        index = stage("rider_index", RiderIndex, data["riders"], RIDER_IDS)
+        motogp = stage("motogp_quali", motogp_with_quali, named, data["quali"], index)
+        stats = stage("rider_stats", rider_stats, data["riders_positions"], data["riders_info"], index)
+        riders = stage("riders", riders_stream, data["riders"], stats)
+        counts = stage("position_counts", position_counts, riders, named)
+        tables["rider"] = stage("rider", build_rider_table, counts, motogp)
+        if wanted & {"partecipation", "circuit_weather"}:
+            tables["partecipation"] = stage("partecipation", build_partecipation, motogp, tables["rider"],
+                                            tables["race"], min_score=min_score)
+        if wanted & {"rider_circuit", "circuit_weather"}:
+            grid = stage("grid", aggregates.grid_positions, motogp, data["quali"])
+        if "rider_circuit" in wanted:
+            tables["rider_circuit"] = stage("rider_circuit", aggregates.build_rider_circuit, named, grid,
+                                            data["riders"])
+        if "circuit_weather" in wanted:
+            tables["circuit_weather"] = stage("circuit_weather", aggregates.build_circuit_weather,
+                                              tables["race"], tables["info_race"], tables["partecipation"], grid)
+        index.save()
+        if review_path:
+            count = index.write_review(review_path)
+            print(f"[i] {count} nomi di pilota non risolti in '{review_path}'")
+    return {name: df for name, df in tables.items() if name in wanted}, timings
+
+def write_csv(tables, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    for name, df in tables.items():
+        df.to_csv(os.path.join(output_dir, f"{name}.csv"), index=False)
+
+def write_sqlite(tables, path):
+    with sqlite3.connect(path) as conn:
+        for name, df in tables.items():
+            df.to_sql(name, conn, if_exists="replace", index=False)
+
+def main():
+    parser = argparse.ArgumentParser(description="Integrazione MotoGP senza Pentaho (equivalente a motogp.ktr)")
+    parser.add_argument("--root", default=ROOT, help="cartella del progetto con i dataset")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="cartella dei CSV di output")
+    parser.add_argument("--sqlite", help="scrive le tabelle anche in questo database SQLite")
+    parser.add_argument("--postgres", metavar="DSN",
+                        help="carica le tabelle anche in PostgreSQL (COPY + upsert, vedi pg_loader.py)")
+    parser.add_argument("--duckdb", metavar="FILE", nargs="?", const=DUCKDB_FILE,
+                        help="scrive le tabelle anche nel database DuckDB locale (vedi duck_store.py)")
+    parser.add_argument("--staging", metavar="DIR", nargs="?", const=staging.STAGING_DIR,
+                        help="legge gli input dallo staging Parquet (vedi staging.py) invece che dai CSV/JSON")
+    parser.add_argument("--min-score", type=float, default=MIN_SCORE,
+                        help="punteggio minimo Jaro-Winkler per accettare un nome di circuito")
+    parser.add_argument("--validate", action="store_true",
+                        help="valida gli input con le regole di validation.py (quarantena e riepilogo nell'output)")
+    parser.add_argument("--geo-tolerance", type=float, default=TOLERANCE_KM, metavar="KM",
+                        help="distanza massima per associare una gara al circuito per coordinate (0 = solo nomi)")
+    profiling.add_arguments(parser, os.path.join(OUTPUT_DIR, "engine_report.json"))
+    args = parser.parse_args()
+    profiling.start(args)
+
+    start = time.perf_counter()
+    os.makedirs(args.output_dir, exist_ok=True)
+    tables, timings = run(args.root, args.min_score, os.path.join(args.output_dir, RIDER_REVIEW_FILE),
+                          staging_dir=args.staging, tolerance_km=args.geo_tolerance,
+                          quarantine_path=os.path.join(args.output_dir, validation.QUARANTINE_FILE)
+                          if args.validate else None)
+    rows = sum(len(df) for df in tables.values())
+    with profiler.stage("write_csv", rows_in=rows) as s:
+        write_csv(tables, args.output_dir)
+        s["rows_out"] = rows
+    if args.sqlite:
+        with profiler.stage("write_sqlite", rows_in=rows) as s:
+            write_sqlite(tables, args.sqlite)
+            s["rows_out"] = rows
+    if args.postgres:
+        with profiler.stage("write_postgres", rows_in=rows) as s:
+            stats = load_tables(tables, args.postgres)
+            s["rows_out"] = sum(n for n, _ in stats.values())
+    if args.duckdb:
+        with profiler.stage("write_duckdb", rows_in=rows) as s:
+            s["rows_out"] = sum(write_duckdb(tables, args.duckdb).values())
+        print(f"✅ Database DuckDB in '{args.duckdb}'")
+
+    for name, seconds in timings.items():
+        print(f"   {name:<16} {seconds * 1000:8.1f} ms")
+    for name in OUTPUT_TABLES:
+        if name in tables:
+            print(f"✅ {name:<16} {len(tables[name]):6d} righe")
+    print(f"⏱️ Integrazione completata in {time.perf_counter() - start:.2f}s")
+    profiling.finish(args, {"tables": {name: len(df) for name, df in tables.items()}})
+
+if __name__ == "__main__":
+    main()
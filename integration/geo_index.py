@@ -0,0 +1,90 @@
+"""
+Indice spaziale dei circuiti: risolve una coppia (lat, lon) nel circuito noto più vicino
+entro TOLERANCE_KM.
+
+I punti sono convertiti in vettori unitari 3D e distribuiti in una griglia di celle cubiche
+di lato pari alla corda corrispondente alla tolleranza: un punto entro la tolleranza sta
+per forza in una delle 27 celle attorno a quella della query, quindi ogni ricerca guarda
+solo quei pochi candidati (tempo costante, senza problemi ai poli o sull'antimeridiano).
+La distanza finale è quella ortodromica (haversine). A parità di distanza vince il punto
+che compare prima nel lookup, quindi il risultato è deterministico.
+"""
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+TOLERANCE_KM = 3.0      # i circuiti più lunghi superano i 5 km: coordinate della stessa pista
+
+
+def to_float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+def valid_point(lat, lon):
+    lat, lon = to_float(lat), to_float(lon)
+    if lat is None or lon is None or not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        return None
+    return lat, lon
+
+def unit_vector(lat, lon):
+    phi, lam = math.radians(lat), math.radians(lon)
+    return math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi)
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoIndex:
+    """Indice delle coordinate di lookup (es. Lat/Long di circuit_data.csv); le righe senza coordinate valide sono ignorate."""
+
+    def __init__(self, lats, lons, tolerance_km=TOLERANCE_KM):
+        self.tolerance_km = tolerance_km
+        # corda sulla sfera unitaria che sottende un arco di tolerance_km
+        self.cell = 2 * math.sin(min(tolerance_km / EARTH_RADIUS_KM, math.pi) / 2) or 1.0
+        self.points = {}                # indice → (lat, lon)
+        self.cells = {}                 # cella → indici in ordine di lookup
+        for i, (lat, lon) in enumerate(zip(lats, lons)):
+            point = valid_point(lat, lon)
+            if point is None:
+                continue
+            self.points[i] = point
+            self.cells.setdefault(self._cell(*point), []).append(i)
+
+    def _cell(self, lat, lon):
+        return tuple(math.floor(c / self.cell) for c in unit_vector(lat, lon))
+
+    def nearest(self, lat, lon):
+        """Restituisce (indice della riga di lookup, distanza in km); (None, None) se niente entro la tolleranza."""
+        point = valid_point(lat, lon)
+        if point is None:
+            return None, None
+        cx, cy, cz = self._cell(*point)
+        best_index, best_distance = None, None
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    for i in self.cells.get((cx + dx, cy + dy, cz + dz), ()):
+                        distance = haversine_km(*point, *self.points[i])
+                        if distance > self.tolerance_km:
+                            continue
+                        if best_distance is None or (distance, i) < (best_distance, best_index):
+                            best_index, best_distance = i, distance
+        return best_index, best_distance
+
+    def nearest_many(self, lats, lons):
+        """
+        Risolve ogni coppia distinta una sola volta: {valid_point(lat, lon): (indice, distanza)}.
+        Le coppie senza coordinate valide (null, NaN, fuori scala) non compaiono: le chiavi
+        sono normalizzate perché NaN non è uguale a se stesso e non si ritroverebbe nel dict.
+        """
+        results = {}
+        for lat, lon in zip(lats, lons):
+            point = valid_point(lat, lon)
+            if point is not None and point not in results:
+                results[point] = self.nearest(*point)
+        return results
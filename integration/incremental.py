@@ -0,0 +1,255 @@
+"""
+Esecuzione incrementale dell'integrazione (change data capture sugli input).
+
+Ogni input di engine.INPUTS viene identificato da un'impronta (sha256 del file), ricalcolata
+solo se dimensione o data di modifica sono cambiate. Un'impronta a parte copre il codice
+che produce le tabelle (CODE_FILES), gli alias e gli id persistiti (circuit_aliases.json,
+race_circuit_aliases.json, rider_ids.json) e la soglia --min-score.
+
+Confrontando le impronte con quelle dell'esecuzione precedente:
+- se niente è cambiato non viene ricostruito niente;
+- se è cambiato il codice o un file di alias vengono ricostruite tutte le tabelle;
+- altrimenti vengono ricostruite solo le tabelle che dipendono dagli input cambiati
+  (engine.TABLE_INPUTS), le altre restano quelle dell'ultima esecuzione;
+- ogni tabella ricostruita viene confrontata con la sua istantanea precedente riga per
+  riga: a PostgreSQL arrivano solo le righe nuove o modificate (upsert), le chiavi sparite
+  (DELETE) e, per le tabelle senza chiave, le sole partizioni per stagione cambiate;
+- le tabelle di riepilogo (aggregates.py) hanno una chiave per gruppo, quindi si
+  riscrivono solo i gruppi cambiati, e alla fine vengono aggiornate solo le viste
+  materializzate che leggono tabelle cambiate (pg_loader.refresh_views).
+
+Lo stato (impronte e istantanee delle tabelle) è in <output-dir>/.state/.
+
+    python integration/incremental.py                        # aggiorna i CSV in integration/output/
+    python integration/incremental.py --postgres "host=localhost dbname=MotoGP user=postgres"
+    python integration/incremental.py --duckdb               # aggiorna anche integration/output/motogp.duckdb
+    python integration/incremental.py --full                 # ignora lo stato e ricostruisce tutto
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+import engine
+from duck_store import DUCKDB_FILE, write_duckdb
+import profiling
+from profiling import profiler
+from pg_loader import DEFAULT_DSN, PARTITION_COLUMNS, TABLE_KEYS, psycopg2, integer_columns, load_table, refresh_views
+
+STATE_DIR = ".state"
+FINGERPRINTS_FILE = "fingerprints.json"
+CODE_KEY = "_code"          # voce dell'impronta di codice e alias in fingerprints.json
+
+# Moduli che calcolano le tabelle e file di alias/id letti da engine.run
+INTEGRATION_DIR = os.path.dirname(os.path.abspath(__file__))
+CODE_FILES = [os.path.join(INTEGRATION_DIR, name) for name in [
+    "engine.py", "aggregates.py", "circuit_match.py", "geo_index.py", "rider_index.py", "staging.py",
+    "window_rank.py",
+]] + [engine.CIRCUIT_ALIASES, engine.RACE_CIRCUIT_ALIASES, engine.RIDER_IDS]
+
+
+# === Impronte degli input ===
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def fingerprint(path, previous=None):
+    """Impronta di un input; riusa la precedente se dimensione e mtime non sono cambiati."""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    if previous and previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime:
+        return previous
+    return {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": file_sha256(path)}
+
+def code_fingerprint(min_score):
+    """sha256 di CODE_FILES (contenuto o assenza di ogni file) e della soglia dei nomi di circuito."""
+    digest = hashlib.sha256(f"min_score={min_score}".encode("utf-8"))
+    for path in CODE_FILES:
+        digest.update(os.path.basename(path).encode("utf-8"))
+        digest.update(file_sha256(path).encode("utf-8") if os.path.exists(path) else b"-")
+    return {"sha256": digest.hexdigest()}
+
+
+# === Differenze tra tabelle ===
+
+def row_hashes(df):
+    return pd.util.hash_pandas_object(df, index=False)
+
+def table_delta(old, new, name):
+    """
+    Differenza tra l'istantanea precedente e la nuova tabella. Restituisce un dict con
+    "rows" (righe da scrivere), "delete_keys" e "partitions" per pg_loader.load_table,
+    oppure None se le due tabelle sono identiche.
+    """
+    key = TABLE_KEYS.get(name)
+    partition = PARTITION_COLUMNS.get(name)
+    if old is None or list(old.columns) != list(new.columns) or not old.dtypes.equals(new.dtypes):
+        return {"rows": new, "delete_keys": None, "partitions": None, "full": True}
+
+    old_hash, new_hash = row_hashes(old), row_hashes(new)
+    if key:
+        changed = new[~new_hash.isin(old_hash).to_numpy()]
+        removed = old[key].drop_duplicates().merge(new[key].drop_duplicates(), how="left", on=key, indicator=True)
+        removed = removed[removed["_merge"] == "left_only"][key]
+        if changed.empty and removed.empty:
+            return None
+        return {"rows": changed, "delete_keys": removed, "partitions": None, "full": False}
+
+    # Senza chiave: una partizione è cambiata se il multinsieme dei suoi hash è diverso
+    def by_partition(df, hashes):
+        groups = pd.DataFrame({"p": df[partition].to_numpy(), "h": hashes.to_numpy()}).groupby("p", dropna=False)["h"]
+        return {p: tuple(sorted(h)) for p, h in groups}
+
+    old_parts, new_parts = by_partition(old, old_hash), by_partition(new, new_hash)
+    parts = sorted(p for p in set(old_parts) | set(new_parts) if old_parts.get(p) != new_parts.get(p))
+    if not parts:
+        return None
+    return {"rows": new[new[partition].isin(parts)], "delete_keys": None,
+            "partitions": (partition, parts), "full": False}
+
+
+# === Stato ===
+
+def load_state(state_dir):
+    path = os.path.join(state_dir, FINGERPRINTS_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state_dir, fingerprints):
+    path = os.path.join(state_dir, FINGERPRINTS_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(fingerprints, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+def load_snapshot(state_dir, name):
+    path = os.path.join(state_dir, f"{name}.pkl")
+    return pd.read_pickle(path) if os.path.exists(path) else None
+
+def save_snapshot(state_dir, name, df):
+    df.to_pickle(os.path.join(state_dir, f"{name}.pkl"))
+
+
+# === Esecuzione ===
+
+def run_incremental(root=engine.ROOT, output_dir=engine.OUTPUT_DIR, dsn=None, full=False,
+                    min_score=engine.MIN_SCORE, duckdb_path=None):
+    if dsn and psycopg2 is None:
+        raise RuntimeError("psycopg2 non installato: pip install psycopg2-binary")
+    start = time.perf_counter()
+    state_dir = os.path.join(output_dir, STATE_DIR)
+    os.makedirs(state_dir, exist_ok=True)
+    previous = {} if full else load_state(state_dir)
+
+    fingerprints = {}
+    changed_inputs = set()
+    for name, rel_path in engine.INPUTS.items():
+        old = previous.get(name)
+        with profiler.stage("fingerprint"):
+            new = fingerprints[name] = fingerprint(os.path.join(root, rel_path), old)
+        if (old or {}).get("sha256") == (new or {}).get("sha256"):
+            continue
+        changed_inputs.add(name)
+        print(f"[i] Input {'rimosso' if new is None else 'cambiato'}: {rel_path}")
+    code_changed = previous.get(CODE_KEY) != code_fingerprint(min_score)
+    if code_changed and previous:
+        print("[i] Codice dell'integrazione, alias o --min-score cambiati: si ricostruiscono tutte le tabelle")
+
+    def buildable(table):
+        return all(fingerprints[name] is not None for name in engine.TABLE_INPUTS[table])
+
+    def has_snapshot(table):
+        return os.path.exists(os.path.join(state_dir, f"{table}.pkl"))
+
+    affected = [t for t in engine.OUTPUT_TABLES
+                if changed_inputs & set(engine.TABLE_INPUTS[t])
+                or (buildable(t) and (code_changed or not has_snapshot(t)))]
+    if not affected:
+        if duckdb_path and not os.path.exists(duckdb_path):
+            write_duckdb({name: load_snapshot(state_dir, name) for name in engine.OUTPUT_TABLES
+                          if has_snapshot(name)}, duckdb_path)
+            print(f"✅ Database DuckDB creato dalle istantanee: '{duckdb_path}'")
+        fingerprints[CODE_KEY] = code_fingerprint(min_score)
+        save_state(state_dir, fingerprints)
+        print(f"✅ Nessun input cambiato, niente da ricostruire ({time.perf_counter() - start:.2f}s)")
+        return {}
+
+    print(f"[i] Tabelle da ricostruire: {', '.join(affected)}")
+    tables, _ = engine.run(root, min_score, os.path.join(output_dir, engine.RIDER_REVIEW_FILE), only=affected)
+
+    conn = psycopg2.connect(dsn) if dsn else None
+    deltas = {}
+    try:
+        for name, df in tables.items():
+            with profiler.stage("delta", rows_in=len(df)) as s:
+                delta = table_delta(None if full else load_snapshot(state_dir, name), df, name)
+                s["rows_out"] = len(delta["rows"]) if delta else 0
+            deltas[name] = delta
+            if delta is None:
+                print(f"   {name:<16} invariata")
+                continue
+            removed = len(delta["delete_keys"]) if delta["delete_keys"] is not None else 0
+            scope = "completa" if delta["full"] else (
+                f"partizioni {delta['partitions'][0]} {', '.join(map(str, delta['partitions'][1]))}"
+                if delta["partitions"] else "righe cambiate")
+            print(f"   {name:<16} {len(delta['rows']):6d} righe da scrivere, {removed} da eliminare ({scope})")
+            if conn is not None:
+                with profiler.stage("write_postgres", rows_in=len(delta["rows"])) as s:
+                    s["rows_out"], _ = load_table(conn, name, integer_columns(delta["rows"], name),
+                               TABLE_KEYS.get(name), delete_keys=delta["delete_keys"],
+                               partitions=None if delta["full"] else delta["partitions"],
+                               replace=delta["full"])
+            with profiler.stage("write_csv", rows_in=len(df)) as s:
+                df.to_csv(os.path.join(output_dir, f"{name}.csv"), index=False)
+                save_snapshot(state_dir, name, df)
+                s["rows_out"] = len(df)
+        if duckdb_path:
+            # un database nuovo riceve anche le tabelle invariate (dalle istantanee)
+            changed = {name: tables[name] for name, delta in deltas.items() if delta}
+            if not os.path.exists(duckdb_path):
+                changed = {name: changed[name] if name in changed else load_snapshot(state_dir, name)
+                           for name in engine.OUTPUT_TABLES if name in changed or has_snapshot(name)}
+            with profiler.stage("write_duckdb", rows_in=sum(len(df) for df in changed.values())) as s:
+                s["rows_out"] = sum(write_duckdb(changed, duckdb_path, update=True).values())
+        if conn is not None:
+            with profiler.stage("refresh_views") as s:
+                s["rows_out"] = len(refresh_views(conn, [name for name, delta in deltas.items() if delta]))
+    finally:
+        if conn is not None:
+            conn.close()
+
+    # dopo engine.run: gli alias e gli id appena salvati fanno parte di questa esecuzione
+    fingerprints[CODE_KEY] = code_fingerprint(min_score)
+    save_state(state_dir, fingerprints)
+    print(f"⏱️ Aggiornamento incrementale completato in {time.perf_counter() - start:.2f}s")
+    return deltas
+
+def main():
+    parser = argparse.ArgumentParser(description="Integrazione MotoGP incrementale (solo input e tabelle cambiati)")
+    parser.add_argument("--root", default=engine.ROOT, help="cartella del progetto con i dataset")
+    parser.add_argument("--output-dir", default=engine.OUTPUT_DIR, help="cartella dei CSV di output e dello stato")
+    parser.add_argument("--postgres", metavar="DSN", nargs="?", const=os.environ.get("MOTOGP_PG_DSN", DEFAULT_DSN),
+                        help="applica i delta anche a PostgreSQL (senza DSN: variabile MOTOGP_PG_DSN o localhost/MotoGP)")
+    parser.add_argument("--duckdb", metavar="FILE", nargs="?", const=DUCKDB_FILE,
+                        help="aggiorna anche il database DuckDB locale (solo le tabelle cambiate)")
+    parser.add_argument("--full", action="store_true", help="ignora lo stato e ricostruisce tutte le tabelle")
+    parser.add_argument("--min-score", type=float, default=engine.MIN_SCORE,
+                        help="punteggio minimo Jaro-Winkler per accettare un nome di circuito")
+    profiling.add_arguments(parser, os.path.join(engine.OUTPUT_DIR, "incremental_report.json"))
+    args = parser.parse_args()
+    profiling.start(args)
+    deltas = run_incremental(args.root, args.output_dir, args.postgres, args.full, args.min_score, args.duckdb)
+    profiling.finish(args, {"changed_tables": sorted(name for name, delta in deltas.items() if delta)})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+Caricamento in blocco delle tabelle integrate nel database PostgreSQL MotoGP (la stessa
+connessione "PostgreSQL MotoGP Conn" di motogp.ktr: localhost:5432, database MotoGP).
+
+Per ogni tabella:
+1. crea la tabella di destinazione se non esiste (tipi presi dal DataFrame, chiave primaria
+   da TABLE_KEYS);
+2. COPY FROM STDIN in formato CSV in una tabella di staging temporanea, con le righe
+   prodotte a blocchi da un generatore (nessun INSERT riga per riga);
+3. un caricamento completo sostituisce il contenuto della tabella (DELETE + INSERT nella
+   stessa transazione): gli id di sequenza del ktr (id_race, id_rider_seq, circuit_id,
+   team_id) dipendono dall'ordine degli input, quindi un upsert lascerebbe le righe di
+   un'esecuzione precedente più grande o sovrascriverebbe la gara sbagliata; i delta di
+   incremental.py fanno upsert con INSERT ... SELECT DISTINCT ON (chiave) ... ON CONFLICT
+   DO UPDATE ed eliminano le chiavi sparite con un DELETE ... USING su una seconda tabella
+   temporanea caricata con COPY. Ricaricare è sempre idempotente;
+4. sopra INDEX_REBUILD_MIN_ROWS righe gli indici secondari vengono eliminati prima
+   dell'upsert e ricreati dopo.
+
+Alla fine stampa righe e righe/s per tabella e aggiorna le viste materializzate
+(MATERIALIZED_VIEWS) che leggono le tabelle caricate: la prima volta vengono create con i
+loro indici, poi REFRESH MATERIALIZED VIEW CONCURRENTLY (le letture non si bloccano).
+
+    python integration/pg_loader.py --dsn "host=localhost dbname=MotoGP user=postgres"
+    python integration/engine.py --postgres "host=localhost dbname=MotoGP user=postgres"
+"""
+import argparse
+import io
+import os
+import time
+
+import pandas as pd
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+DEFAULT_DSN = "host=localhost port=5432 dbname=MotoGP user=postgres"
+INPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
+COPY_CHUNK_ROWS = 10000
+INDEX_REBUILD_MIN_ROWS = 50000
+NULL_MARKER = r"\N"
+
+# Chiave di upsert per tabella; None = nessuna chiave naturale, la tabella viene sostituita
+# (o solo le partizioni di PARTITION_COLUMNS cambiate, nei caricamenti incrementali)
+TABLE_KEYS = {
+    "race": ["id_race"],
+    "info_race": ["id_race"],
+    "circuit": ["circuit_id"],
+    "teams": ["team_id"],
+    "team_standings": ["year", "category", "team_name"],
+    "rider": ["id_rider_seq"],
+    "partecipation": None,
+    "rider_season": ["year", "category", "rider_id"],
+    "rider_circuit": ["category", "circuit_name", "rider_id"],
+    "constructor_season": ["year", "category", "bike_name"],
+    "circuit_weather": ["circuit_id", "condition"],
+}
+PARTITION_COLUMNS = {
+    "partecipation": "year",
+}
+# Colonne intere (id, anni, posizioni, conteggi): read_csv le legge come float quando hanno
+# valori mancanti. Le altre colonne numeriche (punti, velocità, medie, meteo) restano float
+# anche se in un caricamento sono tutte intere, così il tipo in PostgreSQL non cambia.
+INTEGER_COLUMNS = {
+    "race": ["year", "circuit_id", "id_race"],
+    "info_race": ["id_race"],
+    "circuit": ["length", "constructed", "modifies", "circuit_id"],
+    "teams": ["team_id"],
+    "team_standings": ["year", "final_position", "team_id"],
+    "rider": ["1st_pos", "2nd_pos", "3rd_pos", "other_pos", "number", "id_rider_seq"],
+    "partecipation": ["year", "id_rider_seq", "position", "number", "race_id", "bike_id", "team_id", "id_race"],
+    "rider_season": ["year", "rider_id", "races", "wins", "podiums", "best_position", "season_rank"],
+    "rider_circuit": ["rider_id", "starts", "wins", "podiums", "best_position", "grid_starts"],
+    "constructor_season": ["year", "races", "entries", "riders", "wins", "podiums", "best_position",
+                           "season_rank"],
+    "circuit_weather": ["circuit_id", "races", "first_year", "last_year", "winners_known", "pole_wins"],
+}
+
+# Viste materializzate per le dashboard (tabelle di riepilogo di aggregates.py): tabelle
+# lette, query, indice univoco (necessario per il REFRESH CONCURRENTLY) e indici secondari
+MATERIALIZED_VIEWS = {
+    "mv_rider_standings": {
+        "tables": ["rider_season"],
+        "query": """
+            SELECT year, category, season_rank, rider_id, rider_name, points, wins, podiums, races,
+                   avg_position,
+                   SUM(wins) OVER (PARTITION BY rider_id, category ORDER BY year) AS career_wins
+            FROM rider_season""",
+        "unique": ["year", "category", "rider_id"],
+        "indexes": [["year", "category", "season_rank"], ["rider_id"]],
+    },
+    "mv_constructor_standings": {
+        "tables": ["constructor_season"],
+        "query": """
+            SELECT year, category, season_rank, bike_name, points, wins, podiums, races, riders,
+                   FIRST_VALUE(points) OVER (PARTITION BY year, category ORDER BY season_rank) - points
+                       AS gap_to_leader
+            FROM constructor_season""",
+        "unique": ["year", "category", "bike_name"],
+        "indexes": [["year", "category", "season_rank"]],
+    },
+    "mv_circuit_specialists": {
+        "tables": ["rider_circuit"],
+        "query": """
+            SELECT category, circuit_name, rider_id, rider_name, starts, wins, podiums, win_rate,
+                   avg_grid, positions_gained,
+                   RANK() OVER (PARTITION BY category, circuit_name ORDER BY wins DESC, podiums DESC)
+                       AS circuit_rank
+            FROM rider_circuit""",
+        "unique": ["category", "circuit_name", "rider_id"],
+        "indexes": [["circuit_name", "category", "circuit_rank"], ["rider_id"]],
+    },
+    "mv_circuit_weather": {
+        "tables": ["circuit_weather", "circuit"],
+        "query": """
+            SELECT w.circuit_id, w.condition, c.name_circuit, c.country, c.length, w.races,
+                   w.avg_temp_max, w.avg_temp_min, w.avg_rain, w.pole_wins, w.avg_winner_grid,
+                   w.avg_winner_speed
+            FROM circuit_weather w LEFT JOIN circuit c ON c.circuit_id = w.circuit_id""",
+        "unique": ["circuit_id", "condition"],
+        "indexes": [["country"], ["condition"]],
+    },
+}
+
+
+def quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def column_type(series):
+    if pd.api.types.is_bool_dtype(series):
+        return "BOOLEAN"
+    if pd.api.types.is_integer_dtype(series):
+        return "BIGINT"
+    if pd.api.types.is_float_dtype(series):
+        return "DOUBLE PRECISION"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "DATE"
+    return "TEXT"
+
+
+class CopyStream(io.TextIOBase):
+    """File in sola lettura che produce il CSV del DataFrame a blocchi di COPY_CHUNK_ROWS righe."""
+
+    def __init__(self, df, chunk_rows=COPY_CHUNK_ROWS):
+        self._chunks = self._generate(df, chunk_rows)
+        self._buffer = ""
+
+    def _generate(self, df, chunk_rows):
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows].to_csv(
+                header=False, index=False, na_rep=NULL_MARKER, date_format="%Y-%m-%d", lineterminator="\n"
+            )
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            data, self._buffer = self._buffer, ""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+def ensure_table(cur, name, df, key):
+    columns = ", ".join(f"{quote(col)} {column_type(df[col])}" for col in df.columns)
+    if key:
+        columns += f", PRIMARY KEY ({', '.join(quote(k) for k in key)})"
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {quote(name)} ({columns})")
+
+def secondary_indexes(cur, name):
+    """Definizioni degli indici della tabella che non appartengono a un vincolo (PK/UNIQUE)."""
+    cur.execute("""
+        SELECT i.indexname, i.indexdef
+        FROM pg_indexes i
+        WHERE i.schemaname = current_schema() AND i.tablename = %s
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname)
+        ORDER BY i.indexname
+    """, (name,))
+    return cur.fetchall()
+
+def load_table(conn, name, df, key, delete_keys=None, partitions=None, replace=False):
+    """
+    Carica un DataFrame nella tabella `name`; restituisce (righe, secondi).
+
+    delete_keys  DataFrame con le chiavi da eliminare prima dell'upsert (tabelle con chiave)
+    partitions   (colonna, valori): per le tabelle senza chiave sostituisce solo quelle partizioni
+    replace      il DataFrame è la tabella completa: le righe esistenti vengono eliminate
+    """
+    start = time.perf_counter()
+    if key:
+        missing = df[key].isna().any(axis=1)
+        if missing.any():
+            print(f"[!] {name}: {int(missing.sum())} righe senza chiave ({', '.join(key)}) scartate")
+            df = df[~missing]
+    staging = f"{name}_staging"
+    columns = ", ".join(quote(col) for col in df.columns)
+    with conn.cursor() as cur:
+        ensure_table(cur, name, df, key)
+        cur.execute(f"CREATE TEMP TABLE {quote(staging)} (LIKE {quote(name)} INCLUDING DEFAULTS) ON COMMIT DROP")
+        cur.copy_expert(
+            f"COPY {quote(staging)} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{NULL_MARKER}')",
+            CopyStream(df),
+        )
+
+        indexes = secondary_indexes(cur, name) if len(df) >= INDEX_REBUILD_MIN_ROWS else []
+        for index_name, _ in indexes:
+            cur.execute(f"DROP INDEX {quote(index_name)}")
+
+        if key and delete_keys is not None and len(delete_keys):
+            # anche le chiavi da eliminare passano da COPY: un solo DELETE ... USING
+            deleted = f"{name}_deleted"
+            keys = ", ".join(quote(k) for k in key)
+            cur.execute(f"CREATE TEMP TABLE {quote(deleted)} ON COMMIT DROP AS "
+                        f"SELECT {keys} FROM {quote(name)} WITH NO DATA")
+            cur.copy_expert(f"COPY {quote(deleted)} ({keys}) FROM STDIN WITH (FORMAT csv, NULL '{NULL_MARKER}')",
+                            CopyStream(integer_columns(delete_keys[key], name)))
+            condition = " AND ".join(f"t.{quote(k)} = d.{quote(k)}" for k in key)
+            cur.execute(f"DELETE FROM {quote(name)} t USING {quote(deleted)} d WHERE {condition}")
+
+        if replace or (not key and partitions is None):
+            cur.execute(f"DELETE FROM {quote(name)}")
+        elif not key:
+            column, values = partitions
+            cur.execute(f"DELETE FROM {quote(name)} WHERE {quote(column)} = ANY(%s)",
+                        ([v.item() if hasattr(v, "item") else v for v in values],))
+
+        if key:
+            keys = ", ".join(quote(k) for k in key)
+            updates = ", ".join(f"{quote(col)} = EXCLUDED.{quote(col)}" for col in df.columns if col not in key)
+            action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+            cur.execute(
+                f"INSERT INTO {quote(name)} ({columns}) "
+                f"SELECT DISTINCT ON ({keys}) {columns} FROM {quote(staging)} "
+                f"ON CONFLICT ({keys}) {action}"
+            )
+        else:
+            cur.execute(f"INSERT INTO {quote(name)} ({columns}) SELECT {columns} FROM {quote(staging)}")
+
+        for _, index_def in indexes:
+            cur.execute(index_def)
+    conn.commit()
+    return len(df), time.perf_counter() - start
+
+def existing_relations(cur, names):
+    cur.execute("SELECT c.relname FROM pg_class c WHERE c.relnamespace = current_schema()::regnamespace "
+                "AND c.relname = ANY(%s)", (list(names),))
+    return {row[0] for row in cur.fetchall()}
+
+def refresh_views(conn, changed_tables):
+    """
+    Crea o aggiorna le viste materializzate che leggono le tabelle in `changed_tables`;
+    quelle di cui manca qualche tabella vengono saltate. Restituisce le viste aggiornate.
+    """
+    views = {name: view for name, view in MATERIALIZED_VIEWS.items() if set(view["tables"]) & set(changed_tables)}
+    refreshed = []
+    with conn.cursor() as cur:
+        tables = {t for view in views.values() for t in view["tables"]}
+        existing = existing_relations(cur, tables | set(views))
+    for name, view in views.items():
+        if not set(view["tables"]) <= existing:
+            continue
+        start = time.perf_counter()
+        try:
+            with conn.cursor() as cur:
+                if name in existing:
+                    cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {quote(name)}")
+                else:
+                    cur.execute(f"CREATE MATERIALIZED VIEW {quote(name)} AS {view['query']}")
+                    columns = ", ".join(quote(c) for c in view["unique"])
+                    cur.execute(f"CREATE UNIQUE INDEX {quote(name + '_key')} ON {quote(name)} ({columns})")
+                    for index in view["indexes"]:
+                        columns = ", ".join(quote(c) for c in index)
+                        cur.execute(f"CREATE INDEX {quote(name + '_' + '_'.join(index))} ON {quote(name)} ({columns})")
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            print(f"❌ Errore nell'aggiornamento della vista '{name}': {e}")
+            continue
+        refreshed.append(name)
+        print(f"✅ {name:<24} {'aggiornata' if name in existing else 'creata'} in {time.perf_counter() - start:.2f}s")
+    return refreshed
+
+def load_tables(tables, dsn=DEFAULT_DSN):
+    """Sostituisce tutte le tabelle ({nome: DataFrame}); ogni tabella è una transazione."""
+    if psycopg2 is None:
+        raise RuntimeError("psycopg2 non installato: pip install psycopg2-binary")
+    stats = {}
+    conn = psycopg2.connect(dsn)
+    try:
+        for name, df in tables.items():
+            try:
+                stats[name] = load_table(conn, name, integer_columns(df, name), TABLE_KEYS.get(name),
+                                         replace=True)
+            except psycopg2.Error as e:
+                conn.rollback()
+                print(f"❌ Errore nel caricamento di '{name}': {e}")
+                continue
+            rows, seconds = stats[name]
+            print(f"✅ {name:<16} {rows:7d} righe in {seconds:6.2f}s ({rows / seconds if seconds else 0:,.0f} righe/s)")
+        refresh_views(conn, stats)
+    finally:
+        conn.close()
+    return stats
+
+def integer_columns(df, name):
+    """Converte in Int64 le colonne di INTEGER_COLUMNS lette come float (con valori mancanti)."""
+    df = df.copy()
+    for col in INTEGER_COLUMNS.get(name, []):
+        if col in df.columns and pd.api.types.is_float_dtype(df[col]):
+            df[col] = df[col].round().astype("Int64")
+    return df
+
+def read_tables(input_dir):
+    """
+    Tabelle scritte da engine.py (un CSV per tabella), con le date di gara come date e le
+    colonne di INTEGER_COLUMNS come Int64 anche se hanno valori mancanti.
+    """
+    tables = {}
+    for name in TABLE_KEYS:
+        path = os.path.join(input_dir, f"{name}.csv")
+        if not os.path.exists(path):
+            continue
+        df = pd.read_csv(path, keep_default_na=False, na_values=[""])
+        if "date" in df.columns:
+            df["date"] = pd.to_datetime(df["date"], errors="coerce")
+        tables[name] = integer_columns(df, name)
+    return tables
+
+def main():
+    parser = argparse.ArgumentParser(description="COPY delle tabelle integrate in PostgreSQL")
+    parser.add_argument("--dsn", default=os.environ.get("MOTOGP_PG_DSN", DEFAULT_DSN),
+                        help="stringa di connessione (default: variabile MOTOGP_PG_DSN o localhost/MotoGP)")
+    parser.add_argument("--input-dir", default=INPUT_DIR, help="cartella dei CSV scritti da engine.py")
+    args = parser.parse_args()
+
+    tables = read_tables(args.input_dir)
+    if not tables:
+        print(f"[!] Nessuna tabella trovata in '{args.input_dir}'")
+        return
+    load_tables(tables, args.dsn)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Indice di identità dei piloti: risolve i nomi di tutte le fonti su riders.id.
+
+I nomi arrivano in forme diverse:
+    riders.csv                      first_name / last_name
+    riders-info.csv                 "AGOSTINI Giacomo", "DE ANGELIS Alex" (cognome maiuscolo prima)
+    riders-finishing-positions.csv  "Giacomo Agostini"
+    motogp_griglia.csv              testo dei link di it.wikipedia ("Alex Mariñelarena")
+    race_results_view.csv           "Rossi, Valentino"
+
+Ogni nome viene diviso in (nome, cognome) riconoscendo il cognome in testa (virgola o
+parole tutte maiuscole), poi ridotto a una chiave: token minuscoli senza accenti né
+punteggiatura, ordinati. La chiave si cerca in un dizionario chiave → rider_id (una sola
+lookup hash); i nomi non trovati passano al blocco dei piloti con un token del cognome in
+comune e vengono accettati solo sopra MIN_SCORE (Jaro-Winkler su "nome cognome"). Una
+chiave condivisa da più piloti di riders.csv (omonimi) non viene risolta e va in revisione
+come "ambiguo", a meno che rider_ids.json non la associ a un id.
+
+Le risoluzioni per similarità restano in integration/rider_ids.json (modificabile a mano)
+e le esecuzioni successive le trovano con la lookup diretta; i nomi non risolti finiscono
+nel file di revisione invece di sparire in un merge join.
+"""
+import csv
+import json
+import os
+
+from circuit_match import jaro_winkler, normalize
+
+MIN_SCORE = 0.92
+ID_MAP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rider_ids.json")
+REVIEW_FIELDS = ["source", "name", "candidate", "candidate_id", "score"]
+
+
+def is_upper_token(token):
+    letters = [c for c in token if c.isalpha()]
+    return len(letters) > 1 and all(c.isupper() for c in letters)
+
+def split_name(raw):
+    """
+    Restituisce (nome, cognome):
+    "Rossi, Valentino" → ("Valentino", "Rossi"); "DE ANGELIS Alex" → ("Alex", "DE ANGELIS");
+    "Alex De Angelis" → ("Alex", "De Angelis").
+    """
+    raw = " ".join(str(raw).split())
+    if "," in raw:
+        last, first = [p.strip() for p in raw.split(",", 1)]
+        return first, last
+    tokens = raw.split()
+    upper = 0
+    while upper < len(tokens) and is_upper_token(tokens[upper]):
+        upper += 1
+    if 0 < upper < len(tokens):
+        return " ".join(tokens[upper:]), " ".join(tokens[:upper])
+    if len(tokens) < 2:
+        return "", raw
+    return tokens[0], " ".join(tokens[1:])
+
+def name_key(first, last):
+    return " ".join(sorted(normalize(f"{first} {last}").split()))
+
+
+class RiderIndex:
+    def __init__(self, riders, id_map_path=None, min_score=MIN_SCORE):
+        """riders: DataFrame di riders.csv (id, first_name, last_name)."""
+        self.min_score = min_score
+        self.id_map_path = id_map_path
+        self.by_key = {}              # chiave → rider_id
+        self.display = {}             # rider_id → (nome normalizzato "nome cognome", nome originale)
+        self.by_surname = {}          # token del cognome → rider_id
+        self.ambiguous = {}           # chiave condivisa da più piloti → rider_id in conflitto
+        for rider_id, first, last in zip(riders["id"], riders["first_name"], riders["last_name"]):
+            if rider_id is None or rider_id != rider_id:
+                continue
+            rider_id = int(rider_id)
+            first = "" if first != first or first is None else first
+            last = "" if last != last or last is None else last
+            key = name_key(first, last)
+            if key in self.by_key and self.by_key[key] != rider_id:
+                self.ambiguous.setdefault(key, [self.by_key[key]]).append(rider_id)
+                continue
+            self.by_key.setdefault(key, rider_id)
+            self.display[rider_id] = (normalize(f"{first} {last}"), f"{first} {last}".strip())
+            for token in normalize(last).split():
+                self.by_surname.setdefault(token, []).append(rider_id)
+
+        self.id_map = {}
+        self.learned = 0
+        if id_map_path and os.path.exists(id_map_path):
+            with open(id_map_path, "r", encoding="utf-8") as f:
+                self.id_map = json.load(f)
+        for key in self.ambiguous:
+            del self.by_key[key]
+        self.by_key.update({k: v for k, v in self.id_map.items() if v is not None})
+        self.resolved = {}            # (fonte, nome grezzo) → rider_id, per non ripetere il lavoro
+        self.review = {}
+
+    def _fuzzy(self, first, last):
+        query = normalize(f"{first} {last}")
+        candidates = set()
+        for token in normalize(last).split() + normalize(first).split():
+            candidates.update(self.by_surname.get(token, ()))
+        best_id, best_score = None, 0.0
+        for rider_id in sorted(candidates):
+            score = jaro_winkler(query, self.display[rider_id][0])
+            if score > best_score:
+                best_id, best_score = rider_id, score
+        return best_id, best_score
+
+    def resolve(self, raw, source):
+        """rider_id di un nome di una fonte, oppure None (il nome va nel file di revisione)."""
+        if raw is None or raw != raw or not str(raw).strip():
+            return None
+        if (source, raw) in self.resolved:
+            return self.resolved[(source, raw)]
+
+        first, last = split_name(raw)
+        key = name_key(first, last)
+        rider_id = self.by_key.get(key)
+        if rider_id is None and key in self.ambiguous:
+            self.review[(source, raw)] = {"source": source, "name": raw, "candidate": "ambiguo",
+                                          "candidate_id": " ".join(map(str, self.ambiguous[key])), "score": ""}
+        elif rider_id is None:
+            candidate, score = self._fuzzy(first, last)
+            if candidate is not None and score >= self.min_score:
+                rider_id = candidate
+                self.by_key[key] = rider_id
+                self.id_map[key] = rider_id
+                self.learned += 1
+            else:
+                self.review[(source, raw)] = {
+                    "source": source,
+                    "name": raw,
+                    "candidate": self.display[candidate][1] if candidate is not None else "",
+                    "candidate_id": candidate if candidate is not None else "",
+                    "score": f"{score:.3f}",
+                }
+        self.resolved[(source, raw)] = rider_id
+        return rider_id
+
+    def resolve_series(self, names, source):
+        """Colonna di rider_id (Int64) per una colonna di nomi; ogni valore distinto è risolto una volta."""
+        ids = {name: self.resolve(name, source) for name in names.dropna().unique()}
+        return names.map(ids).astype("Int64")
+
+    def save(self):
+        if not self.id_map_path or not self.learned:
+            return
+        tmp_path = self.id_map_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(dict(sorted(self.id_map.items())), f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.id_map_path)
+        self.learned = 0
+
+    def write_review(self, path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=REVIEW_FIELDS)
+            writer.writeheader()
+            for key in sorted(self.review):
+                writer.writerow(self.review[key])
+        return len(self.review)
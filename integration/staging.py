@@ -0,0 +1,263 @@
+"""
+Staging colonnare: ogni dataset (CSV dell'archivio, CSV/JSON degli scraper) viene convertito
+una volta sola in Parquet tipizzato secondo uno schema dichiarato (SOURCES), così chi legge
+non deve più ri-analizzare testo:
+
+- interi, float (coordinate comprese) e date già convertiti; i valori non convertibili
+  diventano null e vengono contati;
+- colonne a pochi valori (classe, paese, costruttore...) salvate come dizionario (categorie);
+- i dataset con una stagione sono partizionati per stagione (staging/<nome>/season=YYYY/),
+  gli altri sono un solo file staging/<nome>/data.parquet.
+
+read_staged() legge solo le colonne richieste e, con `seasons`, solo le partizioni di quelle
+stagioni (predicate pushdown sulla partizione). engine.py la usa con --staging.
+
+    python integration/staging.py                 # converte tutte le sorgenti in staging/
+    python integration/staging.py --only quali race_weather
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGING_DIR = os.path.join(ROOT, "staging")
+SEASON_FIELD = "season"
+ROW_FIELD = "_row"          # posizione della riga nel file, per rileggere le partizioni nell'ordine originale
+
+# nome → file sorgente, colonna della stagione (None = non partizionato) e schema dichiarato.
+# Tipi: "int", "float", "date" (yyyy-MM-dd), "category", "string".
+SOURCES = {
+    "circuit": {
+        "path": "MotoGP_Circuits/circuit_data.csv", "season": None,
+        "schema": {"Name": "string", "Lat": "float", "Long": "float", "Country": "category",
+                   "Pole Position": "category", "Length in meters": "int", "Width in meters": "string",
+                   "Right Corners": "int", "Left Corners": "int", "Longest Straight": "int",
+                   "Constructed": "int", "Modified": "int"},
+    },
+    "circuits_country": {
+        "path": "MotoGP_Circuits/circuits_country.csv", "season": None,
+        "schema": {"Name": "string", "Lat": "float", "Long": "float", "Country": "category",
+                   "Pole Position": "category", "Length in meters": "int", "Width in meters": "string",
+                   "Right Corners": "int", "Left Corners": "int", "Longest Straight": "int",
+                   "Constructed": "int", "Modified": "int"},
+    },
+    "bikes": {
+        "path": "MotoGP_Results&Bikes/bikes.csv", "season": None,
+        "schema": {"id": "int", "name": "string", "country": "category"},
+    },
+    "riders": {
+        "path": "MotoGP_Results&Bikes/riders.csv", "season": None,
+        "schema": {"id": "int", "first_name": "string", "last_name": "string", "country": "category",
+                   "number": "float"},
+    },
+    "teams": {
+        "path": "MotoGP_Results&Bikes/teams.csv", "season": None,
+        "schema": {"id": "int", "name": "string", "country": "category"},
+    },
+    "race_results": {
+        "path": "MotoGP_Results&Bikes/race_results_view.csv", "season": "year",
+        "schema": {"year": "int", "category": "category", "sequence": "int", "shortname": "category",
+                   "circuit_name": "string", "rider": "int", "rider_name": "string", "team_name": "string",
+                   "bike_name": "category", "position": "int", "points": "float", "number": "float",
+                   "country": "category", "speed": "float", "time": "string"},
+    },
+    "constructor_wc": {
+        "path": "archive 1/constructure-world-championship.csv", "season": "Season",
+        "schema": {"Season": "int", "Constructor": "category", "Class": "category"},
+    },
+    "events_held": {
+        "path": "archive 1/grand-prix-events-held.csv", "season": None,
+        "schema": {"Times": "int", "Track": "string", "Country": "category"},
+    },
+    "race_winners": {
+        "path": "archive 1/grand-prix-race-winners.csv", "season": "Season",
+        "schema": {"Circuit": "string", "Class": "category", "Constructor": "category",
+                   "Country": "category", "Rider": "string", "Season": "int"},
+    },
+    "riders_info": {
+        "path": "archive 1/riders-info.csv", "season": None,
+        "schema": {"Riders All Time in All Classes": "string", "Victories": "int", "2nd places": "float",
+                   "3rd places": "float", "Pole positions from '74 to 2022": "float",
+                   "Race fastest lap to 2022": "float", "World Championships": "float"},
+    },
+    "riders_positions": {
+        "path": "archive 1/riders-finishing-positions.csv", "season": None,
+        "schema": {"Rider": "string", "Victories": "int", "NumberofSecond": "int", "NumberofThird": "int",
+                   "Numberof4th": "int", "Numberof5th": "int", "Numberof6th": "int", "Country": "category"},
+    },
+    "podium_lockouts": {
+        "path": "archive 1/same-nation-podium-lockouts.csv", "season": "Season",
+        "schema": {"Season": "int", "Track": "string", "Riders` Nation": "category", "Class": "category"},
+    },
+    "quali": {
+        "path": "scraping/motogp_griglia.csv", "season": "Year",
+        "schema": {"Year": "int", "Circuit": "string", "OfficialName": "string", "Class": "category",
+                   "RiderName": "string", "Position": "int"},
+    },
+    "race_date": {
+        "path": "scraping/motogp_gran_premi.json", "season": "Anno",
+        "schema": {"Anno": "int", "Data": "date", "Circuito": "string", "Nome_Ufficiale": "string",
+                   "Percorso": "string", "Notturna": "category", "Latitudine": "float", "Longitudine": "float"},
+    },
+    "race_weather": {
+        "path": "scraping/race_weather_data_final.json", "season": "Data",
+        "schema": {"Circuito": "string", "Data": "date", "Temp_Max": "float", "Temp_Min": "float",
+                   "Precipitazione": "float", "Condizione_Meteo": "category"},
+    },
+}
+
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("pyarrow non installato: pip install pyarrow")
+
+def read_source(path):
+    """Testo grezzo della sorgente: tutte le colonne come stringhe, "" → null."""
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            df = pd.DataFrame(json.load(f))
+        # motogp_gran_premi.json storico usa "Nome_Ufficiale", race_date_script.py scrive "Nome ufficiale"
+        if "Nome ufficiale" in df.columns:
+            df["Nome_Ufficiale"] = df.get("Nome_Ufficiale", pd.Series(index=df.index, dtype=object)).fillna(df["Nome ufficiale"])
+        return df
+    return pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[""], encoding="utf-8")
+
+def to_arrow(series, kind):
+    """Converte una colonna nel tipo dichiarato; restituisce (array, valori non convertibili)."""
+    present = series.notna() & (series.astype(str).str.strip() != "")
+    if kind == "int":
+        values = pd.to_numeric(series, errors="coerce")
+        whole = values.notna() & (values % 1 == 0)
+        array = pa.array(values.where(whole).astype("Int64"), type=pa.int64(), from_pandas=True)
+        valid = whole
+    elif kind == "float":
+        values = pd.to_numeric(series, errors="coerce")
+        array = pa.array(values.astype(float), type=pa.float64(), from_pandas=True)
+        valid = values.notna()
+    elif kind == "date":
+        values = pd.to_datetime(series.astype("string").str.slice(0, 10), format="%Y-%m-%d", errors="coerce")
+        array = pa.array(values, from_pandas=True).cast(pa.date32())
+        valid = values.notna()
+    else:
+        values = [None if pd.isna(v) else str(v) for v in series]
+        array = pa.array(values, type=pa.string())
+        if kind == "category":
+            array = array.dictionary_encode()
+        valid = present
+    return array, int((present & ~valid).sum())
+
+def stage_source(name, root=ROOT, staging_dir=STAGING_DIR):
+    """Scrive una sorgente in Parquet; restituisce un dict con righe, valori scartati e dimensioni."""
+    require_pyarrow()
+    spec = SOURCES[name]
+    path = os.path.join(root, spec["path"])
+    if not os.path.exists(path):
+        return None
+    raw = read_source(path)
+
+    arrays, names, invalid = [], [], {}
+    for column, kind in spec["schema"].items():
+        series = raw[column] if column in raw.columns else pd.Series([None] * len(raw), dtype=object)
+        array, bad = to_arrow(series, kind)
+        arrays.append(array)
+        names.append(column)
+        if bad:
+            invalid[column] = bad
+    season_column = spec["season"]
+    if season_column:
+        seasons = pd.to_numeric(raw[season_column].astype("string").str.slice(0, 4), errors="coerce")
+        arrays.append(pa.array(seasons.astype("Int64"), type=pa.int32(), from_pandas=True))
+        names.append(SEASON_FIELD)
+        arrays.append(pa.array(range(len(raw)), type=pa.int64()))
+        names.append(ROW_FIELD)
+    table = pa.Table.from_arrays(arrays, names=names)
+
+    target = os.path.join(staging_dir, name)
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    os.makedirs(target)
+    if season_column:
+        partitioning = ds.partitioning(pa.schema([(SEASON_FIELD, pa.int32())]), flavor="hive")
+        ds.write_dataset(table, target, format="parquet", partitioning=partitioning,
+                         basename_template="part-{i}.parquet")
+    else:
+        pq.write_table(table, os.path.join(target, "data.parquet"))
+
+    staged_bytes = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(target) for f in files)
+    return {"rows": table.num_rows, "invalid": invalid, "source_bytes": os.path.getsize(path),
+            "staged_bytes": staged_bytes}
+
+def is_staged(name, staging_dir=STAGING_DIR):
+    return os.path.isdir(os.path.join(staging_dir, name))
+
+def read_staged(name, columns=None, seasons=None, staging_dir=STAGING_DIR, categories=True):
+    """
+    Legge una sorgente dallo staging come DataFrame.
+
+    columns     colonne da leggere (None = tutte); le altre non vengono lette dal disco
+    seasons     stagioni da leggere (solo sorgenti partizionate): le altre partizioni sono saltate
+    categories  False per avere le colonne a dizionario come stringhe (come nei CSV)
+    """
+    require_pyarrow()
+    spec = SOURCES[name]
+    target = os.path.join(staging_dir, name)
+    if spec["season"]:
+        partitioning = ds.partitioning(pa.schema([(SEASON_FIELD, pa.int32())]), flavor="hive")
+        dataset = ds.dataset(target, format="parquet", partitioning=partitioning)
+    else:
+        dataset = ds.dataset(os.path.join(target, "data.parquet"), format="parquet")
+
+    flt = None
+    if seasons is not None:
+        if not spec["season"]:
+            raise ValueError(f"La sorgente '{name}' non è divisa per stagione")
+        flt = ds.field(SEASON_FIELD).isin([int(s) for s in seasons])
+    if spec["season"]:
+        # le partizioni tornano raggruppate per stagione: si riordina sulla posizione nel file
+        wanted = list(columns) + [ROW_FIELD] if columns is not None else None
+        table = dataset.to_table(columns=wanted, filter=flt).sort_by(ROW_FIELD).drop_columns([ROW_FIELD])
+    else:
+        table = dataset.to_table(columns=list(columns) if columns is not None else None, filter=flt)
+
+    if not categories:
+        for i, field in enumerate(table.schema):
+            if pa.types.is_dictionary(field.type):
+                table = table.set_column(i, field.name, table.column(i).cast(pa.string()))
+    int_types = {pa.int32(): pd.Int64Dtype(), pa.int64(): pd.Int64Dtype()}
+    df = table.to_pandas(types_mapper=int_types.get, date_as_object=False)
+    if columns is None and SEASON_FIELD in df.columns and spec["season"]:
+        df = df.drop(columns=[SEASON_FIELD])
+    return df
+
+def main():
+    parser = argparse.ArgumentParser(description="Converte le sorgenti MotoGP in Parquet tipizzato (staging)")
+    parser.add_argument("--root", default=ROOT, help="cartella del progetto con i dataset")
+    parser.add_argument("--staging-dir", default=STAGING_DIR, help="cartella di destinazione")
+    parser.add_argument("--only", nargs="+", choices=sorted(SOURCES), help="converte solo queste sorgenti")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for name in args.only or SOURCES:
+        info = stage_source(name, args.root, args.staging_dir)
+        if info is None:
+            print(f"[!] {name}: sorgente '{SOURCES[name]['path']}' mancante, saltata")
+            continue
+        print(f"✅ {name:<18} {info['rows']:6d} righe  {info['source_bytes'] / 1024:8.1f} KB → "
+              f"{info['staged_bytes'] / 1024:7.1f} KB")
+        for column, count in info["invalid"].items():
+            print(f"   [!] {column}: {count} valori non conformi allo schema → null")
+    print(f"⏱️ Staging completato in {time.perf_counter() - start:.2f}s in '{args.staging_dir}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Validazione dichiarativa degli input dell'integrazione, al posto delle catene di Filter rows,
+Trim e Replace in string di motogp.ktr.
+
+Per ogni dataset (i nomi di engine.INPUTS) RULES elenca le regole, applicate in un solo
+passaggio con operazioni vettoriali sulle colonne (nessun ramo riga per riga):
+
+    placeholder  valori segnaposto ("?", "Unknown") → null
+    position     posizioni "7°", "13[1]" → intero; "Rit", "NP", ... (stati) → null
+    type         conversione a int/float/date (i tipi dei CsvInput di engine.CSV_TYPES
+                 sono sempre applicati); i valori non convertibili diventano null
+    required     valore obbligatorio
+    range        valore numerico entro [min, max]
+    unique       combinazione di colonne unica (vince la prima riga)
+    reference    valore presente nella colonna di un altro dataset (già validato)
+    pattern      valore conforme a una regex
+
+Ogni regola ha un'azione: "quarantine" (la riga viene scartata), "null" (il valore viene
+annullato) o "warn" (solo segnalato); i valori corretti sono registrati con azione "fix". Le violazioni finiscono nella tabella di quarantena
+(quarantine.csv: dataset, riga, regola, colonna, valore, azione e, per le righe scartate,
+il record originale) e nel riepilogo per dataset (validation_summary.json).
+
+    python integration/validation.py                 # valida gli input, report in integration/output/
+    python integration/engine.py --validate          # integrazione sugli input validati
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+QUARANTINE_FILE = "quarantine.csv"
+SUMMARY_FILE = "validation_summary.json"
+QUARANTINE_COLUMNS = ["dataset", "row", "rule", "column", "value", "action", "record"]
+# Stati al posto della posizione (ritirato, non partito, non qualificato, squalificato...)
+POSITION_STATUSES = ["rit", "np", "nq", "nc", "sq", "ret", "dnf", "dns", "dnq", "dsq", "exc", "ab"]
+POSITION_PATTERN = r"^\s*(\d+)\s*(?:°|º|\[\d+\])?\s*$"
+FIRST_SEASON = 1949
+
+# Regole per dataset, in ordine di validazione: i dataset citati da una regola "reference"
+# vengono prima di chi li cita
+RULES = {
+    "circuit": [
+        {"check": "required", "columns": ["Name"]},
+        {"check": "range", "column": "Lat", "min": -90, "max": 90, "action": "null"},
+        {"check": "range", "column": "Long", "min": -180, "max": 180, "action": "null"},
+        {"check": "range", "column": "Length in meters", "min": 1000, "max": 10000, "action": "warn"},
+        {"check": "unique", "columns": ["Name"]},
+    ],
+    "bikes": [
+        {"check": "placeholder", "column": "country", "values": ["?"]},
+        {"check": "required", "columns": ["id", "name"]},
+        {"check": "unique", "columns": ["id"]},
+        {"check": "unique", "columns": ["name"]},
+    ],
+    "riders": [
+        {"check": "required", "columns": ["id"]},
+        {"check": "unique", "columns": ["id"]},
+        {"check": "range", "column": "number", "min": 0, "max": 999, "action": "null"},
+    ],
+    # "?" è anche il nome di un team: i risultati lo usano come chiave di join, quindi il
+    # nome resta (segnalato) e si annulla solo il paese
+    "teams": [
+        {"check": "placeholder", "column": "country", "values": ["?"]},
+        {"check": "placeholder", "column": "name", "values": ["?"], "action": "warn"},
+        {"check": "required", "columns": ["id"]},
+        {"check": "unique", "columns": ["id"]},
+        {"check": "unique", "columns": ["name"]},
+    ],
+    "race_results": [
+        {"check": "required", "columns": ["year", "category", "rider"]},
+        {"check": "range", "column": "year", "min": FIRST_SEASON, "max": None},
+        {"check": "position", "column": "position", "max": 60},
+        {"check": "range", "column": "points", "min": 0, "max": 50},
+        {"check": "range", "column": "speed", "min": 0, "max": 400, "action": "null"},
+        {"check": "placeholder", "column": "team_name", "values": ["?"], "action": "warn"},
+        {"check": "reference", "column": "rider", "dataset": "riders", "key": "id", "action": "warn"},
+        {"check": "reference", "column": "bike_name", "dataset": "bikes", "key": "name"},
+        {"check": "reference", "column": "team_name", "dataset": "teams", "key": "name"},
+        {"check": "unique", "columns": ["year", "category", "sequence", "rider"]},
+    ],
+    "constructor_wc": [
+        {"check": "required", "columns": ["Season", "Constructor", "Class"]},
+        {"check": "range", "column": "Season", "min": FIRST_SEASON, "max": None},
+    ],
+    "riders_info": [
+        {"check": "required", "columns": ["Riders All Time in All Classes"]},
+        {"check": "range", "column": "Victories", "min": 0, "max": None},
+    ],
+    "riders_positions": [
+        {"check": "required", "columns": ["Rider"]},
+        {"check": "range", "column": "Victories", "min": 0, "max": None},
+    ],
+    # In motogp_griglia.csv "Circuit" contiene il nome del GP e "OfficialName" il circuito
+    # (engine.motogp_with_quali fa il join su OfficialName): una riga con un nome di GP
+    # fuori posto ha le colonne invertite. Lo stesso circuito può ospitare due GP nella
+    # stessa stagione (Jerez 2020), quindi l'unicità include il nome del GP
+    "quali": [
+        {"check": "required", "columns": ["Year", "OfficialName", "RiderName"]},
+        {"check": "position", "column": "Position", "max": 60},
+        {"check": "range", "column": "Year", "min": FIRST_SEASON, "max": None},
+        {"check": "pattern", "column": "Circuit", "regex": r"(?i)^(?:GP|Gran Premio)\b", "action": "warn"},
+        {"check": "pattern", "column": "OfficialName", "regex": r"(?i)^(?!GP\b|Gran Premio\b)",
+         "action": "quarantine"},
+        {"check": "unique", "columns": ["Year", "Circuit", "Class", "RiderName"]},
+    ],
+    "race_date": [
+        {"check": "type", "column": "Data", "type": "date"},
+        {"check": "type", "column": "Latitudine", "type": float},
+        {"check": "type", "column": "Longitudine", "type": float},
+        {"check": "required", "columns": ["Data", "Circuito"]},
+        {"check": "range", "column": "Latitudine", "min": -90, "max": 90, "action": "null"},
+        {"check": "range", "column": "Longitudine", "min": -180, "max": 180, "action": "null"},
+        {"check": "unique", "columns": ["Data"]},
+    ],
+    "race_weather": [
+        {"check": "type", "column": "Data", "type": "date"},
+        {"check": "required", "columns": ["Data", "Circuito"]},
+        {"check": "range", "column": "Temp_Max", "min": -30, "max": 60, "action": "null"},
+        {"check": "range", "column": "Temp_Min", "min": -30, "max": 60, "action": "null"},
+        {"check": "range", "column": "Precipitazione", "min": 0, "max": 500, "action": "null"},
+        {"check": "unique", "columns": ["Data"]},
+    ],
+}
+# Regole che correggono i valori (applicate prima dei tipi) e azione predefinita per tipo
+REPAIRS = ("placeholder", "position")
+DEFAULT_ACTIONS = {"placeholder": "null", "position": "null", "type": "null", "pattern": "warn"}
+
+
+def blank(series):
+    return series.isna() | series.astype("string").str.strip().eq("")
+
+def convert(series, typ):
+    """Stessa conversione di engine.read_csv (int → Int64, float), più le date yyyy-MM-dd."""
+    if typ == "date":
+        return pd.to_datetime(series, format="%Y-%m-%d", errors="coerce").dt.strftime("%Y-%m-%d").astype(object)
+    values = pd.to_numeric(series, errors="coerce")
+    return values.astype("Int64") if typ is int else values.astype(float)
+
+def parse_positions(series):
+    """(posizioni intere, maschera degli stati, maschera dei valori non riconosciuti)."""
+    text = series.astype("string").str.strip()
+    number = text.str.extract(POSITION_PATTERN, expand=False)
+    status = text.str.lower().str.rstrip(".").isin(POSITION_STATUSES).fillna(False).to_numpy(bool)
+    invalid = (number.isna() & ~blank(series)).to_numpy(bool) & ~status
+    return pd.to_numeric(number, errors="coerce").astype("Int64"), status, invalid
+
+
+def validate(name, df, types=None, references=None, rules=None):
+    """
+    Valida un dataset letto come testo con i `types` di engine e le regole di RULES[name];
+    `references` sono i dataset già validati ({nome: DataFrame}).
+    Restituisce (righe valide con i tipi applicati, violazioni, riepilogo).
+    """
+    df = df.reset_index(drop=True).copy()
+    rules = RULES.get(name, []) if rules is None else rules
+    references = references or {}
+    quarantined = np.zeros(len(df), dtype=bool)
+    violations = []
+    counts = {}
+
+    def report(rule, column, mask, action, values=None):
+        mask = np.asarray(mask, dtype=bool)
+        if not mask.any():
+            return
+        label = f"{rule['check']}:{column}"
+        counts[label] = counts.get(label, 0) + int(mask.sum())
+        rows = np.flatnonzero(mask)
+        source = df[column] if values is None else values
+        violations.append(pd.DataFrame({"dataset": name, "row": rows, "rule": label, "column": column,
+                                        "value": source.iloc[rows].astype("string").to_numpy(),
+                                        "action": action}))
+
+    def apply(rule, column, mask, values=None):
+        action = rule.get("action", DEFAULT_ACTIONS.get(rule["check"], "quarantine"))
+        report(rule, column, mask, action, values)
+        if action == "quarantine":
+            quarantined[:] |= np.asarray(mask, dtype=bool)
+        elif action == "null":
+            df.loc[np.asarray(mask, dtype=bool), column] = None
+
+    # 1. correzioni sui valori testuali
+    for rule in rules:
+        column = rule.get("column")
+        if rule["check"] not in REPAIRS or column not in df.columns:
+            continue
+        if rule["check"] == "placeholder":
+            apply(rule, column, df[column].astype("string").str.strip().isin(rule["values"]).fillna(False))
+        else:
+            positions, status, invalid = parse_positions(df[column])
+            repaired = positions.notna().to_numpy(bool) & ~df[column].astype("string").str.strip().str.fullmatch(
+                r"\d+").fillna(False).to_numpy(bool)
+            report(rule, column, repaired, "fix")
+            report(dict(rule, check="status"), column, status, "null")
+            apply(rule, column, invalid)
+            df[column] = positions.where(~invalid)
+
+    # 2. tipi: quelli di engine e quelli dichiarati nelle regole
+    declared = dict(types or {})
+    declared.update({r["column"]: r["type"] for r in rules if r["check"] == "type"})
+    for column, typ in declared.items():
+        if column not in df.columns:
+            continue
+        converted = convert(df[column], typ)
+        rule = next((r for r in rules if r["check"] == "type" and r["column"] == column), {"check": "type"})
+        report(rule, column, converted.isna().to_numpy(bool) & ~blank(df[column]).to_numpy(bool),
+               rule.get("action", "null"))
+        df[column] = converted
+
+    # 3. controlli
+    for rule in rules:
+        check = rule["check"]
+        if check == "required":
+            for column in rule["columns"]:
+                if column in df.columns:
+                    apply(rule, column, blank(df[column]))
+        elif check == "range" and rule["column"] in df.columns:
+            values = pd.to_numeric(df[rule["column"]], errors="coerce").astype(float)
+            outside = np.zeros(len(df), dtype=bool)
+            if rule.get("min") is not None:
+                outside |= (values < rule["min"]).to_numpy()
+            if rule.get("max") is not None:
+                outside |= (values > rule["max"]).to_numpy()
+            apply(rule, rule["column"], outside)
+        elif check == "position" and rule.get("max") is not None and rule["column"] in df.columns:
+            values = df[rule["column"]].astype(float)
+            apply(dict(rule, check="range", action=rule.get("range_action", "null")), rule["column"],
+                  ((values < 1) | (values > rule["max"])).to_numpy())
+        elif check == "unique" and set(rule["columns"]) <= set(df.columns):
+            # le righe già scartate non contano come prima occorrenza
+            duplicated = np.zeros(len(df), dtype=bool)
+            kept = ~quarantined
+            duplicated[kept] = df.loc[kept].duplicated(rule["columns"], keep="first").to_numpy()
+            first, *others = rule["columns"]
+            values = df[first].astype("string").str.cat([df[c].astype("string") for c in others], sep=" | ",
+                                                        na_rep="") if others else None
+            apply(rule, "+".join(rule["columns"]), duplicated, values)
+        elif check == "reference" and rule["column"] in df.columns and references.get(rule["dataset"]) is not None:
+            known = references[rule["dataset"]][rule["key"]].dropna().unique()
+            values = df[rule["column"]]
+            apply(rule, rule["column"], (values.notna() & ~values.isin(known)).to_numpy(bool))
+        elif check == "pattern" and rule["column"] in df.columns:
+            regex = re.compile(rule["regex"])
+            text = df[rule["column"]].astype("string")
+            apply(rule, rule["column"], (text.notna() & ~text.str.contains(regex).fillna(False)).to_numpy(bool))
+
+    violations = pd.concat(violations, ignore_index=True) if violations else pd.DataFrame(columns=QUARANTINE_COLUMNS[:-1])
+    # record originale delle righe scartate
+    records = pd.Series(df.loc[quarantined].to_json(orient="records", lines=True, force_ascii=False,
+                                                    date_format="iso").splitlines() if quarantined.any() else [],
+                        index=np.flatnonzero(quarantined), dtype=object)
+    violations["record"] = violations["row"].map(records).where(violations["action"] == "quarantine")
+    summary = {"rows_in": len(df), "rows_out": int((~quarantined).sum()), "quarantined": int(quarantined.sum()),
+               "rules": counts}
+    return df.loc[~quarantined].reset_index(drop=True), violations, summary
+
+def validate_inputs(data, types=None):
+    """
+    Valida tutti gli input di engine.load_inputs (letti come testo) nell'ordine di RULES.
+    Restituisce (input validati, tabella di quarantena, riepilogo per dataset).
+    """
+    types = types or {}
+    clean = dict(data)
+    violations, summary = [], {}
+    for name in [*RULES, *(n for n in data if n not in RULES)]:
+        if data.get(name) is None:
+            continue
+        clean[name], found, summary[name] = validate(name, data[name], types.get(name), clean)
+        violations.append(found)
+    quarantine = pd.concat(violations, ignore_index=True) if violations else pd.DataFrame(columns=QUARANTINE_COLUMNS)
+    return clean, quarantine[QUARANTINE_COLUMNS], summary
+
+def write_report(quarantine, summary, quarantine_path):
+    """Scrive la tabella di quarantena e, accanto, il riepilogo JSON; stampa il riepilogo."""
+    os.makedirs(os.path.dirname(quarantine_path) or ".", exist_ok=True)
+    quarantine.to_csv(quarantine_path, index=False)
+    summary_path = os.path.join(os.path.dirname(quarantine_path), SUMMARY_FILE)
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=4, ensure_ascii=False)
+    for name, s in summary.items():
+        issues = ", ".join(f"{rule} {count}" for rule, count in s["rules"].items()) or "nessuna violazione"
+        print(f"   {name:<16} {s['rows_in']:6d} → {s['rows_out']:<6d} righe ({s['quarantined']} in quarantena): {issues}")
+    print(f"[i] Quarantena in '{quarantine_path}', riepilogo in '{summary_path}'")
+
+
+def main():
+    import engine
+
+    parser = argparse.ArgumentParser(description="Validazione degli input dell'integrazione MotoGP")
+    parser.add_argument("--root", default=engine.ROOT, help="cartella del progetto con i dataset")
+    parser.add_argument("--output-dir", default=engine.OUTPUT_DIR, help="cartella della quarantena e del riepilogo")
+    parser.add_argument("--only", nargs="+", choices=list(engine.INPUTS), help="valida solo questi dataset")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    data = engine.load_inputs(args.root, set(args.only) if args.only else None, raw=True)
+    _, quarantine, summary = validate_inputs(data, engine.CSV_TYPES)
+    write_report(quarantine, summary, os.path.join(args.output_dir, QUARANTINE_FILE))
+    print(f"⏱️ Validazione completata in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
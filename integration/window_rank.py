@@ -0,0 +1,73 @@
+"""
+Rank per partizione (funzioni finestra) su colonne pandas/numpy, al posto del passo
+"Modified JavaScript value 2" di motogp.ktr (rank riga per riga con variabili globali
+prevGroupKey/rank e un Sort rows obbligatorio a monte).
+
+Tutte le partizioni vengono ordinate insieme con un solo np.lexsort (codici di partizione
++ codici delle colonne di ordinamento), quindi non serve ordinare il DataFrame prima e non
+c'è nessuna chiamata per riga. A parità di chiave vale l'ordine delle righe in ingresso.
+
+Metodi:
+    "row"    numero di riga nella partizione (1, 2, 3, 4), come il passo JavaScript
+    "dense"  pari merito con lo stesso rank, senza buchi (1, 2, 2, 3)
+    "min"    pari merito con lo stesso rank, con buchi (1, 2, 2, 4)
+"""
+import numpy as np
+import pandas as pd
+
+METHODS = ("row", "dense", "min")
+
+
+def sort_codes(series, ascending=True):
+    """Codici interi che rispettano l'ordinamento della colonna; i null vanno in fondo."""
+    codes, uniques = pd.factorize(series, sort=True)
+    codes = codes.astype(np.int64)
+    missing = codes < 0
+    if not ascending:
+        codes = len(uniques) - 1 - codes
+    codes[missing] = len(uniques)
+    return codes
+
+def window_rank(df, partition_by, order_by, ascending=True, method="row"):
+    """
+    Rank (1..n) di ogni riga nella sua partizione, nell'ordine del DataFrame in ingresso.
+
+    partition_by colonne della partizione, es. ["year", "category"] o ["race_id"]
+    order_by     colonne di ordinamento, es. ["total_points"]
+    ascending    bool oppure lista di bool, una per colonna di order_by
+    """
+    if method not in METHODS:
+        raise ValueError(f"Metodo di rank non valido: {method} (ammessi: {', '.join(METHODS)})")
+    n = len(df)
+    if n == 0:
+        return pd.Series([], index=df.index, dtype="Int64")
+    if isinstance(ascending, bool):
+        ascending = [ascending] * len(order_by)
+
+    partition = df.groupby(list(partition_by), sort=False, dropna=False).ngroup().to_numpy()
+    keys = [sort_codes(df[col], asc) for col, asc in zip(order_by, ascending)]
+    # np.lexsort usa l'ultima chiave come primaria: partizione, poi order_by nell'ordine dato
+    order = np.lexsort(keys[::-1] + [partition])
+
+    positions = np.arange(n)
+    sorted_partition = partition[order]
+    starts = np.ones(n, dtype=bool)
+    starts[1:] = sorted_partition[1:] != sorted_partition[:-1]
+    group_start = np.maximum.accumulate(np.where(starts, positions, 0))
+
+    if method == "row":
+        ranks = positions - group_start + 1
+    else:
+        changes = starts.copy()
+        for key in keys:
+            sorted_key = key[order]
+            changes[1:] |= sorted_key[1:] != sorted_key[:-1]
+        if method == "dense":
+            counter = np.cumsum(changes)
+            ranks = counter - np.maximum.accumulate(np.where(starts, counter, 0)) + 1
+        else:
+            ranks = np.maximum.accumulate(np.where(changes, positions, 0)) - group_start + 1
+
+    result = np.empty(n, dtype=np.int64)
+    result[order] = ranks
+    return pd.Series(result, index=df.index, dtype="Int64")
@@ -1,29 +1,82 @@
-import requests
+"""
+Infobox (data, nome ufficiale, luogo, circuito) di tutte le edizioni dei Gran Premi elencati
+in https://en.wikipedia.org/wiki/List_of_Grand_Prix_motorcycle_races.
+
+Lo scraping è una coda di lavoro:
+- ogni GP della tabella principale diventa un job: la pagina dell'edizione (GP con una
+  sola gara) oppure la pagina dell'evento, da cui si accodano i link di tutte le edizioni;
+- WORKERS thread scaricano le pagine con lo stesso Fetcher (cache su disco), con le
+  richieste in rete limitate da un token bucket (--rate richieste/s, --burst);
+- l'HTML viene analizzato in un pool di processi (--processes, 0 = nei thread di download),
+  così il parsing non contende il GIL con i download;
+- i risultati sono scritti nell'ordine della tabella (e delle edizioni), come nella
+  versione sequenziale.
+
+    python motogp_scaper.py                       # tutta la lista
+    python motogp_scaper.py --limit 55 --rate 2   # solo i primi 55 GP, 2 richieste/s
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from bs4 import BeautifulSoup
-import json
 from tqdm import tqdm
-import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scraping"))
+from fetch import Fetcher
+from outline import PageOutline
+import profiling
+from profiling import profiler
+from sink import RecordWriter, jsonl_path, jsonl_to_json
 
 BASE_URL = "https://en.wikipedia.org"
 START_URL = "https://en.wikipedia.org/wiki/List_of_Grand_Prix_motorcycle_races"
 OUTPUT_FILE = "output2.json"
-LIMIT = 55
-results = []
-log = []
+LOG_FILE = "log.txt"
+WORKERS = 8         # download in parallelo
+RATE = 5.0          # richieste/s verso en.wikipedia (i hit di cache non contano)
+BURST = 5
+# Id delle sezioni con le tabelle delle edizioni (regex, in ordine di preferenza) e sezioni
+# h2 dove smettere di cercare tabelle
+WINNER_SECTIONS = [
+    "By_year",
+    "Winners_by_season",
+    r"Winners_of_the_.+_motorcycle_Grand_Prix",
+    "Grand_Prix_motorcycle_racing_winners",
+]
+STOP_SECTIONS = ["References"]
+log_file = None
+log_lock = threading.Lock()
+log_buffer = []     # messaggi dei processi di parsing, restituiti al processo principale
+fetcher = None
+in_worker = False
+
+def log(message):
+    """Scrive subito il messaggio nel log (aperto da main), invece di tenerlo in memoria."""
+    if log_file is not None:
+        with log_lock:
+            log_file.write(message + "\n")
+            log_file.flush()
+    elif in_worker:
+        log_buffer.append(message)
 
 def get_soup(url):
     try:
-        res = requests.get(url)
+        res = fetcher.get(url)
         res.raise_for_status()
-        return BeautifulSoup(res.text, "html.parser")
+        with profiler.stage("parse", rows_in=1):
+            return BeautifulSoup(res.text, "html.parser")
     except Exception as e:
-        log.append(f"Errore nel recuperare {url}: {e}")
+        log(f"Errore nel recuperare {url}: {e}")
         return None
 
+@profiler.track("extract")
 def extract_infobox_data(soup, url):
     infobox = soup.find("table", class_="infobox")
     if not infobox:
-        log.append(f"Nessuna infobox trovata in {url}")
+        log(f"Nessuna infobox trovata in {url}")
         return None
 
     data = {}
@@ -39,80 +92,33 @@ def extract_infobox_data(soup, url):
 
     return data if data else None
 
-def process_single_event(link):
-    soup = get_soup(link)
-    if not soup:
+def edition_links(soup, event_url):
+    """Link delle pagine delle edizioni elencate nella pagina dell'evento (None se manca la sezione)."""
+    outline = PageOutline(soup)
+    section = outline.find(WINNER_SECTIONS)
+    if section is None:
+        log(f"Nessuna sezione WINNERS trovata in {event_url}")
         return None
-    return extract_infobox_data(soup, link)
-
-def process_multiple_events(event_url):
-    soup = get_soup(event_url)
-    if not soup:
-        return []
-
-    # Find the 'By year' section
-    by_year_header = soup.find(id="By_year")
-    if not by_year_header:
-            by_year_header = soup.find(id="Winners_by_season")
-            if not by_year_header:
-                by_year_header = soup.find(id="Winners_of_the_Italian_motorcycle_Grand_Prix")
-                if not by_year_header:
-                    by_year_header = soup.find(id="Winners_of_the_Czech_Republic_motorcycle_Grand_Prix")
-                    if not by_year_header:
-                        by_year_header = soup.find(id="Grand_Prix_motorcycle_racing_winners")
-                        if not by_year_header:
-                            log.append(f"Nessuna sezione WINNERS trovata in {event_url}")
-                            return []
-
-    # Initialize variables
-    sub_results = []
-    current_table = by_year_header.find_next("table")
-
-    while current_table:
-        # Process rows in the current table
-        rows = current_table.find_all("tr")[1:]  # Skip header
+
+    links = []
+    for table in outline.tables_after(section, STOP_SECTIONS):
+        rows = table.find_all("tr")[1:]  # Skip header
         for row in rows:
             cols = row.find_all("td")
             if not cols:
                 continue
             link_tag = cols[-1].find("a")  # Last column often contains links
             if link_tag and link_tag.get("href"):
-                race_link = BASE_URL + link_tag["href"]
-                race_soup = get_soup(race_link)
-                if race_soup:
-                    data = extract_infobox_data(race_soup, race_link)
-                    if data:
-                        sub_results.append(data)
-                time.sleep(1)
+                links.append(BASE_URL + link_tag["href"])
+    # le tabelle dei plurivincitori ripetono link già presenti nell'albo per anno
+    return list(dict.fromkeys(links))
 
-        # Check if there are more tables to process
-        next_section = current_table.find_next("h2")  # Look for the next section header
-        if next_section and next_section.text.strip() == "References":
-            break  # Stop if we reach the 'References' section
-
-        # Move to the next table
-        current_table = current_table.find_next("table")
-
-    return sub_results
-
-def main():
-    soup = get_soup(START_URL)
-    if not soup:
-        print("❌ Impossibile caricare la pagina principale.")
-        return
-
-    tables = soup.find_all("table", class_="wikitable sortable")
-    if not tables:
-        print("❌ Nessuna tabella 'wikitable sortable' trovata.")
-        return
-    table = tables[0]
-    rows = table.find_all("tr")[1:LIMIT+1]  # Limit to first LIMIT rows for testing
-
-
-    for row in tqdm(rows, desc="Processing races"):
+def index_rows(rows):
+    """(url della pagina del GP, numero di gare) per ogni riga valida della tabella principale."""
+    for row in rows:
         cols = row.find_all("td")
         if len(cols) < 3:
-            log.append("Riga saltata (non ha 3 colonne).")
+            log("Riga saltata (non ha 3 colonne).")
             continue
         links = cols[0].find_all("a")
         if len(links) > 1:
@@ -123,33 +129,167 @@ def main():
             race_link_tag = None
 
         if not race_link_tag:
-            log.append(f"Nessun link utile nella riga {cols[0].text.strip()}")
+            log(f"Nessun link utile nella riga {cols[0].text.strip()}")
             continue
         race_url = BASE_URL + race_link_tag.get("href")
         try:
             num_races = int(cols[2].text.strip())
         except:
-            log.append(f"Errore nel leggere numero gare per {race_url}")
+            log(f"Errore nel leggere numero gare per {race_url}")
             continue
+        yield race_url, num_races
 
-        if num_races == 1:
-            data = process_single_event(race_url)
-            if data:
-                results.append(data)
-        else:
-            sub_data = process_multiple_events(race_url)
-            if sub_data:
-                results.extend(sub_data)
-        time.sleep(0.2)
 
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+# === Coda di lavoro ===
+
+def init_worker():
+    global in_worker
+    in_worker = True
+
+def fetch_page(url):
+    """Nei thread di download: HTML della pagina, None se non è stato possibile scaricarla."""
+    try:
+        res = fetcher.get(url)
+        res.raise_for_status()
+        return res.text
+    except Exception as e:
+        log(f"Errore nel recuperare {url}: {e}")
+        return None
+
+def parse_page(kind, url, html):
+    """
+    Analizza una pagina: kind "event" → dati dell'infobox, "list" → link delle edizioni.
+    In un processo di parsing restituisce anche i messaggi di log e le fasi del profiler,
+    che il processo principale riporta nei suoi.
+    """
+    if in_worker:
+        profiler.reset()
+        log_buffer.clear()
+    with profiler.stage("parse", rows_in=1) as s:
+        soup = BeautifulSoup(html, "html.parser")
+        s["rows_out"] = 1
+    result = extract_infobox_data(soup, url) if kind == "event" else edition_links(soup, url)
+    if in_worker:
+        return result, list(log_buffer), profiler.stages
+    return result, [], {}
+
+def crawl(gps, workers=WORKERS, processes=None):
+    """
+    Genera le infobox di tutte le edizioni dei GP `gps` ([(url, numero di gare)]).
+
+    Le pagine vengono scaricate e analizzate in parallelo; i record di un GP sono generati
+    quando tutte le sue edizioni sono pronte e i GP precedenti sono già stati emessi.
+    """
+    # Per ogni GP: numero di edizioni attese (None finché la pagina dell'evento non è analizzata)
+    slots = [{"expected": 1 if num_races == 1 else None, "results": {}} for _, num_races in gps]
+    jobs = {}
+    next_slot = 0
+
+    # I processi di parsing sono avviati con "spawn": fare fork mentre i thread di download
+    # sono attivi può lasciare nel figlio lock mai rilasciati
+    download = ThreadPoolExecutor(workers)
+    parse = download if processes == 0 else ProcessPoolExecutor(
+        processes, mp_context=multiprocessing.get_context("spawn"), initializer=init_worker)
+    try:
+        def enqueue(kind, url, slot, edition=0):
+            jobs[download.submit(fetch_page, url)] = ("fetch", kind, url, slot, edition)
+
+        for slot, (url, num_races) in enumerate(gps):
+            enqueue("event" if num_races == 1 else "list", url, slot)
+
+        with tqdm(total=len(gps), desc="Processing races") as progress:
+            while jobs:
+                done, _ = wait(jobs, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step, kind, url, slot, edition = jobs.pop(future)
+                    if step == "fetch":
+                        html = future.result()
+                        if html is not None:
+                            jobs[parse.submit(parse_page, kind, url, html)] = ("parse", kind, url, slot, edition)
+                            continue
+                        result = None
+                    else:
+                        try:
+                            result, messages, stages = future.result()
+                        except Exception as e:
+                            result, messages, stages = None, [f"Errore nell'analizzare {url}: {e}"], {}
+                        for message in messages:
+                            log(message)
+                        for name, s in stages.items():
+                            profiler.add(name, s["seconds"], bytes=s["bytes"], rows_in=s["rows_in"],
+                                         rows_out=s["rows_out"])
+
+                    if kind == "list":
+                        links = result or []
+                        slots[slot]["expected"] = len(links)
+                        for i, link in enumerate(links):
+                            enqueue("event", link, slot, i)
+                    else:
+                        slots[slot]["results"][edition] = result
+
+                # Emette i GP completi, nell'ordine della tabella
+                while next_slot < len(slots):
+                    current = slots[next_slot]
+                    if current["expected"] is None or len(current["results"]) < current["expected"]:
+                        break
+                    for i in range(current["expected"]):
+                        if current["results"][i]:
+                            yield current["results"][i]
+                    slots[next_slot] = None
+                    next_slot += 1
+                    progress.update(1)
+    finally:
+        download.shutdown(cancel_futures=True)
+        parse.shutdown(cancel_futures=True)
+
+def main():
+    global log_file, fetcher
+    parser = argparse.ArgumentParser(description="Infobox dei Gran Premi da en.wikipedia")
+    parser.add_argument("--limit", type=int, help="solo i primi N GP della tabella")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="download in parallelo")
+    parser.add_argument("--processes", type=int,
+                        help="processi di parsing (default: numero di CPU, 0 = nei thread di download)")
+    parser.add_argument("--rate", type=float, default=RATE,
+                        help="richieste al secondo verso il sito (token bucket; 0 = nessun limite)")
+    parser.add_argument("--burst", type=int, default=BURST, help="richieste consecutive ammesse dal token bucket")
+    parser.add_argument("--jsonl-only", action="store_true",
+                        help="lascia solo il file JSON Lines, senza ricostruire il JSON indentato")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.start(args)
+    fetcher = Fetcher(pool_size=args.workers, rate=args.rate or None, burst=args.burst)
+
+    # cache HTTP e archivio delle pagine vanno chiusi anche quando si esce prima
+    try:
+        soup = get_soup(START_URL)
+        if not soup:
+            print("❌ Impossibile caricare la pagina principale.")
+            return
+
+        tables = soup.find_all("table", class_="wikitable sortable")
+        if not tables:
+            print("❌ Nessuna tabella 'wikitable sortable' trovata.")
+            return
+        table = tables[0]
+        rows = table.find_all("tr")[1:]
+        if args.limit:
+            rows = rows[:args.limit]
 
-    with open("log.txt", "w", encoding="utf-8") as f:
-        f.write("\n".join(log))
+        # Eventi e log vengono scritti su disco man mano
+        stream_file = jsonl_path(OUTPUT_FILE)
+        with open(LOG_FILE, "w", encoding="utf-8") as log_file, RecordWriter(stream_file) as writer:
+            gps = list(index_rows(rows))
+            writer.write_all(crawl(gps, args.workers, args.processes))
+        log_file = None
 
-    print(f"\n✅ {len(results)} eventi salvati in {OUTPUT_FILE}")
-    print(f"📄 Log dettagliato in log.txt")
+        print(f"\n✅ {writer.count} eventi salvati in {stream_file}")
+        if not args.jsonl_only:
+            jsonl_to_json(stream_file, OUTPUT_FILE, indent=2)
+            print(f"✅ JSON indentato in {OUTPUT_FILE}")
+        print(f"📄 Log dettagliato in {LOG_FILE}")
+    finally:
+        fetcher.close()
+        profiling.finish(args, {"http_cache": fetcher.report()})
 
 if __name__ == "__main__":
     main()
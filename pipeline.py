@@ -0,0 +1,321 @@
+"""
+Aggiornamento completo dei dataset con un solo comando: scraper e integrazione come DAG.
+
+Ogni fase (STAGES) dichiara lo script da eseguire e i file che legge e scrive; le
+dipendenze si ricavano da questi (una fase dipende da quelle che producono i suoi input):
+
+    gran_premi (race_date_script) ──► meteo (race_coord) ──┐
+    griglie (quali) ───────────────────────────────────────┼──► integrazione (incremental)
+    infobox_gp (motogp_scaper)                             │
+    dataset statici (MotoGP_Circuits, archive 1, ...) ─────┘
+
+Le fasi pronte girano in parallelo, ognuna come processo separato con il log in
+.pipeline/<fase>.log, quindi l'aggiornamento dura quanto il percorso critico. Gli scraper
+in parallelo condividono la cache HTTP: fetch.Fetcher salva l'indice sotto un lock su
+file, unendo le voci degli altri processi.
+
+Una fase viene saltata se la sua impronta (sha256 di script, input e argomenti) è quella
+dell'ultima esecuzione riuscita e i suoi output non sono stati toccati. Gli scraper
+(fasi "source") leggono dalla rete e girano sempre; con --offline leggono l'archivio delle
+pagine (scraping/snapshots.py), che entra nella loro impronta. Se uno scraper rigenera un
+file identico, le fasi a valle vengono saltate. L'integrazione gira in modo incrementale:
+incremental.py ricostruisce le tabelle anche quando cambiano il codice o gli alias.
+
+    python pipeline.py                       # aggiorna tutto
+    python pipeline.py integrazione          # solo l'integrazione e le fasi che le servono
+    python pipeline.py --offline --report    # dalle pagine archiviate, con report dei tempi
+    python pipeline.py --list                # fasi, dipendenze e stato
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "scraping"))
+import profiling
+from profiling import profiler
+from snapshots import INDEX_FILE, SNAPSHOT_DIR
+
+STATE_DIR = os.path.join(ROOT, ".pipeline")
+STATE_FILE = "state.json"
+SCRAPING_HELPERS = ["scraping/fetch.py", "scraping/sink.py", "scraping/dates.py", "scraping/tabelle.py",
+                    "scraping/outline.py", "scraping/checkpoint.py"]
+
+# Percorsi relativi alla radice del progetto; "cwd" è la cartella in cui lo script scrive
+# i suoi output, "code" i file di codice che entrano nell'impronta (le cartelle contano
+# solo i .py), "inputs" i dati (le cartelle contano tutti i file, non le sottocartelle)
+STAGES = {
+    "gran_premi": {
+        "script": "scraping/race_date_script.py", "args": [], "cwd": "scraping", "source": True,
+        "code": SCRAPING_HELPERS, "inputs": [],
+        "outputs": ["scraping/motogp_gran_premi.json"],
+    },
+    "griglie": {
+        "script": "scraping/quali.py", "args": [], "cwd": "scraping", "source": True,
+        "code": SCRAPING_HELPERS, "inputs": [],
+        "outputs": ["scraping/motogp_griglia.csv"],
+    },
+    "infobox_gp": {
+        "script": "motogp_scaper.py", "args": [], "cwd": ".", "source": True,
+        "code": SCRAPING_HELPERS, "inputs": [],
+        "outputs": ["output2.json"],
+    },
+    # Il meteo dipende solo dalle date e coordinate dei GP (le risposte di Open-Meteo sono in
+    # weather_cache.json): si riesegue solo se cambia motogp_gran_premi.json
+    "meteo": {
+        "script": "scraping/race_coord.py", "args": [], "cwd": "scraping", "source": False,
+        "code": SCRAPING_HELPERS, "inputs": ["scraping/motogp_gran_premi.json"],
+        "outputs": ["scraping/race_weather_data_final.json"],
+    },
+    "integrazione": {
+        "script": "integration/incremental.py", "args": [], "cwd": ".", "source": False,
+        "code": ["integration"],
+        "inputs": ["scraping/motogp_gran_premi.json", "scraping/motogp_griglia.csv",
+                   "scraping/race_weather_data_final.json", "MotoGP_Circuits", "MotoGP_Results&Bikes",
+                   "archive 1", "integration/circuit_aliases.json", "integration/race_circuit_aliases.json",
+                   "integration/rider_ids.json"],
+        "outputs": ["integration/output"],
+    },
+}
+
+
+# === DAG ===
+
+def dependencies(stages=STAGES):
+    """{fase: fasi che producono i suoi input}."""
+    producers = {output: name for name, stage in stages.items() for output in stage["outputs"]}
+    return {name: sorted({producers[i] for i in stage["inputs"] if i in producers} - {name})
+            for name, stage in stages.items()}
+
+def topological_order(deps):
+    order, visiting = [], set()
+
+    def visit(name):
+        if name in order:
+            return
+        if name in visiting:
+            raise ValueError(f"ciclo nelle dipendenze delle fasi: {name}")
+        visiting.add(name)
+        for dep in deps[name]:
+            visit(dep)
+        visiting.discard(name)
+        order.append(name)
+
+    for name in deps:
+        visit(name)
+    return order
+
+def with_ancestors(targets, deps):
+    selected = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(deps[name])
+    return selected
+
+def critical_path(deps, seconds):
+    """Catena di fasi dipendenti con la durata totale più lunga: ([fasi], secondi)."""
+    best = {}
+    for name in topological_order(deps):
+        previous = max((best[d] for d in deps[name] if d in best), key=lambda p: p[1], default=([], 0.0))
+        if name in seconds:
+            best[name] = (previous[0] + [name], previous[1] + seconds[name])
+    return max(best.values(), key=lambda p: p[1], default=([], 0.0))
+
+
+# === Impronte ===
+
+def hash_path(path, digest, only_py=False):
+    """Aggiunge il contenuto di un file, o dei file di una cartella, all'hash."""
+    if os.path.isdir(path):
+        files = sorted(f for f in os.listdir(path)
+                       if os.path.isfile(os.path.join(path, f)) and (not only_py or f.endswith(".py")))
+    else:
+        files = [""] if os.path.exists(path) else []
+    digest.update(f"{os.path.relpath(path, ROOT)}\0{len(files)}\0".encode("utf-8"))
+    for name in files:
+        digest.update(f"{name}\0".encode("utf-8"))
+        with open(os.path.join(path, name) if name else path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+
+def stage_fingerprint(stage, offline=False):
+    digest = hashlib.sha256()
+    digest.update(json.dumps([stage["args"], stage["source"] and offline]).encode("utf-8"))
+    for rel_path in [stage["script"], *stage["code"]]:
+        hash_path(os.path.join(ROOT, rel_path), digest, only_py=True)
+    for rel_path in stage["inputs"]:
+        hash_path(os.path.join(ROOT, rel_path), digest)
+    if stage["source"] and offline:
+        hash_path(os.path.join(SNAPSHOT_DIR, INDEX_FILE), digest)
+    return digest.hexdigest()
+
+def outputs_fingerprint(stage):
+    """sha256 di ogni output (None se manca)."""
+    result = {}
+    for rel_path in stage["outputs"]:
+        path = os.path.join(ROOT, rel_path)
+        if not os.path.exists(path):
+            result[rel_path] = None
+            continue
+        digest = hashlib.sha256()
+        hash_path(path, digest)
+        result[rel_path] = digest.hexdigest()
+    return result
+
+
+# === Stato ===
+
+def load_state():
+    try:
+        with open(os.path.join(STATE_DIR, STATE_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state):
+    path = os.path.join(STATE_DIR, STATE_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+
+# === Esecuzione ===
+
+def run_stage(name, stage, offline):
+    """Esegue lo script della fase; restituisce (codice di uscita, secondi)."""
+    env = dict(os.environ)
+    if offline:
+        env["MOTOGP_OFFLINE"] = "1"
+    start = time.perf_counter()
+    with open(os.path.join(STATE_DIR, f"{name}.log"), "w", encoding="utf-8") as log:
+        code = subprocess.run([sys.executable, os.path.join(ROOT, stage["script"]), *stage["args"]],
+                              cwd=os.path.join(ROOT, stage["cwd"]), env=env,
+                              stdout=log, stderr=subprocess.STDOUT).returncode
+    return code, time.perf_counter() - start
+
+def run_pipeline(targets=None, force=False, offline=False, stages=STAGES):
+    """
+    Esegue le fasi `targets` (tutte se None) e quelle da cui dipendono. Restituisce
+    {fase: {"status", "seconds", "start", "end"}} con status "ok", "saltata", "errore" o
+    "bloccata" (una dipendenza non è riuscita).
+    """
+    os.makedirs(STATE_DIR, exist_ok=True)
+    deps = dependencies(stages)
+    selected = with_ancestors(targets or list(stages), deps)
+    order = [name for name in topological_order(deps) if name in selected]
+    state = load_state()
+    results = {}
+    running = {}
+    started = time.perf_counter()
+
+    def finish(name, status, seconds=0.0, start=None):
+        now = time.perf_counter() - started
+        results[name] = {"status": status, "seconds": round(seconds, 3),
+                         "start": round(now - seconds if start is None else start, 3), "end": round(now, 3)}
+
+    with ThreadPoolExecutor(max(1, len(order))) as pool:
+        while len(results) < len(order):
+            for name in order:
+                if name in results or name in running.values():
+                    continue
+                if any(results.get(d, {}).get("status") in ("errore", "bloccata") for d in deps[name]):
+                    finish(name, "bloccata")
+                    print(f"[!] {name}: bloccata da una dipendenza non riuscita")
+                    continue
+                if not all(d in results for d in deps[name] if d in selected):
+                    continue
+                stage = stages[name]
+                fingerprint = stage_fingerprint(stage, offline)
+                previous = state.get(name, {})
+                if (not force and not (stage["source"] and not offline)
+                        and previous.get("fingerprint") == fingerprint
+                        and previous.get("outputs") == outputs_fingerprint(stage)):
+                    finish(name, "saltata")
+                    print(f"[i] {name}: input invariati, saltata")
+                    continue
+                print(f"➡️ {name}")
+                running[pool.submit(run_stage, name, stage, offline)] = name
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                code, seconds = future.result()
+                stage = stages[name]
+                log_path = os.path.relpath(os.path.join(STATE_DIR, f"{name}.log"), ROOT)
+                if code == 0:
+                    # l'impronta è quella degli input usati (le fasi a monte erano già concluse)
+                    state[name] = {"fingerprint": stage_fingerprint(stage, offline),
+                                   "outputs": outputs_fingerprint(stage), "seconds": round(seconds, 3)}
+                    save_state(state)
+                    finish(name, "ok", seconds)
+                    print(f"✅ {name} ({seconds:.1f}s, log in {log_path})")
+                else:
+                    state.pop(name, None)
+                    save_state(state)
+                    finish(name, "errore", seconds)
+                    print(f"❌ {name}: codice di uscita {code} (log in {log_path})")
+                profiler.add(name, seconds)
+    return results
+
+def print_stages(stages=STAGES):
+    deps = dependencies(stages)
+    state = load_state()
+    for name in topological_order(deps):
+        last = state.get(name)
+        detail = f"ultima esecuzione {last['seconds']:.1f}s" if last else "mai eseguita"
+        kind = "rete" if stages[name]["source"] else "file"
+        print(f"   {name:<14} {kind:<5} dopo: {', '.join(deps[name]) or '-':<28} {detail}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggiornamento di scraper e integrazione come DAG di fasi")
+    parser.add_argument("targets", nargs="*", metavar="FASE",
+                        help=f"fasi da aggiornare, con quelle da cui dipendono ({', '.join(STAGES)}; default tutte)")
+    parser.add_argument("--force", action="store_true", help="riesegue le fasi anche con input invariati")
+    parser.add_argument("--offline", action="store_true",
+                        help="gli scraper leggono solo l'archivio delle pagine (MOTOGP_OFFLINE=1)")
+    parser.add_argument("--postgres", metavar="DSN",
+                        help="l'integrazione applica i delta anche a PostgreSQL (cambiando database serve --force)")
+    parser.add_argument("--duckdb", action="store_true",
+                        help="l'integrazione aggiorna anche il database DuckDB locale (duck_store.py)")
+    parser.add_argument("--list", action="store_true", help="mostra fasi e dipendenze senza eseguire niente")
+    profiling.add_arguments(parser, os.path.join(STATE_DIR, "pipeline_report.json"))
+    args = parser.parse_args()
+    unknown = [t for t in args.targets if t not in STAGES]
+    if unknown:
+        parser.error(f"fasi sconosciute: {', '.join(unknown)}")
+
+    if args.list:
+        print_stages()
+        return
+    if args.postgres:
+        # la DSN (con l'eventuale password) passa dall'ambiente, non dagli argomenti che
+        # finiscono nell'impronta salvata in .pipeline/state.json
+        os.environ["MOTOGP_PG_DSN"] = args.postgres
+        STAGES["integrazione"]["args"] += ["--postgres"]
+    if args.duckdb:
+        STAGES["integrazione"]["args"] += ["--duckdb"]
+    profiling.start(args)
+    start = time.perf_counter()
+    results = run_pipeline(args.targets or None, args.force, args.offline)
+
+    deps = dependencies()
+    path, path_seconds = critical_path(deps, {name: r["seconds"] for name, r in results.items()
+                                              if r["status"] != "saltata"})
+    print(f"⏱️ Aggiornamento completato in {time.perf_counter() - start:.1f}s "
+          f"(percorso critico: {' → '.join(path) or '-'}, {path_seconds:.1f}s)")
+    profiling.finish(args, {"pipeline": results, "critical_path": path})
+    if any(r["status"] in ("errore", "bloccata") for r in results.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Micro-benchmark di estrai_da_arrivati sui resoconti salvati in locale.
+
+Per ogni backend HTML disponibile misura parsing + estrazione su tutte le pagine e
+verifica che le righe prodotte siano identiche a quelle del backend BeautifulSoup.
+
+    python bench_estrai.py fixtures/resoconti/           # tutte le .html della cartella
+    python bench_estrai.py --from-cache Gran_Premio      # pagine già nella cache HTTP
+"""
+import argparse
+import contextlib
+import glob
+import io
+import os
+import time
+
+from fetch import Fetcher
+from quali import estrai_da_arrivati
+from tabelle import BACKENDS
+
+def carica_pagine(percorsi, filtro_cache=None):
+    pagine = {}
+    for percorso in percorsi:
+        if os.path.isdir(percorso):
+            for f in sorted(glob.glob(os.path.join(percorso, "*.html"))):
+                with open(f, "rb") as fh:
+                    pagine[f] = fh.read()
+        else:
+            with open(percorso, "rb") as fh:
+                pagine[percorso] = fh.read()
+    if filtro_cache:
+        cache = Fetcher()
+        for url, entry in cache.index.items():
+            if filtro_cache in url:
+                contenuto = cache._read_object(entry["sha"])
+                if contenuto is not None:
+                    pagine[url] = contenuto
+    return pagine
+
+def misura(backend, pagine, ripetizioni):
+    risultati = {}
+    inizio = time.perf_counter()
+    for _ in range(ripetizioni):
+        for nome, html in pagine.items():
+            with contextlib.redirect_stdout(io.StringIO()):
+                risultati[nome] = estrai_da_arrivati(html, 0, "", "", "", backend=backend)
+    return (time.perf_counter() - inizio) / (ripetizioni * len(pagine)), risultati
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark di estrai_da_arrivati per backend HTML")
+    parser.add_argument("percorsi", nargs="*", help="file .html o cartelle di resoconti salvati")
+    parser.add_argument("--from-cache", metavar="TESTO", help="usa le pagine in cache il cui URL contiene TESTO")
+    parser.add_argument("-n", "--ripetizioni", type=int, default=5)
+    args = parser.parse_args()
+
+    pagine = carica_pagine(args.percorsi, args.from_cache)
+    if not pagine:
+        print("❌ Nessuna pagina da misurare")
+        return
+
+    print(f"📄 {len(pagine)} pagine, {sum(len(p) for p in pagine.values()) / 1024:.0f} KB totali")
+    riferimento = None
+    base = None
+    for nome in ["bs4", "lxml", "selectolax"]:
+        try:
+            backend = BACKENDS[nome]()
+        except ImportError:
+            print(f"   {nome:<11} non installato")
+            continue
+        per_pagina, risultati = misura(backend, pagine, args.ripetizioni)
+        if riferimento is None:
+            riferimento, base = risultati, per_pagina
+        identico = "✅ righe identiche" if risultati == riferimento else "❌ righe DIVERSE"
+        print(f"   {nome:<11} {per_pagina * 1000:8.2f} ms/pagina  x{base / per_pagina:5.1f}  {identico}")
+
+if __name__ == "__main__":
+    main()
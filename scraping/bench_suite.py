@@ -0,0 +1,382 @@
+"""
+Benchmark riproducibili e offline di scraper e integrazione.
+
+Le fixture sono risposte reali registrate una volta (pagine delle stagioni, resoconti,
+pagine dei circuiti, infobox di en.wikipedia, JSON dell'archivio Open-Meteo) nello stesso
+formato della cache HTTP di fetch.py: fixtures/replay/index.json + objects/<sha256>.
+
+    python bench_suite.py record                      # esegue gli scraper in rete e registra
+    python bench_suite.py record --from-cache .http_cache   # oppure copia la cache esistente
+    python bench_suite.py run                         # benchmark su fixture, confronto con la baseline
+    python bench_suite.py run --save-baseline         # aggiorna fixtures/bench_baseline.json
+
+"run" misura:
+- crawl: ogni scraper (CRAWLS) gira come processo separato con MOTOGP_REPLAY_URL verso un
+  server HTTP locale che serve le fixture, una cache HTTP vuota e l'archivio delle pagine
+  (snapshots.py) disattivato; dal report di
+  profiling.py si ricavano pagine, record e pagine/s;
+- parse: latenza (mediana e p95) delle funzioni di estrazione su ogni pagina delle fixture;
+- integration: tempo di ogni passo di engine.run sui dataset del progetto.
+I tempi (più bassi = meglio) vengono confrontati con la baseline: oltre TOLERANCE di
+peggioramento la misura è segnalata come regressione e il comando esce con codice 1.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from requests.utils import requote_uri
+
+from fetch import Fetcher
+
+SCRAPING_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(SCRAPING_DIR)
+FIXTURE_DIR = os.path.join(SCRAPING_DIR, "fixtures", "replay")
+BASELINE_FILE = os.path.join(SCRAPING_DIR, "fixtures", "bench_baseline.json")
+FIXTURE_HOSTS = ("it.wikipedia.org", "en.wikipedia.org", "archive-api.open-meteo.com")
+TOLERANCE = 0.20          # peggioramento massimo rispetto alla baseline
+REPETITIONS = 10
+
+# (nome, script, argomenti); eseguiti in ordine nella stessa cartella di lavoro
+# (race_coord legge il motogp_gran_premi.json scritto da race_date_script)
+CRAWLS = [
+    ("race_date_script", "race_date_script.py", []),
+    ("race_date_script_async", "race_date_script.py", ["--async", "--min-interval", "0"]),
+    ("quali", "quali.py", []),
+    ("race_coord_batch", "race_coord.py", ["--batch", "--weather-cache", "weather_cache.json"]),
+]
+# Scraper eseguiti in rete da "record" (motogp_scaper.py è nella radice del progetto)
+RECORD_SCRIPTS = [
+    os.path.join(SCRAPING_DIR, "race_date_script.py"),
+    os.path.join(SCRAPING_DIR, "quali.py"),
+    os.path.join(SCRAPING_DIR, "race_coord.py"),
+    os.path.join(ROOT, "motogp_scaper.py"),
+]
+
+
+# === Fixture ===
+
+def load_fixtures(fixture_dir=FIXTURE_DIR):
+    """{chiave di cache (URL [+ parametri]): contenuto} delle risposte registrate."""
+    with open(os.path.join(fixture_dir, "index.json"), "r", encoding="utf-8") as f:
+        index = json.load(f)
+    pages = {}
+    for key, entry in index.items():
+        path = os.path.join(fixture_dir, "objects", entry["sha"])
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                pages[key] = f.read()
+    return pages
+
+def record_from_cache(cache_dir, fixture_dir=FIXTURE_DIR):
+    """Copia dalla cache HTTP le risposte degli host delle fixture."""
+    with open(os.path.join(cache_dir, "index.json"), "r", encoding="utf-8") as f:
+        index = json.load(f)
+    os.makedirs(os.path.join(fixture_dir, "objects"), exist_ok=True)
+    kept = {}
+    for key, entry in index.items():
+        source = os.path.join(cache_dir, "objects", entry["sha"])
+        if urlsplit(key).netloc not in FIXTURE_HOSTS or not os.path.exists(source):
+            continue
+        shutil.copyfile(source, os.path.join(fixture_dir, "objects", entry["sha"]))
+        kept[key] = entry
+    with open(os.path.join(fixture_dir, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(kept, f, indent=1, sort_keys=True)
+    return len(kept)
+
+def record_live(fixture_dir=FIXTURE_DIR):
+    """Esegue gli scraper in rete con la cache HTTP nella cartella delle fixture."""
+    # le fixture sono la cache HTTP: le pagine non vanno anche nell'archivio di snapshots.py
+    env = dict(os.environ, MOTOGP_HTTP_CACHE=fixture_dir, MOTOGP_SNAPSHOTS="")
+    env.pop("MOTOGP_REPLAY_URL", None)
+    with tempfile.TemporaryDirectory() as workdir:
+        for script in RECORD_SCRIPTS:
+            print(f"➡️ Registro {os.path.basename(script)}")
+            subprocess.run([sys.executable, script], cwd=workdir, env=env, check=False,
+                           stdout=subprocess.DEVNULL)
+    with open(os.path.join(fixture_dir, "index.json"), "r", encoding="utf-8") as f:
+        return len(json.load(f))
+
+
+# === Server di replay ===
+
+def wire_form(url):
+    """Forma canonica di un URL: requests e aiohttp codificano in modo diverso (spazi, apostrofi)."""
+    return requote_uri(unquote(url))
+
+
+class ReplayIndex:
+    def __init__(self, pages):
+        self.pages = pages
+        self.by_wire = {wire_form(key): key for key in pages}
+
+    def lookup(self, path):
+        """Contenuto per un path "/host/percorso?query" ricevuto dal server, oppure None."""
+        target, _, query = path.partition("?")
+        url = "https:/" + target
+        key = self.by_wire.get(wire_form(url + (f"?{query}" if query else "")))
+        if key is None and query:
+            # richieste con params: la chiave di cache ha i parametri ordinati e non codificati
+            key = Fetcher.cache_key(unquote(url), dict(parse_qsl(query, keep_blank_values=True)))
+            key = key if key in self.pages else self.by_wire.get(wire_form(key))
+        return self.pages.get(key) if key is not None else None
+
+
+def start_server(pages, latency=0.0):
+    """Avvia il server di replay in un thread; restituisce (server, url base)."""
+    index = ReplayIndex(pages)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            content = index.lookup(self.path)
+            if content is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            wiki = self.path.lstrip("/").split("/", 1)[0].endswith("wikipedia.org")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=UTF-8" if wiki else "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# === Benchmark ===
+
+def bench_crawls(replay, crawls=CRAWLS):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, script, args in crawls:
+            report = os.path.join(workdir, f"{name}_report.json")
+            # archivio delle pagine disattivato: non si misura la compressione degli snapshot
+            env = dict(os.environ, MOTOGP_REPLAY_URL=replay,
+                       MOTOGP_HTTP_CACHE=os.path.join(workdir, f"cache_{name}"), MOTOGP_SNAPSHOTS="")
+            start = time.perf_counter()
+            proc = subprocess.run([sys.executable, os.path.join(SCRAPING_DIR, script), *args, "--report", report],
+                                  cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            process_seconds = time.perf_counter() - start
+            if proc.returncode != 0 or not os.path.exists(report):
+                print(f"   ❌ {name}: uscito con codice {proc.returncode}\n{proc.stderr.decode(errors='replace')[-2000:]}")
+                continue
+            with open(report, "r", encoding="utf-8") as f:
+                report_data = json.load(f)
+            # tempo dal parse degli argomenti alla fine, senza avvio dell'interprete e import
+            seconds, stages = report_data["wall_seconds"], report_data["stages"]
+            pages = stages.get("fetch", {}).get("calls", 0)
+            records = stages.get("write", {}).get("rows_out", 0)
+            results[name] = {
+                "seconds": round(seconds, 4),
+                "process_seconds": round(process_seconds, 4),
+                "pages": pages,
+                "records": records,
+                "pages_per_s": round(pages / seconds, 1) if seconds else 0.0,
+                "stage_seconds": {stage: round(s["seconds"], 4) for stage, s in stages.items()},
+            }
+            print(f"   {name:<24} {seconds:7.2f}s  {pages:5d} pagine  {records:5d} record  "
+                  f"{results[name]['pages_per_s']:8.1f} pagine/s")
+    return results
+
+def latency(fn, inputs, repetitions):
+    """Mediana e p95 (ms) di fn su ogni input, ripetuto `repetitions` volte dopo un giro a vuoto."""
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for value in inputs:
+            fn(value)
+    for _ in range(repetitions):
+        for value in inputs:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                fn(value)
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "pages": len(inputs),
+        "median_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+    }
+
+def page_groups(pages):
+    """Pagine delle fixture divise per tipo, in base all'URL."""
+    groups = {"season": [], "report": [], "circuit": [], "infobox": []}
+    for key, content in pages.items():
+        parts = urlsplit(key)
+        if parts.netloc == "it.wikipedia.org":
+            if "/Motomondiale_" in unquote(parts.path):
+                groups["season"].append(content)
+            elif "/Gran_Premio" in unquote(parts.path):
+                groups["report"].append(content)
+            else:
+                groups["circuit"].append(content)
+        elif parts.netloc == "en.wikipedia.org" and not parts.path.endswith("List_of_Grand_Prix_motorcycle_races"):
+            groups["infobox"].append(content)
+    return groups
+
+def bench_parse(pages, repetitions=REPETITIONS):
+    from bs4 import BeautifulSoup
+    import race_date_script
+    import quali
+    sys.path.insert(0, ROOT)
+    import motogp_scaper
+
+    groups = page_groups(pages)
+    soups = {name: [BeautifulSoup(c, "html.parser") for c in contents] for name, contents in groups.items()}
+    benches = [
+        ("html_parse", lambda c: BeautifulSoup(c, "html.parser"),
+         groups["season"] + groups["report"] + groups["circuit"] + groups["infobox"]),
+        ("parse_season", lambda s: race_date_script.parse_season(s, 2005), soups["season"]),
+        ("extract_coordinates", race_date_script.extract_coordinates, soups["circuit"]),
+        ("extract_details", race_date_script.extract_details, soups["report"]),
+        ("estrai_da_arrivati", lambda c: quali.estrai_da_arrivati(c, 2005, "", "", ""), groups["report"]),
+        ("extract_infobox_data", lambda s: motogp_scaper.extract_infobox_data(s, ""), soups["infobox"]),
+    ]
+    results = {}
+    for name, fn, inputs in benches:
+        if not inputs:
+            print(f"   {name:<24} nessuna pagina nelle fixture")
+            continue
+        results[name] = latency(fn, inputs, repetitions)
+        r = results[name]
+        print(f"   {name:<24} {r['pages']:5d} pagine  mediana {r['median_ms']:8.3f} ms  p95 {r['p95_ms']:8.3f} ms")
+    return results
+
+def bench_integration(root=ROOT, repetitions=REPETITIONS):
+    sys.path.insert(0, os.path.join(ROOT, "integration"))
+    import engine
+
+    runs = []
+    for _ in range(repetitions):
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, timings = engine.run(root)
+        runs.append(timings)
+    results = {stage: round(statistics.median(r[stage] for r in runs if stage in r) * 1000, 3)
+               for stage in runs[0]}
+    results["total"] = round(statistics.median(sum(r.values()) for r in runs) * 1000, 3)
+    for stage, ms in results.items():
+        print(f"   {stage:<24} {ms:9.2f} ms")
+    return results
+
+
+# === Baseline ===
+
+def metrics(results):
+    """Misure confrontabili (più basse = meglio) come {nome: valore}."""
+    flat = {}
+    for name, r in results.get("crawl", {}).items():
+        flat[f"crawl.{name}.seconds"] = r["seconds"]
+    for name, r in results.get("parse", {}).items():
+        flat[f"parse.{name}.median_ms"] = r["median_ms"]
+    for name, ms in results.get("integration", {}).items():
+        flat[f"integration.{name}_ms"] = ms
+    return flat
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Stampa il confronto con la baseline; restituisce le misure in regressione."""
+    current, previous = metrics(results), metrics(baseline)
+    regressions = []
+    print(f"\n{'misura':<44} {'baseline':>10} {'attuale':>10} {'rapporto':>9}")
+    for name in sorted(current):
+        if name not in previous or not previous[name]:
+            continue
+        ratio = current[name] / previous[name]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "❌ regressione"
+            regressions.append(name)
+        elif ratio < 1 - tolerance:
+            flag = "✅ più veloce"
+        print(f"{name:<44} {previous[name]:10.3f} {current[name]:10.3f} {ratio:8.2f}x {flag}")
+    return regressions
+
+def run(args):
+    results = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    pages = load_fixtures(args.fixtures) if os.path.exists(os.path.join(args.fixtures, "index.json")) else {}
+    if not pages and args.only != "integration":
+        print(f"[!] Nessuna fixture in '{args.fixtures}': registrale con 'bench_suite.py record'")
+
+    if pages and args.only in (None, "crawl"):
+        server, replay = start_server(pages, args.latency / 1000)
+        print(f"➡️ Crawl su {len(pages)} risposte registrate ({replay})")
+        try:
+            results["crawl"] = bench_crawls(replay)
+        finally:
+            server.shutdown()
+    if pages and args.only in (None, "parse"):
+        print("➡️ Latenza delle funzioni di estrazione")
+        results["parse"] = bench_parse(pages, args.repetitions)
+    if args.only in (None, "integration"):
+        print("➡️ Passi dell'integrazione (engine.run)")
+        results["integration"] = bench_integration(args.root, args.repetitions)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+        print(f"\n✅ Baseline salvata in '{args.baseline}'")
+        return 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} misure oltre il {args.tolerance:.0%} della baseline")
+            return 1
+        print("\n✅ Nessuna regressione rispetto alla baseline")
+    else:
+        print(f"\n[i] Nessuna baseline in '{args.baseline}' (crearla con --save-baseline)")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline di scraper e integrazione su fixture registrate")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR, help="cartella delle fixture (formato cache HTTP)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="registra le risposte reali nelle fixture")
+    rec.add_argument("--from-cache", metavar="DIR", help="copia le risposte da una cache HTTP esistente")
+
+    bench = sub.add_parser("run", help="esegue i benchmark sulle fixture")
+    bench.add_argument("--only", choices=["crawl", "parse", "integration"], help="esegue un solo gruppo")
+    bench.add_argument("--root", default=ROOT, help="cartella del progetto con i dataset per l'integrazione")
+    bench.add_argument("--baseline", default=BASELINE_FILE, help="file della baseline")
+    bench.add_argument("--save-baseline", action="store_true", help="salva i risultati come nuova baseline")
+    bench.add_argument("--tolerance", type=float, default=TOLERANCE,
+                       help="peggioramento massimo accettato (0.2 = 20%%)")
+    bench.add_argument("--latency", type=float, default=0.0, help="ritardo in ms per risposta del server di replay")
+    bench.add_argument("-n", "--repetitions", type=int, default=REPETITIONS)
+    bench.add_argument("--output", help="scrive anche i risultati in questo file JSON")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        if args.from_cache:
+            count = record_from_cache(args.from_cache, args.fixtures)
+        else:
+            count = record_live(args.fixtures)
+        print(f"✅ {count} risposte registrate in '{args.fixtures}'")
+        return
+    sys.exit(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Checkpoint su SQLite per gli scraper: ogni unità di lavoro (stagione, URL) viene salvata
+appena completata, così un'esecuzione interrotta riparte dalle unità mancanti.
+"""
+import json
+import sqlite3
+from datetime import datetime
+
+
+class CheckpointStore:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS units (
+                season   INTEGER NOT NULL,
+                url      TEXT    NOT NULL,
+                position INTEGER NOT NULL,
+                rows     TEXT    NOT NULL,
+                done_at  TEXT    NOT NULL,
+                PRIMARY KEY (season, url)
+            )
+        """)
+        self.conn.commit()
+
+    def done_units(self, season=None):
+        """Insieme degli URL già completati (per una stagione o per tutte)."""
+        if season is None:
+            cur = self.conn.execute("SELECT season, url FROM units")
+            return {(s, u) for s, u in cur}
+        cur = self.conn.execute("SELECT url FROM units WHERE season = ?", (season,))
+        return {u for (u,) in cur}
+
+    def save_unit(self, season, url, position, rows):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO units (season, url, position, rows, done_at) VALUES (?, ?, ?, ?, ?)",
+            (season, url, position, json.dumps(rows, ensure_ascii=False), datetime.now().isoformat()),
+        )
+        self.conn.commit()
+
+    def forget_other_units(self, season, urls):
+        """Elimina i checkpoint della stagione per gli URL non più in `urls` (pagina cambiata)."""
+        placeholders = ", ".join("?" for _ in urls)
+        self.conn.execute(f"DELETE FROM units WHERE season = ? AND url NOT IN ({placeholders})",
+                          (season, *urls))
+        self.conn.commit()
+
+    def seasons(self):
+        return {s for (s,) in self.conn.execute("SELECT DISTINCT season FROM units")}
+
+    def reset(self):
+        self.conn.execute("DELETE FROM units")
+        self.conn.commit()
+
+    def rows(self, since=None):
+        """Tutte le righe salvate, nell'ordine stagione → posizione nella pagina della stagione."""
+        query = "SELECT rows FROM units"
+        params = ()
+        if since is not None:
+            query += " WHERE season >= ?"
+            params = (since,)
+        query += " ORDER BY season, position"
+        for (data,) in self.conn.execute(query, params):
+            yield from json.loads(data)
+
+    def close(self):
+        self.conn.close()
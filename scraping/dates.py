@@ -0,0 +1,103 @@
+"""
+Normalizzazione delle date degli scraper in "YYYY-MM-DD".
+
+Un solo modulo al posto di normalize_date (race_coord.py), parse_data (quali.py) ed
+extract_day (race_date_script.py). Riconosce:
+    "2005-04-10"                       ISO
+    "10-04-2005", "10/04/2005"         giorno-mese-anno numerico
+    "1º maggio", "12–13 giugno 2005"   giorno (o intervallo di giorni) + mese italiano
+    "10 April 2005", "3rd Oct 2010"    giorno + mese inglese (anche abbreviato)
+    "April 10, 2005", "May 12–13, 2005"
+Per gli intervalli vale il primo giorno; se nel testo manca l'anno si usa quello passato
+(es. la stagione della tabella). I pattern sono compilati una volta, i mesi si trovano con
+una lookup in un dizionario e i risultati restano in cache per stringa: nessun tentativo
+a vuoto con strptime ed eccezioni.
+
+normalize_dates normalizza un'intera colonna (lista o pandas Series) con una chiamata,
+calcolando ogni valore distinto una sola volta.
+"""
+import calendar
+import re
+from functools import lru_cache
+
+CACHE_SIZE = 16384
+
+MONTHS = {}
+for _number, _names in enumerate([
+    ("gennaio", "january", "jan", "gen"),
+    ("febbraio", "february", "feb"),
+    ("marzo", "march", "mar"),
+    ("aprile", "april", "apr"),
+    ("maggio", "may", "mag"),
+    ("giugno", "june", "jun", "giu"),
+    ("luglio", "july", "jul", "lug"),
+    ("agosto", "august", "aug", "ago"),
+    ("settembre", "september", "sep", "sept", "set"),
+    ("ottobre", "october", "oct", "ott"),
+    ("novembre", "november", "nov"),
+    ("dicembre", "december", "dec", "dic"),
+], start=1):
+    for _name in _names:
+        MONTHS[_name] = _number
+
+_DAY = r"(\d{1,2})(?:º|°|st|nd|rd|th)?"
+_RANGE = r"(?:\s*[-–—]\s*\d{1,2}(?:º|°|st|nd|rd|th)?)?"
+_YEAR = r"(\d{4})"
+
+ISO_PATTERN = re.compile(_YEAR + r"-(\d{1,2})-(\d{1,2})\b")
+NUMERIC_PATTERN = re.compile(r"\b(\d{1,2})[-–/.](\d{1,2})[-–/.]" + _YEAR + r"\b")
+DAY_FIRST_PATTERN = re.compile(r"\b" + _DAY + _RANGE + r"\s+(?:de\s+)?([^\W\d_]+)\.?(?:,?\s+" + _YEAR + r"\b)?")
+MONTH_FIRST_PATTERN = re.compile(r"\b([^\W\d_]+)\.?\s+" + _DAY + r"\b" + _RANGE + r",?\s+" + _YEAR + r"\b")
+FOOTNOTE_PATTERN = re.compile(r"\[[^\]]*\]")
+
+
+def valid(year, month, day):
+    return 1 <= month <= 12 and 1 <= day <= calendar.monthrange(year, month)[1]
+
+def candidates(text, year):
+    """(anno, mese, giorno) possibili nel testo, nell'ordine in cui vanno provati."""
+    for m in ISO_PATTERN.finditer(text):
+        yield int(m.group(1)), int(m.group(2)), int(m.group(3))
+    for m in NUMERIC_PATTERN.finditer(text):
+        yield int(m.group(3)), int(m.group(2)), int(m.group(1))
+    for m in DAY_FIRST_PATTERN.finditer(text):
+        month = MONTHS.get(m.group(2))
+        found_year = int(m.group(3)) if m.group(3) else year
+        if month and found_year:
+            yield found_year, month, int(m.group(1))
+    for m in MONTH_FIRST_PATTERN.finditer(text):
+        month = MONTHS.get(m.group(1))
+        if month:
+            yield int(m.group(3)), month, int(m.group(2))
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_date(raw, year=None):
+    """(anno, mese, giorno) della prima data valida nel testo, oppure None."""
+    text = FOOTNOTE_PATTERN.sub(" ", raw.replace("\xa0", " ")).lower()
+    for found in candidates(text, year):
+        if valid(*found):
+            return found
+    return None
+
+def normalize_date(raw, year=None):
+    """Data in formato "YYYY-MM-DD", oppure None se il testo non contiene una data riconoscibile."""
+    if not isinstance(raw, str):
+        return None
+    parsed = parse_date(raw, int(year) if year else None)
+    return "%04d-%02d-%02d" % parsed if parsed else None
+
+def normalize_dates(values, year=None):
+    """
+    Normalizza una colonna di stringhe in una sola chiamata.
+
+    values  lista/iterabile di stringhe oppure pandas Series (restituisce una Series)
+    year    anno di default per tutte le righe, oppure una sequenza con un anno per riga
+    """
+    is_series = hasattr(values, "map") and hasattr(values, "unique")
+    if hasattr(year, "__iter__") and not isinstance(year, str):
+        result = [normalize_date(v, y) for v, y in zip(values, year)]
+        return type(values)(result, index=values.index) if is_series else result
+    if is_series:
+        mapping = {v: normalize_date(v, year) for v in values.dropna().unique()}
+        return values.map(mapping)
+    return [normalize_date(v, year) for v in values]
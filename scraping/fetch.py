@@ -0,0 +1,450 @@
+"""
+Livello HTTP condiviso da tutti gli scraper.
+
+- una sola requests.Session con connection pooling (keep-alive tra le richieste)
+- richieste condizionali (If-None-Match / If-Modified-Since) quando una pagina in cache è scaduta
+- cache su disco content-addressed: i corpi sono salvati come objects/<sha256>,
+  l'indice index.json associa ogni URL (+ parametri) al suo oggetto
+- TTL ed eviction per dimensione (prima le voci usate meno di recente)
+- report finale con hit / rivalidazioni / miss
+- ogni get() è misurato come fase "fetch" del profiler (profiling.py)
+- con rate= le richieste in rete (non i hit di cache) passano da un token bucket condiviso
+  tra i thread; indice e statistiche della cache sono protetti da un lock, quindi lo
+  stesso Fetcher si può usare da un pool di thread
+- più processi possono condividere la stessa cache (es. gli scraper in parallelo di
+  pipeline.py): l'indice viene salvato sotto un lock su file, unendo le voci scritte nel
+  frattempo dagli altri processi, con un file temporaneo diverso per ogni processo
+- ogni pagina scaricata (risposta 200) finisce anche nell'archivio compresso di snapshots.py;
+  con MOTOGP_OFFLINE=1 le risposte arrivano solo dall'archivio, senza rete e senza leggere
+  o riscrivere la cache HTTP
+- con MOTOGP_REPLAY_URL le richieste vanno al server locale di bench_suite.py invece che
+  ai siti reali (la chiave di cache resta l'URL originale)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from profiling import profiler
+from snapshots import OFFLINE, SNAPSHOT_DIR, SnapshotArchive
+
+try:
+    import fcntl
+except ImportError:         # Windows: solo il lock tra thread
+    fcntl = None
+
+CACHE_DIR = os.environ.get(
+    "MOTOGP_HTTP_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".http_cache"),
+)
+CACHE_TTL = 7 * 24 * 3600           # secondi prima di rivalidare una pagina
+CACHE_MAX_BYTES = 512 * 1024 * 1024  # oltre questa dimensione si eliminano le voci più vecchie
+INDEX_FLUSH_EVERY = 50               # salva l'indice ogni N aggiornamenti
+# Server di replay delle fixture (es. http://127.0.0.1:8765, vedi bench_suite.py)
+REPLAY_URL = os.environ.get("MOTOGP_REPLAY_URL")
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0"
+}
+
+
+@contextmanager
+def file_lock(path):
+    """Lock esclusivo tra processi sul file `path` (creato se manca)."""
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def newer(entry, other):
+    return (entry["fetched_at"], entry["used_at"]) > (other["fetched_at"], other["used_at"])
+
+def replay_url(url):
+    """https://host/path?q → <REPLAY_URL>/host/path?q se il replay è attivo, altrimenti l'URL invariato."""
+    if not REPLAY_URL:
+        return url
+    parts = urlsplit(url)
+    return f"{REPLAY_URL.rstrip('/')}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+
+
+class TokenBucket:
+    """
+    Rate limit condiviso tra thread: in media `rate` richieste al secondo, con al massimo
+    `burst` richieste di fila dopo un periodo di inattività.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CachedResponse:
+    """Risposta minimale compatibile con requests.Response per l'uso che ne fanno gli scraper."""
+
+    def __init__(self, url, status_code, content, headers=None, from_cache=False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} per {self.url}")
+
+
+class Fetcher:
+    def __init__(self, cache_dir=CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES,
+                 headers=None, pool_size=10, use_cache=True, rate=None, burst=1, snapshots=True):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.use_cache = use_cache
+
+        self.session = self._make_session(headers, pool_size)
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.archive = SnapshotArchive(SNAPSHOT_DIR) if snapshots and SNAPSHOT_DIR else None
+        self.offline = OFFLINE
+        self._lock = threading.RLock()
+
+        self.stats = {"hit": 0, "revalidated": 0, "miss": 0, "error": 0, "bytes": 0}
+        self.index = {}
+        self._evicted = set()           # chiavi eliminate da questo processo, da non riprendere dal disco
+        self._dirty = 0
+        if self.use_cache and not self.offline:
+            os.makedirs(self.objects_dir, exist_ok=True)
+            self.index = self._load_index()
+
+    @staticmethod
+    def _make_session(headers, pool_size):
+        session = requests.Session()
+        session.headers.update(DEFAULT_HEADERS)
+        if headers:
+            session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    # === Indice e oggetti su disco ===
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, evict=False):
+        """
+        Salva l'indice unendo quello su disco (voci degli altri processi; per le chiavi in
+        comune vince la versione scaricata più di recente); con evict=True applica prima
+        il limite di dimensione all'indice unito.
+        """
+        with self._lock, file_lock(self.index_path + ".lock"):
+            for key, entry in self._load_index().items():
+                if key in self._evicted:
+                    continue
+                current = self.index.get(key)
+                if current is None or newer(entry, current):
+                    self.index[key] = entry
+            if evict:
+                self._evict()
+            tmp_path = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.index, f)
+            os.replace(tmp_path, self.index_path)
+            self._evicted.clear()
+            self._dirty = 0
+
+    def _touch(self):
+        self._dirty += 1
+        if self._dirty >= INDEX_FLUSH_EVERY:
+            self._save_index()
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest)
+
+    def _read_object(self, digest):
+        try:
+            with open(self._object_path(digest), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_object(self, content):
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(content)
+        return digest
+
+    @staticmethod
+    def cache_key(url, params=None):
+        if not params:
+            return url
+        query = "&".join(f"{k}={params[k]}" for k in sorted(params))
+        return f"{url}?{query}"
+
+    def _evict(self):
+        """Elimina le voci usate meno di recente finché la cache non rientra in max_bytes."""
+        sizes = {}
+        for entry in self.index.values():
+            sizes[entry["sha"]] = entry["size"]
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+
+        refs = {}
+        for entry in self.index.values():
+            refs[entry["sha"]] = refs.get(entry["sha"], 0) + 1
+
+        for key, entry in sorted(self.index.items(), key=lambda kv: kv[1]["used_at"]):
+            if total <= self.max_bytes:
+                break
+            del self.index[key]
+            self._evicted.add(key)
+            refs[entry["sha"]] -= 1
+            if refs[entry["sha"]] == 0:
+                total -= entry["size"]
+                try:
+                    os.remove(self._object_path(entry["sha"]))
+                except OSError:
+                    pass
+
+    # === Logica di cache ===
+
+    def _lookup(self, url, params):
+        key = self.cache_key(url, params)
+        with self._lock:
+            entry = self.index.get(key) if self.use_cache else None
+        cached = self._read_object(entry["sha"]) if entry else None
+        return key, entry, cached
+
+    def _fresh_hit(self, url, entry, cached, now):
+        if cached is None or now - entry["fetched_at"] >= self.ttl:
+            return None
+        with self._lock:
+            self.stats["hit"] += 1
+            entry["used_at"] = now
+            self._touch()
+        return CachedResponse(url, 200, cached, from_cache=True)
+
+    def _count_error(self):
+        with self._lock:
+            self.stats["error"] += 1
+
+    @staticmethod
+    def _conditional_headers(entry, cached, headers):
+        request_headers = dict(headers or {})
+        if cached is not None:
+            if entry.get("etag"):
+                request_headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                request_headers["If-Modified-Since"] = entry["last_modified"]
+        return request_headers
+
+    def _record(self, url, key, entry, cached, status, content, headers, now):
+        with self._lock:
+            if status == 304 and cached is not None:
+                self.stats["revalidated"] += 1
+                entry["fetched_at"] = entry["used_at"] = now
+                self._touch()
+                return CachedResponse(url, 200, cached, from_cache=True)
+
+            self.stats["bytes"] += len(content)
+            if status != 200:
+                self.stats["error"] += 1
+                return CachedResponse(url, status, content, headers)
+
+            self.stats["miss"] += 1
+            if self.archive is not None:
+                self.archive.add(key, content, now)
+            if self.use_cache:
+                self.index[key] = {
+                    "sha": self._write_object(content),
+                    "size": len(content),
+                    "etag": headers.get("ETag"),
+                    "last_modified": headers.get("Last-Modified"),
+                    "fetched_at": now,
+                    "used_at": now,
+                }
+                self._touch()
+            return CachedResponse(url, 200, content, headers)
+
+    def _from_archive(self, url, params):
+        """Risposta in modalità offline: l'ultima versione archiviata, 404 se la pagina manca."""
+        content = self.archive.get(self.cache_key(url, params)) if self.archive is not None else None
+        if content is None:
+            self._count_error()
+            return CachedResponse(url, 404, b"")
+        with self._lock:
+            self.stats["hit"] += 1
+        return CachedResponse(url, 200, content, from_cache=True)
+
+    @staticmethod
+    def _downloaded(response):
+        return 0 if response.from_cache else len(response.content)
+
+    # === API pubblica ===
+
+    def get(self, url, params=None, headers=None, timeout=30):
+        with profiler.stage("fetch") as s:
+            response = self._get(url, params, headers, timeout)
+            s["bytes"] = self._downloaded(response)
+            s["rows_out"] = 1
+        return response
+
+    def _get(self, url, params, headers, timeout):
+        if self.offline:
+            return self._from_archive(url, params)
+        key, entry, cached = self._lookup(url, params)
+        now = time.time()
+        hit = self._fresh_hit(url, entry, cached, now)
+        if hit:
+            return hit
+
+        request_headers = self._conditional_headers(entry, cached, headers)
+        if self.bucket is not None:
+            self.bucket.acquire()
+        try:
+            res = self.session.get(replay_url(url), params=params, headers=request_headers, timeout=timeout)
+        except requests.RequestException:
+            self._count_error()
+            raise
+        return self._record(url, key, entry, cached, res.status_code, res.content, res.headers, now)
+
+    def close(self):
+        if self.use_cache and not self.offline:
+            self._save_index(evict=True)
+        if self.archive is not None:
+            self.archive.close()
+        self.session.close()
+
+    def report(self):
+        s = self.stats
+        total = s["hit"] + s["revalidated"] + s["miss"]
+        hit_rate = (s["hit"] + s["revalidated"]) / total * 100 if total else 0.0
+        print(f"📦 Cache HTTP: {s['hit']} hit, {s['revalidated']} rivalidate (304), "
+              f"{s['miss']} miss, {s['error']} errori - hit rate {hit_rate:.1f}%, "
+              f"{s['bytes'] / 1024:.1f} KB scaricati")
+        return dict(s)
+
+
+class AsyncFetcher(Fetcher):
+    """
+    Variante asyncio/aiohttp del Fetcher: usa la stessa cache su disco, limita le richieste
+    contemporanee per host e distanzia l'avvio delle richieste verso lo stesso host
+    di almeno min_interval secondi (rate limit "educato").
+
+        async with AsyncFetcher(per_host=4, min_interval=0.25) as fetcher:
+            res = await fetcher.get(url)
+    """
+
+    def __init__(self, per_host=4, min_interval=0.25, headers=None, **kwargs):
+        self.per_host = per_host
+        self.min_interval = min_interval
+        self._headers = dict(DEFAULT_HEADERS, **(headers or {}))
+        self._host_slots = {}
+        self._host_locks = {}
+        self._next_start = {}
+        super().__init__(headers=headers, **kwargs)
+
+    def _make_session(self, headers, pool_size):
+        # la sessione aiohttp va creata dentro il loop, vedi __aenter__
+        return None
+
+    async def __aenter__(self):
+        import aiohttp
+
+        self.session = aiohttp.ClientSession(
+            headers=self._headers,
+            connector=aiohttp.TCPConnector(limit_per_host=self.per_host),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+        if self.use_cache and not self.offline:
+            self._save_index(evict=True)
+        if self.archive is not None:
+            self.archive.close()
+
+    async def _throttle(self, host):
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            loop = asyncio.get_running_loop()
+            wait = self._next_start.get(host, 0) - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_start[host] = loop.time() + self.min_interval
+
+    async def get(self, url, params=None, headers=None, timeout=30):
+        with profiler.stage("fetch") as s:
+            response = await self._get(url, params, headers, timeout)
+            s["bytes"] = self._downloaded(response)
+            s["rows_out"] = 1
+        return response
+
+    async def _get(self, url, params, headers, timeout):
+        import aiohttp
+
+        if self.offline:
+            return self._from_archive(url, params)
+        key, entry, cached = self._lookup(url, params)
+        now = time.time()
+        hit = self._fresh_hit(url, entry, cached, now)
+        if hit:
+            return hit
+
+        request_headers = self._conditional_headers(entry, cached, headers)
+        host = urlsplit(url).netloc
+        slot = self._host_slots.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with slot:
+            await self._throttle(host)
+            try:
+                async with self.session.get(replay_url(url), params=params, headers=request_headers,
+                                            timeout=aiohttp.ClientTimeout(total=timeout)) as res:
+                    content = await res.read()
+                    status = res.status
+                    res_headers = dict(res.headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self._count_error()
+                raise
+        return self._record(url, key, entry, cached, status, content, res_headers, now)
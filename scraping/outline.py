@@ -0,0 +1,62 @@
+"""
+Indice delle sezioni di una pagina Wikipedia (BeautifulSoup), costruito con un solo
+passaggio sul documento: ogni intestazione h1–h6 con i suoi id e il suo titolo, e la
+posizione delle tabelle rispetto alle intestazioni.
+
+    outline = PageOutline(soup)
+    section = outline.find(["By_year", r"Winners_of_the_.*_Grand_Prix"])
+    for table in outline.tables_after(section, stop=["References"]):
+        ...
+
+Sostituisce le catene di soup.find(id=...) e i cicli find_next("table") / find_next("h2"),
+che ripartono ogni volta dal punto corrente e su pagine lunghe costano O(n²): qui trovare
+la sezione è una lookup sugli id e le tabelle sono una fetta della lista.
+"""
+import re
+
+HEADINGS = ["h1", "h2", "h3", "h4", "h5", "h6"]
+
+
+class PageOutline:
+    def __init__(self, soup):
+        self.sections = []      # intestazioni in ordine di documento
+        self.tables = []        # tabelle in ordine di documento (anche quelle annidate)
+        for tag in soup.find_all(HEADINGS + ["table"]):
+            if tag.name == "table":
+                self.tables.append(tag)
+                continue
+            # id sull'intestazione (HTML attuale) o sullo span.mw-headline interno (HTML vecchio)
+            ids = [tag.get("id")] + [el.get("id") for el in tag.find_all(id=True)]
+            self.sections.append({
+                "ids": [i for i in ids if i],
+                "level": int(tag.name[1]),
+                "title": tag.text.strip(),
+                "heading": tag,
+                "first_table": len(self.tables),    # indice della prima tabella dopo l'intestazione
+                "position": len(self.sections),
+            })
+
+    def find(self, patterns):
+        """
+        Prima sezione il cui id corrisponde (re.fullmatch) a uno dei pattern, provati
+        nell'ordine della lista; None se nessuna corrisponde.
+        """
+        for pattern in patterns:
+            regex = re.compile(pattern)
+            for section in self.sections:
+                if any(regex.fullmatch(i) for i in section["ids"]):
+                    return section
+        return None
+
+    def tables_after(self, section, stop=(), stop_level=2):
+        """
+        Tabelle che seguono la sezione fino alla prima intestazione di livello `stop_level`
+        il cui titolo o id è in `stop` (fino alla fine della pagina se non c'è).
+        """
+        end = len(self.tables)
+        stop = set(stop)
+        for following in self.sections[section["position"] + 1:]:
+            if following["level"] == stop_level and (following["title"] in stop or stop & set(following["ids"])):
+                end = following["first_table"]
+                break
+        return self.tables[section["first_table"]:end]
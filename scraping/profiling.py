@@ -0,0 +1,195 @@
+"""
+Strumentazione delle pipeline (scraper e integrazione).
+
+Un solo profiler di processo (`profiler`) raccoglie, per ogni fase, chiamate, tempo,
+byte scaricati, righe in ingresso/uscita e picco di memoria (RSS):
+
+    with profiler.stage("parse") as s:          # blocco di codice
+        soup = BeautifulSoup(html, "html.parser")
+        s["rows_out"] = 1
+
+    @profiler.track("extract")                  # funzione: righe in uscita = len(risultato)
+    def extract_details(soup): ...
+
+Le fasi usate dagli scraper sono fetch (fetch.Fetcher), parse, extract e write
+(sink.RecordWriter); l'integrazione registra ogni passo di engine.run. Il tempo di una
+fase è la somma delle sue chiamate (con --async le chiamate si sovrappongono).
+
+Gli script aggiungono le opzioni con add_arguments(parser) e chiamano start(args) /
+finish(args) attorno al lavoro:
+    --report [FILE]   scrive il report dell'esecuzione in JSON
+    --profile FILE    profila l'esecuzione: FILE .html → pyinstrument (se installato),
+                      altrimenti statistiche cProfile (apribili con pstats/snakeviz) e
+                      stampa delle funzioni più costose
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+try:
+    import resource
+except ImportError:         # Windows
+    resource = None
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:
+    PyinstrumentProfiler = None
+
+TOP_FUNCTIONS = 25          # funzioni stampate con --profile (ordinate per tempo cumulativo)
+COUNTERS = ("bytes", "rows_in", "rows_out")
+
+
+def peak_rss_mb():
+    """Picco di memoria residente del processo in MB (None se non disponibile)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux riporta KB, macOS byte
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def count_rows(value):
+    """
+    Righe di un risultato: len() per liste/DataFrame, il valore stesso per un conteggio
+    (int), 1 per un singolo record, 0 per None.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, (list, set)) or hasattr(value, "shape"):
+        return len(value)
+    return 1
+
+
+class Profiler:
+    def __init__(self):
+        self.stages = {}
+        self.started = time.perf_counter()
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self._lock = threading.Lock()
+
+    def reset(self):
+        self.__init__()
+
+    @contextmanager
+    def stage(self, name, rows_in=0):
+        """Misura un blocco; il dict restituito accetta "bytes", "rows_in" e "rows_out"."""
+        counters = {"bytes": 0, "rows_in": rows_in, "rows_out": 0}
+        start = time.perf_counter()
+        try:
+            yield counters
+        finally:
+            self.add(name, time.perf_counter() - start, **counters)
+
+    def add(self, name, seconds, **counters):
+        rss = peak_rss_mb()
+        with self._lock:
+            s = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, **{c: 0 for c in COUNTERS},
+                                              "peak_rss_mb": None})
+            s["calls"] += 1
+            s["seconds"] += seconds
+            for c in COUNTERS:
+                s[c] += counters.get(c, 0) or 0
+            s["peak_rss_mb"] = rss
+
+    def track(self, name):
+        """Decoratore: misura ogni chiamata della funzione come fase `name`."""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(name) as s:
+                    result = fn(*args, **kwargs)
+                    s["rows_out"] = count_rows(result)
+                return result
+            return wrapper
+        return decorator
+
+    def report(self, script=None, extra=None):
+        wall = time.perf_counter() - self.started
+        with self._lock:
+            stages = {name: dict(s, seconds=round(s["seconds"], 6)) for name, s in self.stages.items()}
+        result = {
+            "script": script or os.path.basename(sys.argv[0]),
+            "started_at": self.started_at,
+            "wall_seconds": round(wall, 6),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": stages,
+        }
+        if extra:
+            result.update(extra)
+        return result
+
+    def print_summary(self):
+        with self._lock:
+            stages = sorted(self.stages.items(), key=lambda item: -item[1]["seconds"])
+        for name, s in stages:
+            print(f"   {name:<16} {s['calls']:6d} chiamate {s['seconds']:9.3f}s "
+                  f"{s['bytes'] / 1024:10.1f} KB {s['rows_in']:8d} → {s['rows_out']:<8d} righe")
+
+
+profiler = Profiler()
+_active = {}
+
+
+# === Opzioni da riga di comando ===
+
+def add_arguments(parser, report_file=None):
+    name = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+    parser.add_argument("--report", metavar="FILE", nargs="?", const=report_file or f"{name}_report.json",
+                        help="scrive il report dell'esecuzione (tempi, byte, righe, memoria per fase) in JSON")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="profila l'esecuzione: .html con pyinstrument (se installato), altrimenti cProfile")
+
+def start(args):
+    """Azzera il profiler e, con --profile, avvia cProfile o pyinstrument."""
+    profiler.reset()
+    path = getattr(args, "profile", None)
+    if not path:
+        return
+    if path.endswith(".html") and PyinstrumentProfiler is not None:
+        _active["pyinstrument"] = PyinstrumentProfiler()
+        _active["pyinstrument"].start()
+    else:
+        if path.endswith(".html"):
+            print("[!] pyinstrument non installato: uso cProfile")
+        _active["cprofile"] = cProfile.Profile()
+        _active["cprofile"].enable()
+
+def finish(args, extra=None):
+    """Ferma il profilo, scrive i file richiesti e restituisce il report."""
+    path = getattr(args, "profile", None)
+    if "pyinstrument" in _active:
+        session = _active.pop("pyinstrument")
+        session.stop()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(session.output_html())
+        print(f"[i] Profilo pyinstrument in '{path}'")
+    elif "cprofile" in _active:
+        session = _active.pop("cprofile")
+        session.disable()
+        if path.endswith(".html"):
+            path = os.path.splitext(path)[0] + ".prof"
+        session.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(session, stream=out).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        print(out.getvalue())
+        print(f"[i] Statistiche cProfile in '{path}'")
+
+    result = profiler.report(extra=extra)
+    report_path = getattr(args, "report", None)
+    if report_path:
+        os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4, ensure_ascii=False)
+        profiler.print_summary()
+        print(f"⏱️ Report dell'esecuzione in '{report_path}'")
+    return result
@@ -1,12 +1,23 @@
-import requests
 from bs4 import BeautifulSoup
-import csv
+import argparse
+import heapq
+import os
 import re
 from datetime import datetime
+from checkpoint import CheckpointStore
+from dates import normalize_date
+from fetch import Fetcher
+import profiling
+from profiling import profiler
+from sink import RecordWriter, read_records
+from tabelle import estrai_sezione
 
 WIKI_BASE = "https://it.wikipedia.org"
 START_YEAR = 2005
 END_YEAR = datetime.now().year
+OUTPUT_FILE = "motogp_griglia.csv"
+STATE_FILE = "quali_state.sqlite"
+CSV_FIELDS = ["Year", "Date", "Circuit", "OfficialName", "Class", "RiderName", "Position"]
 
 def normalizza_categoria(titolo):
     t = titolo.lower()
@@ -18,195 +29,145 @@ def normalizza_categoria(titolo):
         return "Moto3"
     return None
 
-def parse_data(data_raw):
-    match = re.search(r'(\d{1,2})[-–](\d{1,2})[-–](\d{4})', data_raw)
-    if match:
-        g, m, a = match.groups()
-        return f"{a}-{m.zfill(2)}-{g.zfill(2)}"
-    match = re.search(r'(\d{1,2})\s+\w+\s+(\d{4})', data_raw)
-    if match:
-        g, a = match.groups()
-        mesi = {
-            "gennaio": "01", "febbraio": "02", "marzo": "03", "aprile": "04",
-            "maggio": "05", "giugno": "06", "luglio": "07", "agosto": "08",
-            "settembre": "09", "ottobre": "10", "novembre": "11", "dicembre": "12"
-        }
-        for mese, numero in mesi.items():
-            if mese in data_raw.lower():
-                return f"{a}-{numero}-{g.zfill(2)}"
-    return ""
-
-def estrai_nome_pilota(td_pilota):
-    """Estrae il nome del pilota dalla cella, rimuovendo link e bandiere"""
-    # Cerca tutti i link <a> nella cella
-    links = td_pilota.find_all('a')
-    for link in links:
-        # Se il link ha un title che non contiene "bandiera", è probabilmente il pilota
-        if link.get('title') and 'bandiera' not in link.get('title', '').lower():
-            return link.get_text(strip=True)
+def estrai_nome_pilota(cella):
+    """Estrae il nome del pilota dalla cella, ignorando i link alle bandiere"""
+    # Se un link ha un title che non contiene "bandiera", è probabilmente il pilota
+    for title, testo in cella["links"]:
+        if title and 'bandiera' not in title.lower():
+            return testo
     
     # Se non trova un link appropriato, prende tutto il testo pulito
-    text = td_pilota.get_text(strip=True)
-    # Rimuove eventuali caratteri speciali e spazi extra
-    return re.sub(r'\s+', ' ', text)
+    return re.sub(r'\s+', ' ', cella["text"])
+
+# (chiave, testo dell'h3, etichetta nei messaggi)
+SOTTOSEZIONI_GRIGLIA = [
+    ("arrivati", "arrivati al traguardo", "Arrivati al traguardo"),
+    ("ritirati", "ritirati", "Ritirati"),
+]
 
-def estrai_da_arrivati(soup, year, date_str, circuito, nome_ufficiale):
+@profiler.track("extract")
+def estrai_da_arrivati(pagina, year, date_str, circuito, nome_ufficiale, backend=None):
+    """
+    Estrae pilota e posizione in griglia dalle tabelle "Arrivati al traguardo" e "Ritirati"
+    della sezione MotoGP. `pagina` può essere l'HTML grezzo (parsato con il backend più
+    veloce disponibile) oppure un BeautifulSoup già costruito.
+    """
     risultati = []
-    
-    # Cerca la sezione MotoGP
-    motogp_heading = soup.find('h2', {'id': 'MotoGP'})
-    if not motogp_heading:
+    esito = estrai_sezione(
+        pagina, "MotoGP",
+        [(chiave, testo) for chiave, testo, _ in SOTTOSEZIONI_GRIGLIA],
+        ["pilota", "griglia"],
+        backend=backend,
+    )
+
+    if not esito["sezione"]:
         print(f"   ❌ Sezione MotoGP non trovata")
         return risultati
-    
     print(f"   ✅ Sezione MotoGP trovata")
-    
-    # Trova il div contenitore della sezione MotoGP
-    motogp_div = motogp_heading.find_parent('div', class_='mw-heading')
-    if not motogp_div:
+
+    if not esito["contenitore"]:
         print(f"   ❌ Div MotoGP non trovato")
         return risultati
-    
-    # Cerca la sezione "Arrivati al traguardo"
-    current_element = motogp_div
-    arrivati_heading = None
-    
-    # Scorri gli elementi successivi fino a trovare "Arrivati al traguardo"
-    while current_element:
-        current_element = current_element.find_next_sibling()
-        if not current_element:
-            break
-            
-        # Controlla se è un heading h3 con "Arrivati al traguardo"
-        h3 = current_element.find('h3')
-        if h3 and 'arrivati al traguardo' in h3.get_text(strip=True).lower():
-            arrivati_heading = h3
-            break
-    
-    if arrivati_heading:
-        print(f"   ✅ Sezione 'Arrivati al traguardo' trovata")
-        
-        # Trova la tabella degli arrivati
-        arrivati_div = arrivati_heading.find_parent('div', class_='mw-heading')
-        tabella_arrivati = arrivati_div.find_next_sibling('table', class_='wikitable')
-        
-        if tabella_arrivati:
-            print(f"   ✅ Tabella arrivati trovata")
-            
-            # Estrai i dati dalla tabella
-            rows = tabella_arrivati.find_all('tr')
-            if len(rows) > 1:  # Salta l'header
-                header_row = rows[0]
-                headers = [th.get_text(strip=True).lower() for th in header_row.find_all(['th', 'td'])]
-                
-                # Trova gli indici delle colonne
-                try:
-                    pilota_idx = headers.index('pilota')
-                    griglia_idx = headers.index('griglia')
-                    
-                    for row in rows[1:]:
-                        cells = row.find_all(['td', 'th'])
-                        if len(cells) > max(pilota_idx, griglia_idx):
-                            pilota_nome = estrai_nome_pilota(cells[pilota_idx])
-                            griglia_pos = cells[griglia_idx].get_text(strip=True)
-                            
-                            if pilota_nome and griglia_pos:
-                                risultati.append({
-                                    "Year": str(year),
-                                    "Date": date_str,
-                                    "Circuit": circuito,
-                                    "OfficialName": nome_ufficiale,
-                                    "Class": "MotoGP",
-                                    "RiderName": pilota_nome,
-                                    "Position": griglia_pos
-                                })
-                    
-                    print(f"   ✅ Estratti {len(risultati)} piloti da MotoGP - Arrivati")
-                    
-                except ValueError as e:
-                    print(f"   ❌ Errore nell'identificare le colonne: {e}")
-        else:
-            print(f"   ❌ Tabella arrivati non trovata")
-    else:
-        print(f"   ❌ Sezione 'Arrivati al traguardo' non trovata")
-    
-    # Cerca la sezione "Ritirati"
-    current_element = motogp_div
-    ritirati_heading = None
-    
-    # Scorri gli elementi successivi fino a trovare "Ritirati"
-    while current_element:
-        current_element = current_element.find_next_sibling()
-        if not current_element:
-            break
-            
-        # Controlla se è un heading h3 con "Ritirati"
-        h3 = current_element.find('h3')
-        if h3 and 'ritirati' in h3.get_text(strip=True).lower():
-            ritirati_heading = h3
-            break
-    
-    if ritirati_heading:
-        print(f"   ✅ Sezione 'Ritirati' trovata")
-        
-        # Trova la tabella dei ritirati
-        ritirati_div = ritirati_heading.find_parent('div', class_='mw-heading')
-        tabella_ritirati = ritirati_div.find_next_sibling('table', class_='wikitable')
-        
-        if tabella_ritirati:
-            print(f"   ✅ Tabella ritirati trovata")
+
+    for chiave, _, etichetta in SOTTOSEZIONI_GRIGLIA:
+        tabella = esito["tabelle"][chiave]
+        if not tabella["titolo"]:
+            print(f"   ❌ Sezione '{etichetta}' non trovata")
+            continue
+        print(f"   ✅ Sezione '{etichetta}' trovata")
+
+        if not tabella["tabella"]:
+            print(f"   ❌ Tabella {chiave} non trovata")
+            continue
+        print(f"   ✅ Tabella {chiave} trovata")
+
+        if tabella["errore"]:
+            print(f"   ❌ Errore nell'identificare le colonne ({chiave}): {tabella['errore']}")
+            continue
+
+        estratti = 0
+        for cella_pilota, cella_griglia in tabella["righe"]:
+            pilota_nome = estrai_nome_pilota(cella_pilota)
+            griglia_pos = cella_griglia["text"]
             
-            # Estrai i dati dalla tabella
-            rows = tabella_ritirati.find_all('tr')
-            if len(rows) > 1:  # Salta l'header
-                header_row = rows[0]
-                headers = [th.get_text(strip=True).lower() for th in header_row.find_all(['th', 'td'])]
-                
-                # Trova gli indici delle colonne
-                try:
-                    pilota_idx = headers.index('pilota')
-                    griglia_idx = headers.index('griglia')
-                    
-                    ritirati_count = 0
-                    for row in rows[1:]:
-                        cells = row.find_all(['td', 'th'])
-                        if len(cells) > max(pilota_idx, griglia_idx):
-                            pilota_nome = estrai_nome_pilota(cells[pilota_idx])
-                            griglia_pos = cells[griglia_idx].get_text(strip=True)
-                            
-                            if pilota_nome and griglia_pos:
-                                risultati.append({
-                                    "Year": str(year),
-                                    "Date": date_str,
-                                    "Circuit": circuito,
-                                    "OfficialName": nome_ufficiale,
-                                    "Class": "MotoGP",
-                                    "RiderName": pilota_nome,
-                                    "Position": griglia_pos
-                                })
-                                ritirati_count += 1
-                    
-                    print(f"   ✅ Estratti {ritirati_count} piloti da MotoGP - Ritirati")
-                    
-                except ValueError as e:
-                    print(f"   ❌ Errore nell'identificare le colonne dei ritirati: {e}")
-        else:
-            print(f"   ❌ Tabella ritirati non trovata")
-    else:
-        print(f"   ❌ Sezione 'Ritirati' non trovata")
+            if pilota_nome and griglia_pos:
+                risultati.append({
+                    "Year": str(year),
+                    "Date": date_str,
+                    "Circuit": circuito,
+                    "OfficialName": nome_ufficiale,
+                    "Class": "MotoGP",
+                    "RiderName": pilota_nome,
+                    "Position": griglia_pos
+                })
+                estratti += 1
+        print(f"   ✅ Estratti {estratti} piloti da MotoGP - {chiave.capitalize()}")
     
     return risultati
 
+def righe_precedenti(path, since, salvate=()):
+    """
+    Righe del CSV esistente, lette una alla volta, per le stagioni prima di `since` e per
+    quelle senza checkpoint (`salvate`), ad esempio perché la pagina non si è aperta.
+    """
+    if not os.path.exists(path):
+        return
+    for r in read_records(path):
+        if int(r["Year"]) < since or int(r["Year"]) not in salvate:
+            yield r
+
+def csv_con_righe(path):
+    return os.path.exists(path) and next(iter(read_records(path)), None) is not None
+
+def scrivi_csv(path, righe):
+    """Riscrive il CSV in streaming su un file temporaneo e lo sostituisce solo alla fine."""
+    tmp_path = os.path.splitext(path)[0] + ".tmp.csv"
+    with RecordWriter(tmp_path, CSV_FIELDS) as w:
+        w.write_all(righe)
+    os.replace(tmp_path, path)
+    return w.count
+
 def main():
-    csv_data = []
-    for year in range(START_YEAR, END_YEAR + 1):
+    parser = argparse.ArgumentParser(description="Scraping griglie di partenza MotoGP da it.wikipedia")
+    parser.add_argument("--state", default=STATE_FILE,
+                        help="file SQLite con i checkpoint per (stagione, resoconto)")
+    parser.add_argument("--since", type=int, metavar="YEAR",
+                        help="riscarica solo le stagioni da YEAR in poi e aggiorna il CSV esistente")
+    parser.add_argument("--only-missing", action="store_true",
+                        help="scarica solo i resoconti non ancora nei checkpoint e accoda le righe al CSV")
+    parser.add_argument("--reset", action="store_true",
+                        help="ignora i checkpoint esistenti e riparte da zero")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.start(args)
+
+    state = CheckpointStore(args.state)
+    if args.only_missing and (args.reset or not state.done_units()) and csv_con_righe(OUTPUT_FILE):
+        state.close()
+        parser.error(f"nessun checkpoint in '{args.state}' ma '{OUTPUT_FILE}' ha già delle righe: "
+                     f"--only-missing le duplicherebbe (usare --since YEAR o nessuna opzione)")
+    if args.reset:
+        state.reset()
+    # Con --since le stagioni vengono riscaricate, ma i vecchi checkpoint restano finché
+    # il nuovo resoconto non è stato elaborato: un errore di rete non cancella righe
+    riscarica = bool(args.since) and not args.only_missing
+    fetcher = Fetcher()
+
+    # Con --only-missing le righe nuove vengono accodate al CSV man mano
+    accoda = RecordWriter(OUTPUT_FILE, CSV_FIELDS, append=True) if args.only_missing else None
+    nuove_righe = 0
+    for year in range(args.since or START_YEAR, END_YEAR + 1):
         url = f"{WIKI_BASE}/wiki/Motomondiale_{year}"
         print(f"\n➡️ Elaboro stagione {year}: {url}")
-        r = requests.get(url)
+        r = fetcher.get(url)
         if r.status_code != 200:
             print(f"   ⚠️ Impossibile aprire pagina {url}")
             continue
-        soup = BeautifulSoup(r.content, "html.parser")
+        with profiler.stage("parse", rows_in=1):
+            soup = BeautifulSoup(r.content, "html.parser")
+        completati = set() if riscarica else state.done_units(year)
+        posizione = 0
+        resoconti = []
         
         # Trova la tabella con i Gran Premi
         for tab in soup.find_all("table", {"class": "wikitable"}):
@@ -215,7 +176,7 @@ def main():
                 if len(cols) < 6:
                     continue
                 
-                data_str = parse_data(cols[0].text.strip())
+                data_str = normalize_date(cols[0].text.strip(), year) or ""
                 circuito = cols[1].text.strip()
                 nome_ufficiale = cols[2].text.strip()
                 
@@ -230,29 +191,50 @@ def main():
                     continue
                 
                 full_url = WIKI_BASE + link_resoconto
+                posizione += 1
+                resoconti.append(full_url)
+                if full_url in completati:
+                    print(f"   ⏭️ {nome_ufficiale} già elaborato, salto")
+                    continue
+
                 print(f"   🔗 {nome_ufficiale} - carico resoconto: {full_url}")
                 
-                gr = requests.get(full_url)
+                gr = fetcher.get(full_url)
                 if gr.status_code != 200:
                     print(f"   ⚠️ Impossibile accedere resoconto {full_url}")
                     continue
                 
-                soup_gp = BeautifulSoup(gr.content, "html.parser")
-                q = estrai_da_arrivati(soup_gp, year, data_str, circuito, nome_ufficiale)
+                q = estrai_da_arrivati(gr.content, year, data_str, circuito, nome_ufficiale)
                 
                 if q:
                     print(f"   ✅ {nome_ufficiale}: trovati {len(q)} piloti (griglia)")
-                    csv_data.extend(q)
+                    nuove_righe += len(q)
+                    if accoda:
+                        accoda.write_all(q)
+                        # le righe devono essere su disco prima del checkpoint del resoconto
+                        accoda.flush()
+                    state.save_unit(year, full_url, posizione, q)
                 else:
+                    # senza checkpoint: il resoconto viene riprovato alla prossima esecuzione
                     print(f"   ❌ Nessun dato trovato per {nome_ufficiale}")
+        if riscarica and resoconti:
+            state.forget_other_units(year, resoconti)
     
     # Salva i dati in CSV
-    with open("motogp_griglia.csv", "w", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=["Year", "Date", "Circuit", "OfficialName", "Class", "RiderName", "Position"])
-        w.writeheader()
-        w.writerows(csv_data)
-    
-    print(f"\n✅ CSV creato: motogp_griglia.csv con {len(csv_data)} righe")
+    if args.only_missing:
+        accoda.close()
+        print(f"\n✅ CSV aggiornato: {OUTPUT_FILE} con {nuove_righe} nuove righe")
+    elif args.since:
+        precedenti = righe_precedenti(OUTPUT_FILE, args.since, state.seasons())
+        righe = scrivi_csv(OUTPUT_FILE, heapq.merge(precedenti, state.rows(since=args.since),
+                                                    key=lambda r: int(r["Year"])))
+        print(f"\n✅ CSV aggiornato: {OUTPUT_FILE} con {righe} righe (stagioni dal {args.since} riscaricate)")
+    else:
+        righe = scrivi_csv(OUTPUT_FILE, state.rows())
+        print(f"\n✅ CSV creato: {OUTPUT_FILE} con {righe} righe")
+    state.close()
+    fetcher.close()
+    profiling.finish(args, {"http_cache": fetcher.report()})
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,30 +1,69 @@
-import requests
+import argparse
 import json
-from datetime import datetime
-import re
+import os
+import time
 from tqdm import tqdm
+from dates import normalize_date
+from fetch import Fetcher
+import profiling
+from profiling import profiler
+from sink import RecordWriter, jsonl_path, jsonl_to_json, read_records
+from weather_cube import CUBE_FILE, HOURLY_VARIABLES, CubeWriter, weekend_start
+
+API_URL = "https://archive-api.open-meteo.com/v1/archive"
+DAILY_VARIABLES = "temperature_2m_max,temperature_2m_min,precipitation_sum,weathercode"
+INPUT_FILE = "motogp_gran_premi.json"
+OUTPUT_FILE = "race_weather_data_final.json"
+WEATHER_CACHE_FILE = "weather_cache.json"
+
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0        # secondi, raddoppia a ogni tentativo
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+def request_with_retry(fetcher, params, description):
+    """GET all'API con retry e backoff esponenziale su errori di rete, 429 e 5xx."""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = fetcher.get(API_URL, params=params)
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code not in RETRY_STATUS:
+                print(f"Errore API ({response.status_code}) per {description}")
+                return None
+            error = f"HTTP {response.status_code}"
+        except Exception as e:
+            error = str(e)
+
+        if attempt < MAX_RETRIES:
+            wait = BACKOFF_BASE * 2 ** attempt
+            print(f"[!] {error} per {description}, nuovo tentativo tra {wait:.0f}s")
+            time.sleep(wait)
+
+    print(f"Errore API per {description}: {error} dopo {MAX_RETRIES + 1} tentativi")
+    return None
 
-def fetch_weather_data(latitude, longitude, date):
-    url = "https://archive-api.open-meteo.com/v1/archive"
+def fetch_weather_data(fetcher, latitude, longitude, date, end_date=None):
     params = {
         "latitude": latitude,
         "longitude": longitude,
         "start_date": date,
-        "end_date": date,
-        "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,weathercode",
+        "end_date": end_date or date,
+        "daily": DAILY_VARIABLES,
         "timezone": "auto",
     }
-    
-    try:
-        response = requests.get(url, params=params)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            print(f"Errore API ({response.status_code}) per lat={latitude}, lon={longitude}, data={date}")
-            return None
-    except Exception as e:
-        print(f"Errore nella richiesta API: {e}")
-        return None
+    return request_with_retry(fetcher, params, f"lat={latitude}, lon={longitude}, data={date}..{end_date or date}")
+
+def fetch_hourly_weather(fetcher, latitude, longitude, race_date):
+    """Serie orarie (HOURLY_VARIABLES) del weekend di gara, ora locale del circuito."""
+    params = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "start_date": weekend_start(race_date),
+        "end_date": race_date,
+        "hourly": ",".join(HOURLY_VARIABLES),
+        "timezone": "auto",
+    }
+    return request_with_retry(fetcher, params, f"lat={latitude}, lon={longitude}, weekend del {race_date} (orario)")
 
 def interpret_weathercode(code):
     weather_map = {
@@ -47,87 +86,169 @@ def interpret_weathercode(code):
     }
     return weather_map.get(code, "Sconosciuto")
 
-def normalize_date(date_str):
-    date_str = date_str.strip().replace("\n", " ").replace("\r", " ")
-
-    if not date_str or re.fullmatch(r"\d{1,2}", date_str):
-        return None
-
-    if "," in date_str:
-        parts = [p.strip() for p in date_str.split(",")]
-        for part in parts:
-            if re.search(r"\b\d{4}\b", part):
-                date_str = part
-                break
-        else:
-            date_str = parts[0]
-    elif "–" in date_str:
-        date_str = date_str.split("–")[0].strip()
-
-    date_formats = [
-        "%B %d, %Y", "%d %B %Y", "%Y-%m-%d",
-        "%B %d %Y", "%b %d, %Y", "%d %b %Y",
-    ]
+def valid_races(race_data):
+    """Normalizza data e coordinate di ogni gara; scarta (con un messaggio) quelle non valide."""
+    for race in race_data:
+        circuit_name = race.get("Circuito", "")
+        latitude = race.get("Latitudine", None)
+        longitude = race.get("Longitudine", None)
+        race_date_str = race.get("Data", "")
+
+        # Normalizza la data
+        race_date = normalize_date(race_date_str)
+        if not race_date:
+            print(f"[!] Data non riconosciuta per gara: {circuit_name}")
+            continue
 
-    for fmt in date_formats:
+        # Controlla se le coordinate sono valide
         try:
-            parsed_date = datetime.strptime(date_str, fmt)
-            return parsed_date.strftime("%Y-%m-%d")
-        except ValueError:
+            latitude = float(latitude)
+            longitude = float(longitude)
+        except (ValueError, TypeError):
+            print(f"[!] Coordinate non valide per {circuit_name}: Lat={latitude}, Lon={longitude}")
             continue
 
-    return None
+        yield circuit_name, latitude, longitude, race_date
 
-# === Caricamento dati ===
-with open("motogp_gran_premi.json", "r", encoding="utf-8") as f:
-    race_data = json.load(f)
+@profiler.track("extract")
+def daily_record(daily_data, i):
+    return {
+        "Temp_Max": daily_data["temperature_2m_max"][i],
+        "Temp_Min": daily_data["temperature_2m_min"][i],
+        "Precipitazione": daily_data["precipitation_sum"][i],
+        "Condizione_Meteo": interpret_weathercode(daily_data["weathercode"][i]),
+    }
 
-weather_results = []
+def weather_record(circuit_name, race_date, daily):
+    print(f"[+] Dati meteo trovati per {circuit_name} il {race_date}")
+    weather = {"Circuito": circuit_name, "Data": race_date}
+    weather.update(daily)
+    return weather
 
-# === Estrazione dati meteo ===
-for race in tqdm(race_data, desc="Elaborazione gare"):
-    circuit_name = race.get("Circuito", "")
-    latitude = race.get("Latitudine", None)
-    longitude = race.get("Longitudine", None)
-    race_date_str = race.get("Data", "")
+# === Modalità una richiesta per gara ===
 
-    # Normalizza la data
-    race_date = normalize_date(race_date_str)
-    if not race_date:
-        print(f"[!] Data non riconosciuta per gara: {circuit_name}")
-        continue
+def collect_per_race(fetcher, races):
+    for circuit_name, latitude, longitude, race_date in tqdm(races, desc="Elaborazione gare"):
+        weather_data = fetch_weather_data(fetcher, latitude, longitude, race_date)
 
-    # Controlla se le coordinate sono valide
-    try:
-        latitude = float(latitude)
-        longitude = float(longitude)
-    except (ValueError, TypeError):
-        print(f"[!] Coordinate non valide per {circuit_name}: Lat={latitude}, Lon={longitude}")
-        continue
+        if weather_data and "daily" in weather_data:
+            daily_data = weather_data["daily"]
+            for i, day in enumerate(daily_data["time"]):
+                if day == race_date:
+                    yield weather_record(circuit_name, race_date, daily_record(daily_data, i))
+                    break
+        else:
+            print(f"[!] Nessun dato meteo per {circuit_name} il {race_date}")
+
+# === Modalità a blocchi: una richiesta per circuito ===
 
-    # Recupera i dati meteo
-    weather_data = fetch_weather_data(latitude, longitude, race_date)
+def cache_key(latitude, longitude, date):
+    return f"{latitude:.6f},{longitude:.6f}|{date}"
 
-    if weather_data and "daily" in weather_data:
+def load_weather_cache(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_weather_cache(path, cache):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def collect_batched(fetcher, races, cache_path=WEATHER_CACHE_FILE):
+    """
+    Raggruppa le gare per coordinate e chiede all'API un solo intervallo di date per circuito
+    (dalla prima all'ultima gara non ancora in cache), poi estrae i giorni di gara dagli
+    array giornalieri. I giorni ottenuti restano nella cache locale (coordinate, data).
+    """
+    races = list(races)
+    cache = load_weather_cache(cache_path)
+
+    missing_by_coords = {}
+    for _, latitude, longitude, race_date in races:
+        if cache_key(latitude, longitude, race_date) not in cache:
+            missing_by_coords.setdefault((latitude, longitude), set()).add(race_date)
+
+    print(f"[i] {len(races)} gare, {len(missing_by_coords)} circuiti da scaricare")
+    for (latitude, longitude), dates in tqdm(missing_by_coords.items(), desc="Richieste per circuito"):
+        weather_data = fetch_weather_data(fetcher, latitude, longitude, min(dates), max(dates))
+        if not weather_data or "daily" not in weather_data:
+            continue
         daily_data = weather_data["daily"]
         for i, day in enumerate(daily_data["time"]):
-            if day == race_date:
-                print(f"[+] Dati meteo trovati per {circuit_name} il {race_date}")
-                weather = {
-                    "Circuito": circuit_name,
-                    "Data": race_date,
-                    "Temp_Max": daily_data["temperature_2m_max"][i],
-                    "Temp_Min": daily_data["temperature_2m_min"][i],
-                    "Precipitazione": daily_data["precipitation_sum"][i],
-                    "Condizione_Meteo": interpret_weathercode(daily_data["weathercode"][i]),
-                }
-                weather_results.append(weather)
-                break
+            if day in dates:
+                cache[cache_key(latitude, longitude, day)] = daily_record(daily_data, i)
+        save_weather_cache(cache_path, cache)
+
+    for circuit_name, latitude, longitude, race_date in races:
+        daily = cache.get(cache_key(latitude, longitude, race_date))
+        if daily:
+            yield weather_record(circuit_name, race_date, daily)
+        else:
+            print(f"[!] Nessun dato meteo per {circuit_name} il {race_date}")
+
+# === Modalità oraria: cubo (weekend × ora × variabile) per weather_cube.py ===
+
+def collect_hourly(fetcher, races, directory="."):
+    """Scarica il meteo orario del weekend di ogni gara e lo scrive nel cubo; restituisce (gare con dati, gare)."""
+    races = list(races)
+    writer = CubeWriter(directory, len(races))
+    found = 0
+    for row, (circuit_name, latitude, longitude, race_date) in enumerate(tqdm(races, desc="Meteo orario")):
+        response = fetch_hourly_weather(fetcher, latitude, longitude, race_date)
+        with profiler.stage("extract", rows_in=1) as s:
+            hours = writer.put(row, circuit_name, race_date, latitude, longitude, response)
+            s["rows_out"] = hours
+        if hours:
+            found += 1
+        else:
+            print(f"[!] Nessun dato meteo orario per {circuit_name} il {race_date}")
+    writer.close()
+    return found, len(races)
+
+def main():
+    parser = argparse.ArgumentParser(description="Dati meteo Open-Meteo per ogni GP")
+    parser.add_argument("--batch", action="store_true",
+                        help="una richiesta per circuito invece che una per gara, con cache locale per (coordinate, data)")
+    parser.add_argument("--hourly", action="store_true",
+                        help="meteo orario del weekend di gara (temperatura, pioggia, vento, umidità) "
+                             "nel cubo weather_hourly.npy invece del riepilogo giornaliero")
+    parser.add_argument("--weather-cache", default=WEATHER_CACHE_FILE,
+                        help="file della cache meteo usata da --batch")
+    parser.add_argument("--input", default=INPUT_FILE,
+                        help="gare da race_date_script.py (.json oppure .jsonl)")
+    parser.add_argument("--jsonl-only", action="store_true",
+                        help="lascia solo il file JSON Lines, senza ricostruire il JSON indentato")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.start(args)
+
+    fetcher = Fetcher()
+    # === Estrazione dati meteo (i record vengono scritti man mano) ===
+    races = valid_races(read_records(args.input))
+    if args.hourly:
+        found, total = collect_hourly(fetcher, races)
+        print(f"✅ Meteo orario di {found}/{total} weekend di gara in '{CUBE_FILE}' (vedi weather_cube.py)")
     else:
-        print(f"[!] Nessun dato meteo per {circuit_name} il {race_date}")
-
-# === Salvataggio risultati ===
-with open("race_weather_data_final.json", "w", encoding="utf-8") as f:
-    json.dump(weather_results, f, indent=4, ensure_ascii=False)
-
-print("✅ Dati meteo salvati in 'race_weather_data_final.json'")
\ No newline at end of file
+        if args.batch:
+            weather_results = collect_batched(fetcher, races, args.weather_cache)
+        else:
+            weather_results = collect_per_race(fetcher, races)
+
+        stream_file = jsonl_path(OUTPUT_FILE)
+        with RecordWriter(stream_file) as writer:
+            writer.write_all(weather_results)
+        print(f"[i] {writer.count} giorni di gara in '{stream_file}'")
+
+        # === JSON indentato (facoltativo) ===
+        if not args.jsonl_only:
+            jsonl_to_json(stream_file, OUTPUT_FILE, indent=4)
+            print(f"✅ Dati meteo salvati in '{OUTPUT_FILE}'")
+    fetcher.close()
+    profiling.finish(args, {"http_cache": fetcher.report()})
+
+if __name__ == "__main__":
+    main()
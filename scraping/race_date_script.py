@@ -1,50 +1,29 @@
-import requests
 from bs4 import BeautifulSoup
 from datetime import datetime
-import json
-import time
+import argparse
+import asyncio
 import re
+from dates import normalize_date
+from fetch import Fetcher, AsyncFetcher
+import profiling
+from profiling import profiler
+from sink import RecordWriter, jsonl_path, jsonl_to_json
 
 BASE_URL = "https://it.wikipedia.org/wiki/Motomondiale_ {}"
+WIKI_BASE = "https://it.wikipedia.org"
 START_YEAR = 2005
 END_YEAR = datetime.now().year
+OUTPUT_FILE = "motogp_gran_premi.json"
 
 headers = {
     "User-Agent": "Mozilla/5.0"
 }
 
-output = []
-
-months = {
-    "gennaio": "01", "febbraio": "02", "marzo": "03", "aprile": "04",
-    "maggio": "05", "giugno": "06", "luglio": "07", "agosto": "08",
-    "settembre": "09", "ottobre": "10", "novembre": "11", "dicembre": "12"
-}
-
-def extract_day(raw_date):
-    """
-    Estrae il primo giorno da date tipo:
-    - "1º maggio" → 1
-    - "12-13 giugno" → 12
-    - "12–13 giugno" → 12 (trattino lungo)
-    """
-    raw_date = raw_date.replace("º", "").strip()
-    parts = raw_date.split()
-    if len(parts) < 2:
-        return None, None
-
-    day_part = parts[0]
-    month_part = parts[1].lower()
-
-    day_part = re.split(r"[-–]", day_part)[0]
-    
-    try:
-        day = int(day_part)
-        month_number = months.get(month_part, None)
-        return day, month_number
-    except:
-        return None, None
+def parse_html(content):
+    with profiler.stage("parse", rows_in=1):
+        return BeautifulSoup(content, "html.parser")
 
+@profiler.track("extract")
 def extract_coordinates(soup):
     """
     Estrae le coordinate geografiche dal contenuto della pagina.
@@ -74,109 +53,226 @@ def extract_coordinates(soup):
                     lon = -lon
     return lat, lon
 
-for year in range(START_YEAR, END_YEAR + 1):
-    print(f"Processing year {year}...")
-    url = BASE_URL.format(year)
-    res = requests.get(url, headers=headers)
-    if res.status_code != 200:
-        print(f"Failed to fetch {url}")
-        continue
+@profiler.track("extract")
+def extract_details(soup):
+    """
+    Estrae nome ufficiale, percorso e gara notturna dall'infobox del resoconto.
+    """
+    infobox = soup.find("table", class_="infobox")
+    nome_ufficiale, percorso, notturna = "", "", "No"
+
+    if infobox:
+        for r in infobox.find_all("tr"):
+            header = r.find("th")
+            value = r.find("td")
+            if not header or not value:
+                continue
 
-    soup = BeautifulSoup(res.content, "html.parser")
-    table = soup.find("table", {"class": "wikitable"})
+            label = header.text.strip().lower()
+            content = value.text.strip()
 
+            if "nome ufficiale" in label:
+                nome_ufficiale = content
+            elif "percorso" in label:
+                percorso = content
+            elif "note" in label and "notturna" in content.lower():
+                notturna = "Sì"
+    return nome_ufficiale, percorso, notturna
+
+@profiler.track("extract")
+def parse_season(soup, year):
+    """
+    Legge la tabella dei GP della stagione e restituisce, in ordine, le gare con
+    data, circuito, link alla pagina del circuito e link al resoconto.
+    """
+    table = soup.find("table", {"class": "wikitable"})
     if not table:
         print(f"No table found for {year}")
-        continue
-
-    rows = table.find_all("tr")[1:]
+        return []
 
-    for row in rows:
+    races = []
+    for row in table.find_all("tr")[1:]:
         cols = row.find_all("td")
         if len(cols) < 5:
             continue
 
-        try:
-            raw_date = cols[0].text.strip()
-            day, month_number = extract_day(raw_date)
-
-            if not day or not month_number:
-                continue
-
-            date_str = f"{year}-{month_number}-{day:02d}"
-            circuito = cols[2].text.strip()
-
-            # Trova il link del circuito
-            circuit_link_tag = cols[2].find("a")
-            if not circuit_link_tag:
-                print(f"Nessun link trovato per il circuito '{circuito}'")
-                continue
+        raw_date = cols[0].text.strip()
+        date = normalize_date(raw_date, year)
+        if not date:
+            continue
 
-            circuit_url = "https://it.wikipedia.org" + circuit_link_tag['href']
-            circuit_res = requests.get(circuit_url, headers=headers)
+        circuito = cols[2].text.strip()
+        # un <a> senza href (ancora, link rotto) salta solo la riga, non la stagione
+        circuit_link_tag = cols[2].find("a")
+        circuit_href = circuit_link_tag.get("href") if circuit_link_tag else None
+        if not circuit_href:
+            print(f"Nessun link trovato per il circuito '{circuito}'")
+            continue
 
-            if circuit_res.status_code != 200:
-                print(f"Failed to fetch circuit page: {circuit_url}")
-                continue
+        link_tag = cols[-1].find("a")
+        dettaglio_href = link_tag.get("href") if link_tag else None
+        if not dettaglio_href:
+            continue
 
-            circuit_soup = BeautifulSoup(circuit_res.content, "html.parser")
+        races.append({
+            "year": year,
+            "date": date,
+            "circuito": circuito,
+            "circuit_url": WIKI_BASE + circuit_href,
+            "dettaglio_url": WIKI_BASE + dettaglio_href,
+        })
+    return races
+
+def build_record(race, coords, details):
+    lat, lon = coords
+    nome_ufficiale, percorso, notturna = details
+    print(race["year"], race["date"], race["circuito"], nome_ufficiale, percorso, notturna, lat, lon)
+    return {
+        "Anno": race["year"],
+        "Data": race["date"],
+        "Circuito": race["circuito"],
+        "Nome ufficiale": nome_ufficiale,
+        "Percorso": percorso,
+        "Notturna": notturna,
+        "Latitudine": lat,
+        "Longitudine": lon
+    }
+
+def crawl(fetcher):
+    """Modalità sequenziale: una richiesta alla volta, coordinate memorizzate per circuito; genera i record."""
+    coords_by_circuit = {}
+
+    for year in range(START_YEAR, END_YEAR + 1):
+        print(f"Processing year {year}...")
+        url = BASE_URL.format(year)
+        res = fetcher.get(url)
+        if res.status_code != 200:
+            print(f"Failed to fetch {url}")
+            continue
 
-            # Estrai coordinate dalla pagina del circuito
-            lat, lon = extract_coordinates(circuit_soup)
+        soup = parse_html(res.content)
+        for race in parse_season(soup, year):
+            try:
+                circuit_url = race["circuit_url"]
+                if circuit_url not in coords_by_circuit:
+                    circuit_res = fetcher.get(circuit_url)
+                    if circuit_res.status_code != 200:
+                        print(f"Failed to fetch circuit page: {circuit_url}")
+                        continue
+                    circuit_soup = parse_html(circuit_res.content)
+                    coords_by_circuit[circuit_url] = extract_coordinates(circuit_soup)
 
-            # Estrai informazioni dal resoconto dettagliato
-            link_tag = cols[-1].find("a")
-            if not link_tag:
-                continue
+                dettaglio_url = race["dettaglio_url"]
+                dettaglio_res = fetcher.get(dettaglio_url)
+                if dettaglio_res.status_code != 200:
+                    print(f"Failed to fetch detail page: {dettaglio_url}")
+                    continue
 
-            dettaglio_url = "https://it.wikipedia.org" + link_tag['href']
-            dettaglio_res = requests.get(dettaglio_url, headers=headers)
+                dettaglio_soup = parse_html(dettaglio_res.content)
+                details = extract_details(dettaglio_soup)
+                yield build_record(race, coords_by_circuit[circuit_url], details)
 
-            if dettaglio_res.status_code != 200:
-                print(f"Failed to fetch detail page: {dettaglio_url}")
+            except Exception as e:
+                print(f"Errore con anno {year}: {e}")
                 continue
 
-            dettaglio_soup = BeautifulSoup(dettaglio_res.content, "html.parser")
-            infobox = dettaglio_soup.find("table", class_="infobox")
-
-            nome_ufficiale, percorso, notturna = "", "", "No"
-
-            if infobox:
-                for r in infobox.find_all("tr"):
-                    header = r.find("th")
-                    value = r.find("td")
-                    if not header or not value:
-                        continue
-
-                    label = header.text.strip().lower()
-                    content = value.text.strip()
-
-                    if "nome ufficiale" in label:
-                        nome_ufficiale = content
-                    elif "percorso" in label:
-                        percorso = content
-                    elif "note" in label and "notturna" in content.lower():
-                        notturna = "Sì"
-
-            print(year, date_str, circuito, nome_ufficiale, percorso, notturna, lat, lon)
-            output.append({
-                "Anno": year,
-                "Data": date_str,
-                "Circuito": circuito,
-                "Nome ufficiale": nome_ufficiale,
-                "Percorso": percorso,
-                "Notturna": notturna,
-                "Latitudine": lat,
-                "Longitudine": lon
-            })
-
-
+async def fetch_pages(fetcher, urls, label):
+    """Scarica in parallelo una lista di URL unici; restituisce {url: contenuto} solo per le risposte 200."""
+    async def one(url):
+        try:
+            res = await fetcher.get(url)
         except Exception as e:
-            print(f"Errore con anno {year}: {e}")
-            continue
+            print(f"Failed to fetch {label}: {url} ({e})")
+            return url, None
+        if res.status_code != 200:
+            print(f"Failed to fetch {label}: {url}")
+            return url, None
+        return url, res.content
 
-# Scrivi su JSON
-with open("motogp_gran_premi.json", "w", encoding="utf-8") as f:
-    json.dump(output, f, ensure_ascii=False, indent=4)
+    pages = await asyncio.gather(*(one(url) for url in urls))
+    return {url: content for url, content in pages if content is not None}
 
-print("Scraping completato. File salvato come 'motogp_gran_premi.json'")
\ No newline at end of file
+async def crawl_async(fetcher):
+    """
+    Modalità concorrente: stagioni, pagine dei circuiti e resoconti vengono scaricati
+    in parallelo (con limite per host) e ogni URL viene richiesto una sola volta,
+    quindi il tempo dipende dal numero di pagine uniche. Restituisce il generatore dei
+    record, nello stesso ordine della modalità sequenziale.
+    """
+    years = list(range(START_YEAR, END_YEAR + 1))
+    season_urls = [BASE_URL.format(year) for year in years]
+    season_pages = await fetch_pages(fetcher, season_urls, "season page")
+
+    races = []
+    for year, url in zip(years, season_urls):
+        if url in season_pages:
+            races.extend(parse_season(parse_html(season_pages[url]), year))
+
+    circuit_urls = list(dict.fromkeys(race["circuit_url"] for race in races))
+    detail_urls = list(dict.fromkeys(race["dettaglio_url"] for race in races))
+    circuit_pages, detail_pages = await asyncio.gather(
+        fetch_pages(fetcher, circuit_urls, "circuit page"),
+        fetch_pages(fetcher, detail_urls, "detail page"),
+    )
+
+    coords_by_circuit = {
+        url: extract_coordinates(parse_html(content))
+        for url, content in circuit_pages.items()
+    }
+
+    return build_records(races, coords_by_circuit, detail_pages)
+
+def build_records(races, coords_by_circuit, detail_pages):
+    details_by_url = {}
+    for race in races:
+        try:
+            if race["circuit_url"] not in coords_by_circuit or race["dettaglio_url"] not in detail_pages:
+                continue
+            if race["dettaglio_url"] not in details_by_url:
+                detail_soup = parse_html(detail_pages[race["dettaglio_url"]])
+                details_by_url[race["dettaglio_url"]] = extract_details(detail_soup)
+            yield build_record(race, coords_by_circuit[race["circuit_url"]],
+                               details_by_url[race["dettaglio_url"]])
+        except Exception as e:
+            print(f"Errore con anno {race['year']}: {e}")
+
+async def run_async(per_host, min_interval):
+    async with AsyncFetcher(per_host=per_host, min_interval=min_interval, headers=headers) as fetcher:
+        records = await crawl_async(fetcher)
+    return records, fetcher
+
+def main():
+    parser = argparse.ArgumentParser(description="Scraping date e coordinate dei GP MotoGP")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="scarica le pagine in parallelo con aiohttp")
+    parser.add_argument("--per-host", type=int, default=4,
+                        help="richieste contemporanee massime per host (solo --async)")
+    parser.add_argument("--min-interval", type=float, default=0.25,
+                        help="secondi minimi tra due richieste allo stesso host (solo --async)")
+    parser.add_argument("--jsonl-only", action="store_true",
+                        help="lascia solo il file JSON Lines, senza ricostruire il JSON indentato")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.start(args)
+
+    # I record vengono scritti man mano nel file JSON Lines
+    stream_file = jsonl_path(OUTPUT_FILE)
+    with RecordWriter(stream_file) as writer:
+        if args.use_async:
+            records, fetcher = asyncio.run(run_async(args.per_host, args.min_interval))
+            writer.write_all(records)
+        else:
+            fetcher = Fetcher(headers=headers)
+            try:
+                writer.write_all(crawl(fetcher))
+            finally:
+                fetcher.close()
+    print(f"Scraping completato: {writer.count} gare in '{stream_file}'")
+
+    if not args.jsonl_only:
+        jsonl_to_json(stream_file, OUTPUT_FILE, indent=4)
+        print(f"File salvato come '{OUTPUT_FILE}'")
+    profiling.finish(args, {"http_cache": fetcher.report()})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Scrittura in streaming dell'output degli scraper.
+
+Gli scraper producono i record con generatori e li passano a un RecordWriter, che li
+accoda a un file JSON Lines (un oggetto per riga) o CSV e li scrive su disco a blocchi di
+FLUSH_EVERY record. La memoria non cresce con il crawl e, se lo scraper si interrompe,
+quello che è già stato scritto resta nel file.
+
+Il JSON "leggibile" (una lista con indentazione, il formato letto da integration/) è un
+passo finale facoltativo: jsonl_to_json lo ricostruisce dal file JSON Lines un record alla
+volta, con lo stesso testo che produrrebbe json.dump(lista, indent=..., ensure_ascii=False).
+"""
+import csv
+import json
+import os
+
+from profiling import profiler
+
+FLUSH_EVERY = 50       # record in memoria prima di scriverli su disco
+
+
+class RecordWriter:
+    """
+    Writer append-only per record (dict).
+
+    path        file di destinazione, ".jsonl" oppure ".csv"
+    fields      colonne del CSV (obbligatorie per ".csv", ignorate per ".jsonl")
+    append      False = svuota il file all'apertura
+    flush_every record accumulati prima di ogni scrittura
+    """
+
+    def __init__(self, path, fields=None, append=False, flush_every=FLUSH_EVERY):
+        self.path = path
+        self.is_csv = path.endswith(".csv")
+        if self.is_csv and not fields:
+            raise ValueError(f"Colonne mancanti per il CSV '{path}'")
+        self.flush_every = max(1, flush_every)
+        self.count = 0
+        self._pending = []
+        new_file = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a" if append else "w", encoding="utf-8", newline="")
+        if self.is_csv:
+            self._csv = csv.DictWriter(self._file, fieldnames=fields, extrasaction="ignore")
+            if new_file:
+                self._csv.writeheader()
+
+    def write(self, record):
+        self._pending.append(record)
+        self.count += 1
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def write_all(self, records):
+        """Consuma un iterabile di record; restituisce quanti ne ha scritti."""
+        start = self.count
+        for record in records:
+            self.write(record)
+        return self.count - start
+
+    def flush(self):
+        with profiler.stage("write", rows_in=len(self._pending)) as s:
+            start = self._file.tell()
+            if self._pending:
+                if self.is_csv:
+                    self._csv.writerows(self._pending)
+                else:
+                    self._file.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in self._pending)
+                s["rows_out"] = len(self._pending)
+                self._pending = []
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            s["bytes"] = self._file.tell() - start
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_records(path):
+    """Record di un file JSON Lines, CSV o JSON (lista), uno alla volta dove possibile."""
+    if path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif path.endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            yield from csv.DictReader(f)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from json.load(f)
+
+@profiler.track("write_json")
+def jsonl_to_json(jsonl_path, json_path, indent=4):
+    """Converte un file JSON Lines nella lista JSON indentata; restituisce il numero di record."""
+    count = 0
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        out.write("[")
+        for record in read_records(jsonl_path):
+            text = json.dumps(record, indent=indent, ensure_ascii=False)
+            out.write(("," if count else "") + "\n" + " " * indent + text.replace("\n", "\n" + " " * indent))
+            count += 1
+        out.write("\n]" if count else "]")
+    os.replace(tmp_path, json_path)
+    return count
+
+def jsonl_path(json_path):
+    """Nome del file JSON Lines associato a un output JSON (output.json → output.jsonl)."""
+    return os.path.splitext(json_path)[0] + ".jsonl"
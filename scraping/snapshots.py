@@ -0,0 +1,273 @@
+"""
+Archivio delle pagine scaricate dagli scraper, per rieseguire gli estrattori senza rete.
+
+Ogni risposta 200 scaricata da fetch.Fetcher viene aggiunta all'archivio (SNAPSHOT_DIR,
+variabile MOTOGP_SNAPSHOTS; vuota = archivio disattivato):
+
+    pages.bin     frame compressi uno dopo l'altro, solo in append: zstd se è installato
+                  zstandard, altrimenti zlib (il codec è scritto nell'indice per ogni frame)
+    index.jsonl   una riga per versione di una pagina: chiave (URL + parametri), istante
+                  dello scaricamento, offset e lunghezza del frame, codec, sha256
+
+Una pagina identica all'ultima versione archiviata non viene riscritta; contenuti uguali
+sotto URL diversi condividono lo stesso frame. In lettura pages.bin è mappato in memoria
+(mmap) e si decomprime solo il frame richiesto.
+
+Con MOTOGP_OFFLINE=1 il Fetcher risponde solo dall'archivio (404 per le pagine mancanti) e
+non fa richieste in rete. Su questo si basa il comando re-extract, che riesegue gli
+scraper con gli estrattori attuali e rigenera i dataset in pochi secondi:
+
+    python scraping/snapshots.py re-extract                  # dataset in scraping/reextract/
+    python scraping/snapshots.py re-extract --in-place       # sovrascrive i dataset del progetto
+    python scraping/snapshots.py import-cache                # archivia le pagine già nella cache HTTP
+    python scraping/snapshots.py stats
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import subprocess
+import sys
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:         # Windows: solo il lock tra thread
+    fcntl = None
+
+SCRAPING_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(SCRAPING_DIR)
+SNAPSHOT_DIR = os.environ.get("MOTOGP_SNAPSHOTS", os.path.join(SCRAPING_DIR, "snapshots"))
+OFFLINE = os.environ.get("MOTOGP_OFFLINE", "") not in ("", "0")
+REEXTRACT_DIR = os.path.join(SCRAPING_DIR, "reextract")
+PAGES_FILE = "pages.bin"
+INDEX_FILE = "index.jsonl"
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 6
+
+# Scraper rieseguiti da re-extract: (nome, script, argomenti, cartella del dataset nel
+# progetto, file prodotti). La seconda fase legge l'output della prima.
+REEXTRACT_PHASES = [
+    [
+        ("race_date_script", os.path.join(SCRAPING_DIR, "race_date_script.py"), [],
+         SCRAPING_DIR, ["motogp_gran_premi.json", "motogp_gran_premi.jsonl"]),
+        ("quali", os.path.join(SCRAPING_DIR, "quali.py"), ["--reset", "--state", "quali_state.sqlite"],
+         SCRAPING_DIR, ["motogp_griglia.csv"]),
+        ("motogp_scaper", os.path.join(ROOT, "motogp_scaper.py"), ["--rate", "0", "--processes", str(os.cpu_count())],
+         ROOT, ["output2.json", "output2.jsonl"]),
+    ],
+    [
+        ("race_coord", os.path.join(SCRAPING_DIR, "race_coord.py"), ["--input", "motogp_gran_premi.jsonl"],
+         SCRAPING_DIR, ["race_weather_data_final.json", "race_weather_data_final.jsonl"]),
+    ],
+]
+
+
+def compress(content):
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(content)
+    return "zlib", zlib.compress(content, ZLIB_LEVEL)
+
+def decompress(codec, frame):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("frame zstd nell'archivio: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(frame)
+    return zlib.decompress(frame)
+
+
+class SnapshotArchive:
+    """Archivio append-only delle pagine; l'indice viene letto alla prima operazione."""
+
+    def __init__(self, path=SNAPSHOT_DIR):
+        self.path = path
+        self.pages_path = os.path.join(path, PAGES_FILE)
+        self.index_path = os.path.join(path, INDEX_FILE)
+        self.history = None         # chiave → versioni in ordine di scaricamento
+        self.frames = {}            # sha256 → versione che contiene il frame
+        self._map = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self.history is not None:
+            return
+        self.history = {}
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self._remember(json.loads(line))
+
+    def _remember(self, entry):
+        self.history.setdefault(entry["key"], []).append(entry)
+        self.frames.setdefault(entry["sha256"], entry)
+
+    # === Scrittura ===
+
+    def add(self, key, content, fetched_at=None):
+        """Archivia il contenuto di una pagina; restituisce la versione (nuova o già presente)."""
+        sha = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            self._load()
+            versions = self.history.get(key)
+            if versions and versions[-1]["sha256"] == sha:
+                return versions[-1]
+            os.makedirs(self.path, exist_ok=True)
+            with open(self.pages_path, "ab") as pages, open(self.index_path, "a", encoding="utf-8") as index:
+                if fcntl is not None:
+                    fcntl.flock(pages, fcntl.LOCK_EX)
+                try:
+                    frame = self.frames.get(sha)
+                    if frame is None:
+                        codec, data = compress(content)
+                        pages.seek(0, os.SEEK_END)
+                        frame = {"offset": pages.tell(), "length": len(data), "codec": codec}
+                        pages.write(data)
+                        pages.flush()
+                    entry = {"key": key, "fetched_at": fetched_at or time.time(), "offset": frame["offset"],
+                             "length": frame["length"], "codec": frame["codec"], "sha256": sha,
+                             "size": len(content)}
+                    index.write(json.dumps(entry) + "\n")
+                    index.flush()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(pages, fcntl.LOCK_UN)
+            self._remember(entry)
+            return entry
+
+    # === Lettura ===
+
+    def _frame(self, entry):
+        end = entry["offset"] + entry["length"]
+        if self._map is None or len(self._map) < end:
+            if self._map is not None:
+                self._map.close()
+            with open(self.pages_path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map[entry["offset"]:end]
+
+    def version(self, key, at=None):
+        """Ultima versione della pagina (o l'ultima scaricata entro l'istante `at`), None se manca."""
+        with self._lock:
+            self._load()
+            versions = self.history.get(key, [])
+        if at is not None:
+            versions = [v for v in versions if v["fetched_at"] <= at]
+        return versions[-1] if versions else None
+
+    def get(self, key, at=None):
+        """Contenuto (bytes) della pagina, None se non è nell'archivio."""
+        entry = self.version(key, at)
+        if entry is None:
+            return None
+        with self._lock:
+            frame = self._frame(entry)
+        return decompress(entry["codec"], frame)
+
+    def keys(self):
+        with self._lock:
+            self._load()
+            return list(self.history)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+# === Comandi ===
+
+def import_cache(archive, cache_dir):
+    """Archivia le pagine già presenti nella cache HTTP di fetch.py; restituisce quante."""
+    with open(os.path.join(cache_dir, "index.json"), "r", encoding="utf-8") as f:
+        index = json.load(f)
+    count = 0
+    for key, entry in index.items():
+        try:
+            with open(os.path.join(cache_dir, "objects", entry["sha"]), "rb") as f:
+                content = f.read()
+        except OSError:
+            continue
+        archive.add(key, content, entry.get("fetched_at"))
+        count += 1
+    return count
+
+def re_extract(output_dir, archive_dir=SNAPSHOT_DIR, in_place=False):
+    """
+    Riesegue gli scraper di REEXTRACT_PHASES senza rete sulle pagine dell'archivio; gli
+    scraper di una fase girano in parallelo. Restituisce {nome: codice di uscita}.
+    """
+    env = dict(os.environ, MOTOGP_OFFLINE="1", MOTOGP_SNAPSHOTS=archive_dir)
+    env.pop("MOTOGP_REPLAY_URL", None)
+    os.makedirs(output_dir, exist_ok=True)
+    codes = {}
+    for phase in REEXTRACT_PHASES:
+        running = []
+        for name, script, args, _, _ in phase:
+            log = open(os.path.join(output_dir, f"{name}.log"), "w", encoding="utf-8")
+            print(f"➡️ {name}")
+            running.append((name, log, subprocess.Popen([sys.executable, script, *args], cwd=output_dir,
+                                                        env=env, stdout=log, stderr=subprocess.STDOUT)))
+        for name, log, proc in running:
+            codes[name] = proc.wait()
+            log.close()
+            print(f"{'✅' if codes[name] == 0 else '❌'} {name} (log in {os.path.join(output_dir, name + '.log')})")
+
+    if in_place:
+        for phase in REEXTRACT_PHASES:
+            for name, _, _, target_dir, outputs in phase:
+                if codes.get(name) != 0:
+                    print(f"[!] {name} non riuscito: dataset del progetto lasciati invariati")
+                    continue
+                for output in outputs:
+                    source = os.path.join(output_dir, output)
+                    if os.path.exists(source):
+                        os.replace(source, os.path.join(target_dir, output))
+    return codes
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivio delle pagine scaricate e ri-estrazione offline")
+    parser.add_argument("--archive", default=SNAPSHOT_DIR, help="cartella dell'archivio")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("re-extract", help="rigenera i dataset dalle pagine archiviate, senza rete")
+    p.add_argument("--output-dir", default=REEXTRACT_DIR, help="cartella di lavoro e dei dataset rigenerati")
+    p.add_argument("--in-place", action="store_true",
+                   help="sposta i dataset rigenerati al posto di quelli del progetto")
+
+    p = sub.add_parser("import-cache", help="archivia le pagine della cache HTTP di fetch.py")
+    p.add_argument("--cache-dir", default=os.environ.get("MOTOGP_HTTP_CACHE", os.path.join(SCRAPING_DIR, ".http_cache")))
+
+    sub.add_parser("stats", help="pagine, versioni e dimensioni dell'archivio")
+    args = parser.parse_args()
+
+    archive = SnapshotArchive(args.archive)
+    if args.command == "re-extract":
+        start = time.perf_counter()
+        codes = re_extract(args.output_dir, args.archive, args.in_place)
+        print(f"⏱️ Ri-estrazione completata in {time.perf_counter() - start:.2f}s")
+        if any(codes.values()):
+            sys.exit(1)
+    elif args.command == "import-cache":
+        count = import_cache(archive, args.cache_dir)
+        print(f"✅ {count} pagine della cache archiviate in '{args.archive}'")
+    else:
+        keys = archive.keys()
+        versions = sum(len(archive.history[k]) for k in keys)
+        size = sum(e["size"] for e in archive.frames.values())
+        stored = os.path.getsize(archive.pages_path) if os.path.exists(archive.pages_path) else 0
+        print(f"[i] {len(keys)} pagine, {versions} versioni, {size / 1024:.1f} KB "
+              f"({stored / 1024:.1f} KB compressi, {'zstd' if zstandard is not None else 'zlib'} per i nuovi frame)")
+    archive.close()
+
+if __name__ == "__main__":
+    main()
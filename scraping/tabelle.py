@@ -0,0 +1,299 @@
+"""
+Estrazione in un solo passaggio delle tabelle di una sezione di un resoconto GP (it.wikipedia).
+
+Partendo dall'intestazione h2 della sezione (es. id="MotoGP") scorre i fratelli del suo
+div.mw-heading una volta sola e raccoglie tutte le sottosezioni h3 richieste
+("Arrivati al traguardo", "Ritirati", ...); ogni tabella viene poi letta dallo stesso codice
+(indici delle colonne dall'header, celle delle righe successive).
+
+Il parsing usa selectolax (lexbor) o lxml se installati, altrimenti BeautifulSoup con html.parser.
+Il testo delle celle segue le regole di BeautifulSoup.get_text(strip=True): stringhe ripulite e
+concatenate, esclusi commenti e contenuto di style/script/template/rt/rp.
+"""
+from profiling import profiler
+
+TESTO_ESCLUSO = {"style", "script", "template", "rt", "rp"}
+
+
+def _ha_classe(valore, classe):
+    if not valore:
+        return False
+    if isinstance(valore, str):
+        valore = valore.split()
+    return classe in valore
+
+
+class BackendBS4:
+    nome = "bs4"
+
+    def parse(self, html):
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(html, "html.parser")
+
+    def heading(self, doc, tag, id_):
+        return doc.find(tag, {"id": id_})
+
+    def parent_div(self, node, classe):
+        return node.find_parent("div", class_=classe)
+
+    def next_siblings(self, node):
+        return node.find_next_siblings()
+
+    def first_desc(self, node, tag):
+        return node.find(tag)
+
+    def next_table(self, node, classe):
+        return node.find_next_sibling("table", class_=classe)
+
+    def rows(self, table):
+        return table.find_all("tr")
+
+    def cells(self, row):
+        return row.find_all(["td", "th"])
+
+    def links(self, cell):
+        return [(a.get("title"), a.get_text(strip=True)) for a in cell.find_all("a")]
+
+    def text(self, node):
+        return node.get_text(strip=True)
+
+
+class BackendLxml:
+    nome = "lxml"
+
+    def __init__(self):
+        import lxml.html
+        self._lxml_html = lxml.html
+
+    def parse(self, html):
+        return self._lxml_html.document_fromstring(html)
+
+    def heading(self, doc, tag, id_):
+        for el in doc.iter(tag):
+            if el.get("id") == id_:
+                return el
+        return None
+
+    def parent_div(self, node, classe):
+        for el in node.iterancestors("div"):
+            if _ha_classe(el.get("class"), classe):
+                return el
+        return None
+
+    def next_siblings(self, node):
+        return (el for el in node.itersiblings() if isinstance(el.tag, str))
+
+    def first_desc(self, node, tag):
+        return next(node.iterdescendants(tag), None)
+
+    def next_table(self, node, classe):
+        for el in node.itersiblings("table"):
+            if _ha_classe(el.get("class"), classe):
+                return el
+        return None
+
+    def rows(self, table):
+        return list(table.iterdescendants("tr"))
+
+    def cells(self, row):
+        return list(row.iterdescendants("td", "th"))
+
+    def links(self, cell):
+        return [(a.get("title"), self.text(a)) for a in cell.iterdescendants("a")]
+
+    def text(self, node):
+        parti = []
+        self._raccogli_testo(node, parti)
+        return "".join(parti)
+
+    def _raccogli_testo(self, node, parti):
+        if node.text and node.tag not in TESTO_ESCLUSO:
+            parti.append(node.text.strip())
+        for figlio in node:
+            if isinstance(figlio.tag, str) and figlio.tag not in TESTO_ESCLUSO:
+                self._raccogli_testo(figlio, parti)
+            if figlio.tail:
+                parti.append(figlio.tail.strip())
+
+
+class BackendSelectolax:
+    nome = "selectolax"
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self._parser = LexborHTMLParser
+
+    def parse(self, html):
+        return self._parser(html)
+
+    def heading(self, doc, tag, id_):
+        for el in doc.css(tag):
+            if el.attributes.get("id") == id_:
+                return el
+        return None
+
+    def parent_div(self, node, classe):
+        el = node.parent
+        while el is not None:
+            if el.tag == "div" and _ha_classe(el.attributes.get("class"), classe):
+                return el
+            el = el.parent
+        return None
+
+    def next_siblings(self, node):
+        el = node.next
+        while el is not None:
+            if el.is_element_node:
+                yield el
+            el = el.next
+
+    def first_desc(self, node, tag):
+        for el in node.css(tag):
+            if el.mem_id != node.mem_id:
+                return el
+        return None
+
+    def next_table(self, node, classe):
+        for el in self.next_siblings(node):
+            if el.tag == "table" and _ha_classe(el.attributes.get("class"), classe):
+                return el
+        return None
+
+    def rows(self, table):
+        return table.css("tr")
+
+    def cells(self, row):
+        return row.css("td, th")
+
+    def links(self, cell):
+        return [(a.attributes.get("title"), self.text(a)) for a in cell.css("a")]
+
+    def text(self, node):
+        parti = []
+        self._raccogli_testo(node, parti)
+        return "".join(parti)
+
+    def _raccogli_testo(self, node, parti):
+        figlio = node.child
+        while figlio is not None:
+            if figlio.is_text_node:
+                parti.append(figlio.text_content.strip())
+            elif figlio.is_element_node and figlio.tag not in TESTO_ESCLUSO:
+                self._raccogli_testo(figlio, parti)
+            figlio = figlio.next
+
+
+BACKENDS = {
+    "selectolax": BackendSelectolax,
+    "lxml": BackendLxml,
+    "bs4": BackendBS4,
+}
+
+
+_backend_predefinito = None
+
+
+def scegli_backend(nome=None):
+    """Restituisce il backend richiesto, o il più veloce disponibile (selectolax → lxml → bs4)."""
+    global _backend_predefinito
+    if nome:
+        return BACKENDS[nome]()
+    if _backend_predefinito is None:
+        for classe in BACKENDS.values():
+            try:
+                _backend_predefinito = classe()
+                break
+            except ImportError:
+                continue
+    return _backend_predefinito
+
+
+def estrai_sezione(pagina, sezione_id, sottosezioni, colonne, backend=None):
+    """
+    Estrae in un solo passaggio le tabelle delle sottosezioni di una sezione h2.
+
+    pagina       HTML (str/bytes) oppure un documento BeautifulSoup già costruito
+    sezione_id   id dell'h2 della sezione, es. "MotoGP"
+    sottosezioni lista di (nome, testo da cercare nell'h3), es. ("Arrivati", "arrivati al traguardo")
+    colonne      intestazioni da leggere (minuscole), es. ["pilota", "griglia"]
+
+    Restituisce un dict con "sezione" e "contenitore" (bool) e "tabelle": per ogni
+    sottosezione un dict con "titolo", "tabella" (bool), "righe" e "errore".
+    Ogni riga è la lista delle celle richieste, ogni cella {"text": ..., "links": [(title, testo)]}.
+    """
+    if backend is None:
+        if hasattr(pagina, "find_all"):
+            backend, doc = BackendBS4(), pagina
+        else:
+            backend = scegli_backend()
+            with profiler.stage("parse", rows_in=1):
+                doc = backend.parse(pagina)
+    elif isinstance(pagina, (str, bytes)):
+        with profiler.stage("parse", rows_in=1):
+            doc = backend.parse(pagina)
+    else:
+        doc = pagina
+
+    esito = {"sezione": False, "contenitore": False, "tabelle": {}}
+    heading = backend.heading(doc, "h2", sezione_id)
+    if heading is None:
+        return esito
+    esito["sezione"] = True
+
+    contenitore = backend.parent_div(heading, "mw-heading")
+    if contenitore is None:
+        return esito
+    esito["contenitore"] = True
+
+    # Unico passaggio sui fratelli: il primo h3 di ciascun elemento viene confrontato con
+    # tutte le sottosezioni ancora da trovare.
+    da_trovare = dict(sottosezioni)
+    titoli = {}
+    for elemento in backend.next_siblings(contenitore):
+        h3 = backend.first_desc(elemento, "h3")
+        if h3 is None:
+            continue
+        testo = backend.text(h3).lower()
+        for nome, chiave in list(da_trovare.items()):
+            if chiave in testo:
+                titoli[nome] = h3
+                del da_trovare[nome]
+        if not da_trovare:
+            break
+
+    for nome, _ in sottosezioni:
+        h3 = titoli.get(nome)
+        risultato = {"titolo": h3 is not None, "tabella": False, "righe": [], "errore": None}
+        esito["tabelle"][nome] = risultato
+        if h3 is None:
+            continue
+        div_h3 = backend.parent_div(h3, "mw-heading")
+        tabella = backend.next_table(div_h3, "wikitable") if div_h3 is not None else None
+        if tabella is None:
+            continue
+        risultato["tabella"] = True
+        try:
+            risultato["righe"] = leggi_tabella(backend, tabella, colonne)
+        except ValueError as e:
+            risultato["errore"] = e
+    return esito
+
+
+def leggi_tabella(backend, tabella, colonne):
+    """Legge le colonne richieste di una tabella; ValueError se una colonna manca nell'header."""
+    rows = backend.rows(tabella)
+    if len(rows) <= 1:
+        return []
+    headers = [backend.text(c).lower() for c in backend.cells(rows[0])]
+    indici = [headers.index(colonna) for colonna in colonne]
+    minimo = max(indici)
+
+    righe = []
+    for row in rows[1:]:
+        cells = backend.cells(row)
+        if len(cells) > minimo:
+            righe.append([
+                {"text": backend.text(cells[i]), "links": backend.links(cells[i])}
+                for i in indici
+            ])
+    return righe
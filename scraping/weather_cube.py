@@ -0,0 +1,177 @@
+"""
+Meteo orario dei weekend di gara come cubo float32 (weekend di gara × ora × variabile) in un
+file .npy, letto con np.load(..., mmap_mode="r") senza caricarlo in memoria.
+
+Lo scrive race_coord.py --hourly, con tre file nella cartella di lavoro:
+
+    weather_hourly.npy          cubo (n, WEEKEND_HOURS, len(variabili)); NaN = dato mancante
+    weather_hourly_index.csv    riga i del cubo → circuito, data della gara, inizio della
+                                finestra (ora locale del circuito), coordinate, fuso orario
+    weather_hourly.json         variabili, unità e durata della finestra
+
+Ogni riga del cubo copre il weekend di una gara (da venerdì 00:00 a domenica 23:00, ora
+locale): una linea temporale unica dal 2005 a oggi per ogni circuito sarebbe vuota per oltre
+il 99%. Le statistiche sulle finestre di gara sono fette del cubo:
+
+    cube = WeatherCube()
+    cube.race_window()                          # {variabile: array (n,)}, una gara per elemento
+    cube.window(cube.race_day_hour(14), 2)      # array (n, 2, variabili) dalle 14 alle 16
+    cube.value("Mugello", "2019-06-02T14:00", "precipitation")
+
+    python scraping/weather_cube.py race-window --start-hour 14 --hours 1 --output race_window_weather.csv
+"""
+import argparse
+import csv
+import json
+import os
+from datetime import date, timedelta
+
+import numpy as np
+
+CUBE_FILE = "weather_hourly.npy"
+INDEX_FILE = "weather_hourly_index.csv"
+META_FILE = "weather_hourly.json"
+INDEX_FIELDS = ["Circuito", "Data", "Inizio", "Latitudine", "Longitudine", "Fuso", "Offset_UTC", "Ore_valide"]
+
+# Variabili orarie di Open-Meteo, nell'ordine dell'ultimo asse del cubo
+HOURLY_VARIABLES = ["temperature_2m", "precipitation", "wind_speed_10m", "relative_humidity_2m"]
+UNITS = {"temperature_2m": "°C", "precipitation": "mm", "wind_speed_10m": "km/h", "relative_humidity_2m": "%"}
+# Aggregazione sulla finestra di gara: somma per la pioggia, media per il resto
+AGGREGATIONS = {"precipitation": "sum"}
+WEEKEND_DAYS = 3            # venerdì, sabato, domenica (giorno di gara)
+WEEKEND_HOURS = WEEKEND_DAYS * 24
+RACE_START_HOUR = 14        # ora locale tipica della gara della classe regina
+RACE_HOURS = 1
+
+
+def weekend_start(race_date):
+    """Primo giorno della finestra (yyyy-MM-dd) per una gara nel giorno `race_date`."""
+    return (date.fromisoformat(race_date) - timedelta(days=WEEKEND_DAYS - 1)).isoformat()
+
+
+class CubeWriter:
+    """Riempie il cubo una gara alla volta su un file mappato in memoria, poi lo rende definitivo."""
+
+    def __init__(self, directory, rows, variables=HOURLY_VARIABLES, hours=WEEKEND_HOURS):
+        self.directory = directory
+        self.variables = list(variables)
+        self.hours = hours
+        self.path = os.path.join(directory, CUBE_FILE)
+        self.cube = np.lib.format.open_memmap(self.path + ".tmp", mode="w+", dtype=np.float32,
+                                              shape=(rows, hours, len(self.variables)))
+        self.cube[:] = np.nan
+        self.index = []
+
+    def put(self, row, circuit, race_date, latitude, longitude, response):
+        """Copia nella riga `row` le serie orarie di una risposta Open-Meteo (None = nessun dato)."""
+        start = weekend_start(race_date)
+        valid = 0
+        if response and "hourly" in response:
+            hourly = response["hourly"]
+            offsets = (np.array(hourly["time"], dtype="datetime64[h]")
+                       - np.datetime64(start, "h")).astype(np.int64)
+            inside = (offsets >= 0) & (offsets < self.hours)
+            for v, name in enumerate(self.variables):
+                values = np.array([np.nan if x is None else x for x in hourly.get(name, [])], dtype=np.float32)
+                if len(values) == len(offsets):
+                    self.cube[row, offsets[inside], v] = values[inside]
+            valid = int((~np.isnan(self.cube[row]).all(axis=1)).sum())
+        self.index.append({
+            "Circuito": circuit, "Data": race_date, "Inizio": f"{start}T00:00",
+            "Latitudine": latitude, "Longitudine": longitude,
+            "Fuso": (response or {}).get("timezone", ""), "Offset_UTC": (response or {}).get("utc_offset_seconds", ""),
+            "Ore_valide": valid,
+        })
+        return valid
+
+    def close(self):
+        self.cube.flush()
+        del self.cube
+        os.replace(self.path + ".tmp", self.path)
+        with open(os.path.join(self.directory, INDEX_FILE), "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=INDEX_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.index)
+        with open(os.path.join(self.directory, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"variables": self.variables, "units": {v: UNITS.get(v) for v in self.variables},
+                       "hours": self.hours, "weekend_days": WEEKEND_DAYS}, f, indent=4, ensure_ascii=False)
+
+
+class WeatherCube:
+    def __init__(self, directory="."):
+        self.data = np.load(os.path.join(directory, CUBE_FILE), mmap_mode="r")
+        with open(os.path.join(directory, INDEX_FILE), "r", encoding="utf-8", newline="") as f:
+            self.index = list(csv.DictReader(f))
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.variables = self.meta["variables"]
+        self.hours = self.meta["hours"]
+        self.starts = np.array([r["Inizio"] for r in self.index], dtype="datetime64[h]")
+        self.circuits = np.array([r["Circuito"] for r in self.index], dtype=object)
+
+    def variable(self, name):
+        return self.variables.index(name)
+
+    def race_day_hour(self, hour):
+        """Posizione nella finestra dell'ora locale `hour` del giorno di gara."""
+        return (self.meta["weekend_days"] - 1) * 24 + hour
+
+    def locate(self, circuit, timestamp):
+        """(riga, ora) del cubo per un circuito e un istante locale; (None, None) se fuori dai weekend."""
+        offsets = (np.datetime64(timestamp, "h") - self.starts).astype(np.int64)
+        rows = np.flatnonzero((self.circuits == circuit) & (offsets >= 0) & (offsets < self.hours))
+        if not len(rows):
+            return None, None
+        return int(rows[0]), int(offsets[rows[0]])
+
+    def value(self, circuit, timestamp, variable):
+        row, hour = self.locate(circuit, timestamp)
+        return None if row is None else float(self.data[row, hour, self.variable(variable)])
+
+    def window(self, start_hour, hours, variables=None):
+        """Fetta (gare, ore, variabili) della finestra [start_hour, start_hour + hours) di ogni weekend."""
+        columns = [self.variable(v) for v in variables] if variables else slice(None)
+        return self.data[:, start_hour:start_hour + hours, columns]
+
+    def race_window(self, start_hour=RACE_START_HOUR, hours=RACE_HOURS):
+        """Statistiche di ogni gara nelle `hours` ore dall'ora locale `start_hour` del giorno di gara."""
+        block = np.asarray(self.window(self.race_day_hour(start_hour), hours), dtype=np.float64)
+        present = ~np.isnan(block)
+        counts = present.sum(axis=1)                    # (gare, variabili)
+        sums = np.where(present, block, 0.0).sum(axis=1)
+        result = {}
+        for v, name in enumerate(self.variables):
+            values = sums[:, v] if AGGREGATIONS.get(name) == "sum" else sums[:, v] / np.maximum(counts[:, v], 1)
+            result[name] = np.where(counts[:, v] > 0, values, np.nan)
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cubo del meteo orario dei weekend di gara (race_coord.py --hourly)")
+    parser.add_argument("--dir", default=".", help="cartella con i file del cubo")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("race-window", help="statistiche meteo di ogni gara nella finestra della gara")
+    p.add_argument("--start-hour", type=int, default=RACE_START_HOUR, help="ora locale di partenza")
+    p.add_argument("--hours", type=int, default=RACE_HOURS, help="durata della finestra in ore")
+    p.add_argument("--output", default="race_window_weather.csv")
+    sub.add_parser("stats", help="dimensioni e copertura del cubo")
+    args = parser.parse_args()
+
+    cube = WeatherCube(args.dir)
+    if args.command == "stats":
+        covered = int(np.count_nonzero(~np.isnan(cube.data).all(axis=(1, 2))))
+        print(f"[i] {len(cube.index)} weekend × {cube.hours} ore × {len(cube.variables)} variabili "
+              f"({cube.data.nbytes / 1024:.0f} KB), {covered} weekend con dati: {', '.join(cube.variables)}")
+        return
+
+    stats = cube.race_window(args.start_hour, args.hours)
+    with open(args.output, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Circuito", "Data", *stats])
+        for i, row in enumerate(cube.index):
+            writer.writerow([row["Circuito"], row["Data"],
+                             *("" if np.isnan(stats[v][i]) else round(float(stats[v][i]), 2) for v in stats)])
+    print(f"✅ Meteo di {len(cube.index)} gare ({args.start_hour}:00 + {args.hours}h) in '{args.output}'")
+
+if __name__ == "__main__":
+    main()